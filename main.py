@@ -1,17 +1,35 @@
 import argparse
+import asyncio
+import hashlib
+import json
 import logging
-import subprocess
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from multiprocessing import shared_memory
 from pathlib import Path
 
+import numpy as np
 from tqdm import tqdm
 
 from protocol.datetime import FormattedDateTime
-from protocol.kline import KLine
+from protocol.kline import KLine, KLineSeries
 from protocol.time_value import TimeValue, TimeValueQueue
-from strategy import BaseStrategy, get_strategy
-from utils.config import PYTHON_PATH, DataPath, ResultsPath, StrategyPath
-from utils.json import dump, load
+from script.price_fetcher import BinancePriceFetcher
+from strategy import STRATEGY_MAP, BaseStrategy, get_strategy
+from utils.catalog import RunCatalog, config_hash, profit_metrics
+from utils.columnar import key_times, time_keys
+from utils.config import STREAM_URL, ResultsPath, StrategyPath
+from utils.downsample import lttb
+from utils.json import dump, dump_list, load
+from utils.price_store import price_store
+from utils.profiler import PROFILER
+from utils.pyramid import PYRAMID_LEVELS, ProfitPyramid
+from utils.stream import NULL_PUBLISHER, get_publisher
+from utils.synthetic import VARIANT_GENERATORS, generate_variants
+
+# at most this many equity points are streamed per batch of bars
+STREAM_POINTS_PER_BATCH = 200
 
 
 class Tester:
@@ -21,6 +39,7 @@ class Tester:
         end_time: FormattedDateTime = None,
         symbol: str = "btcusdt",
         window_size: int = 1440,
+        batch_size: int = 10000,
     ):
         if end_time is not None and not isinstance(end_time, FormattedDateTime):
             end_time = FormattedDateTime(end_time)
@@ -28,83 +47,354 @@ class Tester:
         self.start_time = start_time
         self.end_time = end_time
         self.symbol = symbol
-        self.price_path = DataPath(f"{symbol.lower()}/prices.json")
-        self.profit_queue: TimeValueQueue = TimeValueQueue(max_size=window_size)
+        self.window_size = window_size
+        self.batch_size = batch_size
+        self.price_store = price_store(symbol)
+        # replaced by a live publisher to stream progress to the dashboard
+        self.publisher = NULL_PUBLISHER
+        # replaced by a run catalog to index every finished backtest
+        self.catalog: RunCatalog = None
+        self.reset_metrics()
+
+        if self.end_time is None:
+            self.end_time = FormattedDateTime(self.price_store.last_time)
+
+    def reset_metrics(self):
+        self.profit_queue: TimeValueQueue = TimeValueQueue(max_size=self.window_size)
         self.max_profit_drop: TimeValue = TimeValue(None, -1e7)
         self.max_profit_gain: TimeValue = TimeValue(None, -1e7)
 
         self.min_profit: TimeValue = TimeValue(None, 1e-7)
         self.max_profit: TimeValue = TimeValue(None, -1e-7)
+        self.pyramid: ProfitPyramid = ProfitPyramid()
 
-        self._data = self.load_data(self.price_path)
+        self.last_time: FormattedDateTime = None
+        self.last_kline: KLine = None
+        self.current_timevalue: TimeValue = None
 
-    def load_data(self, prices_path: Path):
-        data = load(prices_path)
-
-        end_time = (
-            FormattedDateTime(list(data.keys())[-1])
-            if self.end_time is None
-            else self.end_time
-        )
+    def load_data(self, start_time: FormattedDateTime) -> KLineSeries:
+        # only the bars within [start_time, end_time] are read from the store
+        with PROFILER.phase("tester.load_data"):
+            data = self.price_store.read(
+                start_time.ms_timestamp, self.end_time.ms_timestamp
+            )
+        num_bars = int(self.end_time - start_time) // 60 + 1
+        if len(data) != num_bars:
+            raise ValueError(
+                f"{num_bars - len(data)} bars from {start_time.string} to "
+                f"{self.end_time.string} are missing in {self.price_store.path}"
+            )
+        return data
 
-        total_seconds = int(end_time - self.start_time)
-        return {
-            self.start_time + i: KLine(**data[(self.start_time + i).string])
-            for i in range(0, total_seconds + 1, 60)
+    def config_fingerprint(self, strategy_config):
+        config = {
+            "strategy": strategy_config,
+            "symbol": self.symbol,
+            "start_time": self.start_time.string,
+            "window_size": self.window_size,
         }
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+    def data_fingerprint(self, end_time: FormattedDateTime, state=None):
+        # chained over whole days, so a resumed run extends the fingerprint of
+        # its checkpoint instead of hashing the whole prefix again. `state` is
+        # the digest of the whole days so far and the first key after them.
+        times = self.price_store.times
+        digest, begin_key = state or ("", self.start_time.string)
+        begin = np.searchsorted(times, key_times([begin_key])[0])
+        end = np.searchsorted(times, end_time.ms_timestamp, side="right")
+        while True:
+            # keys are local datetimes, so are the days
+            day = time_keys(times[begin : begin + 1])[0][:10]
+            next_day = key_times([f"{day} 00:00:00"])[0] + 86400000
+            day_end = min(np.searchsorted(times, next_day), end)
+            # hashed as the records of the prices files the store replaced
+            bars = self.price_store.rows(begin, day_end)
+            records = [
+                [key, bars[idx].to_dict()]
+                for idx, key in enumerate(time_keys(bars.times))
+            ]
+            if day_end >= end:
+                # the last day may still get bars, so it is hashed on its own
+                fingerprint = hashlib.sha256((digest + json.dumps(records)).encode())
+                return fingerprint.hexdigest(), (digest, records[0][0])
+            digest = hashlib.sha256((digest + json.dumps(records)).encode()).hexdigest()
+            begin = day_end
+
+    def load_checkpoint(self, checkpoint_path: Path, config_fingerprint: str):
+        if not checkpoint_path.exists():
+            return None
+
+        checkpoint = load(checkpoint_path, is_pickle=True)
+        if (
+            checkpoint["config_fingerprint"] != config_fingerprint
+            # checkpoints used to hold the whole strategy
+            or not isinstance(checkpoint["strategy"], dict)
+            or checkpoint["time"] > self.end_time
+            or "pyramid" not in checkpoint["metrics"]
+            or "fingerprint_state" not in checkpoint
+            # only the last day is hashed again, the whole days before it are
+            # covered by the state
+            or checkpoint["data_fingerprint"]
+            != self.data_fingerprint(
+                checkpoint["time"], checkpoint["fingerprint_state"]
+            )[0]
+        ):
+            return None
+        return checkpoint
 
-    def test(self, strategy: BaseStrategy):
+    def update_metrics(self, current_timevalue: TimeValue):
+        self.profit_queue.append(current_timevalue)
+
+        max_profit_time_value = self.profit_queue.max()
+        min_profit_time_value = self.profit_queue.min()
+        diff = max_profit_time_value - min_profit_time_value
+
+        if (
+            max_profit_time_value.time < min_profit_time_value.time
+            and diff > self.max_profit_drop
+        ):
+            self.max_profit_drop = diff
+        elif (
+            max_profit_time_value.time >= min_profit_time_value.time
+            and diff > self.max_profit_gain
+        ):
+            self.max_profit_gain = diff
+
+        if current_timevalue > self.max_profit:
+            self.max_profit = current_timevalue
+        if current_timevalue < self.min_profit:
+            self.min_profit = current_timevalue
+
+    def simulate(self, strategy: BaseStrategy, data: KLineSeries, verbose=True):
         net_profit_history = []
+        is_bankrupt = False
+        progress_bar = tqdm(total=len(data), disable=not verbose)
+        start_idx = 0
+        num_published_fills = len(strategy.ledger)
+        while start_idx < len(data) and not is_bankrupt:
+            end_idx = min(start_idx + self.batch_size, len(data))
+            num_records = len(net_profit_history)
+            with PROFILER.phase("strategy.get_actions_batch"):
+                batch = strategy.get_actions_batch(data, start_idx, end_idx)
+            batch_transactions = defaultdict(list)
+            for idx, transaction in batch or []:
+                batch_transactions[idx].append(transaction)
+
+            for idx in range(start_idx, end_idx):
+                time, kline = data.time(idx), data[idx]
+                is_accepted = True
+                with PROFILER.phase("strategy.get_action"):
+                    if batch is None:
+                        strategy.get_action(time, kline)
+                    elif idx in batch_transactions:
+                        is_accepted = strategy.apply_transactions(
+                            time, kline, batch_transactions[idx]
+                        )
+
+                with PROFILER.phase("tester.snapshot"):
+                    net_profit = strategy.transaction_flow.net_profit(kline.close)
+                    record = {
+                        "time": int(time.timestamp * 1000),
+                        "price": kline.close,
+                        "average_price": strategy.transaction_flow.average_price,
+                        "profit": net_profit,
+                    }
+                    net_profit_history.append(record)
+                    self.pyramid.append(record)
+                    self.last_time, self.last_kline = time, kline
+                    self.current_timevalue = TimeValue(time, net_profit)
+
+                with PROFILER.phase("tester.profit_queue"):
+                    self.update_metrics(self.current_timevalue)
+
+                with PROFILER.phase("tester.check_budget"):
+                    is_bankrupt = not (
+                        strategy.check_budget(kline.low)
+                        and strategy.check_budget(kline.high)
+                    )
+                if is_bankrupt:
+                    if verbose:
+                        print(f"bankrupt time:", time.string)
+                    break
+
+                # the rest of the batch assumed this bar's transactions went
+                # through, so it has to be planned again from the next bar.
+                if not is_accepted:
+                    PROFILER.count("replanned_batches")
+                    break
+            if self.publisher.enabled:
+                self.publish_progress(
+                    strategy, net_profit_history[num_records:], num_published_fills
+                )
+                num_published_fills = len(strategy.ledger)
+            progress_bar.update(idx + 1 - start_idx)
+            PROFILER.count("bars", idx + 1 - start_idx)
+            start_idx = idx + 1
+        progress_bar.close()
+        return net_profit_history, is_bankrupt
+
+    def publish_progress(self, strategy: BaseStrategy, records, num_published_fills):
+        # every batch of bars is streamed as a bounded number of equity points
+        indices = lttb(
+            np.array([record["time"] for record in records], dtype=np.float64),
+            np.array([record["profit"] for record in records]),
+            STREAM_POINTS_PER_BATCH,
+        )
+        self.publisher.publish_many(
+            {"type": "equity", **records[idx]} for idx in indices.tolist()
+        )
+        self.publisher.publish_many(
+            {"type": "fill", **snapshot}
+            for snapshot in strategy.ledger.snapshots(num_published_fills)
+        )
+
+    def add_to_catalog(
+        self, strategy: BaseStrategy, strategy_config, data_fingerprint, is_bankrupt
+    ):
+        result_dir = ResultsPath(f"{strategy.name}/{self.symbol}")
+        # the pyramid files cover the whole run, including the resumed parts
+        metrics = profit_metrics(
+            load(result_dir / "profit_flow_1d.json"),
+            load(result_dir / "profit_flow_1h.json"),
+            strategy.original_budget,
+        )
+        return self.catalog.add_run(
+            {
+                "strategy": strategy.name,
+                "symbol": self.symbol,
+                "config_hash": config_hash(strategy_config),
+                "data_fingerprint": data_fingerprint,
+                "config": json.dumps(strategy_config, sort_keys=True),
+                "start_time": self.start_time.string,
+                "end_time": self.last_time.string,
+                "final_profit": self.current_timevalue.value,
+                "max_profit": self.max_profit.value,
+                "min_profit": self.min_profit.value,
+                "max_drawdown": metrics["max_drawdown"],
+                "sharpe": metrics["sharpe"],
+                "num_fills": len(strategy.ledger),
+                "is_bankrupt": is_bankrupt,
+            },
+            [
+                result_dir / "result.json",
+                result_dir / "profit_flow.json",
+                *(result_dir / f"profit_flow_{name}.json" for name in PYRAMID_LEVELS),
+            ],
+        )
+
+    def test(self, strategy: BaseStrategy, strategy_config=None, resume=True):
         results_path = ResultsPath(f"{strategy.name}/{self.symbol}/result.json")
         profit_path = ResultsPath(f"{strategy.name}/{self.symbol}/profit_flow.json")
+        checkpoint_path = ResultsPath(f"{strategy.name}/{self.symbol}/checkpoint.pkl")
 
-        for time, kline in tqdm(self._data.items(), total=len(self._data)):
-            strategy.get_action(time, kline)
-            net_profit_history.append(
-                {
-                    "time": int(time.timestamp * 1000),
-                    "price": kline.close,
-                    "average_price": strategy.transaction_flow.average_price,
-                    "profit": strategy.transaction_flow.net_profit(kline.close),
-                }
+        config_fingerprint = self.config_fingerprint(strategy_config)
+        checkpoint = (
+            self.load_checkpoint(checkpoint_path, config_fingerprint)
+            if resume and strategy_config is not None
+            else None
+        )
+
+        if checkpoint is not None:
+            strategy.load_state(checkpoint["strategy"])
+            for name, value in checkpoint["metrics"].items():
+                setattr(self, name, value)
+
+            self.last_time, self.last_kline = checkpoint["time"], checkpoint["kline"]
+            self.current_timevalue = checkpoint["current_timevalue"]
+            offsets = checkpoint["offsets"]
+            num_dumped_snapshots = checkpoint["num_dumped_snapshots"]
+
+            # only the new bars are read, after those the indicators need for
+            # them, and the indicators go on from the checkpoint
+            first_time = FormattedDateTime(int(self.price_store.times[0]))
+            warmup_start = max(
+                self.last_time + 60 - strategy.warmup_bars * 60, first_time
             )
-            current_timevalue = TimeValue(
-                time, strategy.transaction_flow.net_profit(kline.close)
+            data = self.load_data(warmup_start)
+            warmup = int(self.last_time + 60 - warmup_start) // 60
+            with PROFILER.phase("strategy.refresh"):
+                strategy.resume(data, checkpoint.get("indicators"))
+            data = data.slice(warmup)
+            print(
+                f"Resume from checkpoint at {self.last_time.string}, {len(data)} new bars"
             )
-            self.profit_queue.append(current_timevalue)
-
-            max_profit_time_value = self.profit_queue.max()
-            min_profit_time_value = self.profit_queue.min()
-            diff = max_profit_time_value - min_profit_time_value
-
-            if (
-                max_profit_time_value.time < min_profit_time_value.time
-                and diff > self.max_profit_drop
-            ):
-                self.max_profit_drop = diff
-            elif (
-                max_profit_time_value.time >= min_profit_time_value.time
-                and diff > self.max_profit_gain
-            ):
-                self.max_profit_gain = diff
-
-            if current_timevalue > self.max_profit:
-                self.max_profit = current_timevalue
-            if current_timevalue < self.min_profit:
-                self.min_profit = current_timevalue
-
-            if not (
-                strategy.check_budget(kline.low) and strategy.check_budget(kline.high)
-            ):
-                print(f"bankrupt time:", time.string)
-                break
-        transaction_snapshots = strategy.transaction_snapshots
-        transaction_snapshots.append(
-            strategy.get_transaction_snapshot(time, kline.close)
-        )
-
-        dump(transaction_snapshots, results_path)
-        dump(net_profit_history, profit_path)
+        else:
+            self.reset_metrics()
+            offsets = {"result": 0, "profit": 0, **{name: 0 for name in PYRAMID_LEVELS}}
+            num_dumped_snapshots = 0
+            data = self.load_data(self.start_time)
+
+        net_profit_history, is_bankrupt = self.simulate(strategy, data)
+        data_fingerprint, fingerprint_state = self.data_fingerprint(
+            self.last_time,
+            checkpoint["fingerprint_state"] if checkpoint is not None else None,
+        )
+
+        with PROFILER.phase("tester.dump"):
+            offsets = {
+                **offsets,
+                "result": dump_list(
+                    strategy.ledger.snapshots(num_dumped_snapshots),
+                    results_path,
+                    offset=offsets["result"],
+                    tail=[
+                        strategy.get_transaction_snapshot(
+                            self.last_time, self.last_kline.close
+                        )
+                    ],
+                ),
+                "profit": dump_list(
+                    net_profit_history, profit_path, offset=offsets["profit"]
+                ),
+            }
+            # the open bucket of every level is rewritten by the next run
+            for name, buckets in self.pyramid.flush().items():
+                offsets[name] = dump_list(
+                    buckets,
+                    ResultsPath(
+                        f"{strategy.name}/{self.symbol}/profit_flow_{name}.json"
+                    ),
+                    offset=offsets[name],
+                    tail=[self.pyramid.open_buckets[name]],
+                )
+
+            # a bankrupt run cannot be extended, so the next run starts over
+            if is_bankrupt:
+                checkpoint_path.unlink(missing_ok=True)
+            elif strategy_config is not None:
+                dump(
+                    {
+                        "config_fingerprint": config_fingerprint,
+                        "data_fingerprint": data_fingerprint,
+                        "fingerprint_state": fingerprint_state,
+                        "time": self.last_time,
+                        "kline": self.last_kline,
+                        "current_timevalue": self.current_timevalue,
+                        "strategy": strategy.state(),
+                        "indicators": strategy.indicator_state(self.last_time),
+                        "metrics": {
+                            "profit_queue": self.profit_queue,
+                            "max_profit_drop": self.max_profit_drop,
+                            "max_profit_gain": self.max_profit_gain,
+                            "min_profit": self.min_profit,
+                            "max_profit": self.max_profit,
+                            "pyramid": self.pyramid,
+                        },
+                        "offsets": offsets,
+                        "num_dumped_snapshots": len(strategy.ledger),
+                    },
+                    checkpoint_path,
+                    is_pickle=True,
+                )
+
+        if self.catalog is not None and strategy_config is not None:
+            with PROFILER.phase("tester.catalog"):
+                run_id = self.add_to_catalog(
+                    strategy, strategy_config, data_fingerprint, is_bankrupt
+                )
+            print(f"Recorded as run {run_id} in {self.catalog.path}")
+
         print("=" * 100)
         print(
             f"Max Profit Time: {self.max_profit.time}, Value: {self.max_profit.value}"
@@ -112,7 +402,7 @@ class Tester:
         print(
             f"Min Profit Time: {self.min_profit.time}, Value: {self.min_profit.value}"
         )
-        print(f"Final Net Profit: {current_timevalue.value}", end="\n" * 2)
+        print(f"Final Net Profit: {self.current_timevalue.value}", end="\n" * 2)
 
         print(
             f"Max Profit Drop Time: {self.max_profit_drop.time}, Value: {self.max_profit_drop.value}"
@@ -121,28 +411,145 @@ class Tester:
             f"Max Profit Gain Time: {self.max_profit_gain.time}, Value: {self.max_profit_gain.value}"
         )
         print("=" * 100, end="\n" * 2)
+        PROFILER.print_report()
+        return strategy
+
+
+_robustness_worker = {}
+
+
+def init_robustness_worker(shm_name, shape, times, tester_args, strategy_config):
+    # paths are read in place from shared memory, tasks only carry their index
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _robustness_worker.update(
+        shm=shm,
+        paths=np.ndarray(shape, dtype=np.float64, buffer=shm.buf),
+        times=times,
+        tester_args=tester_args,
+        strategy_config=strategy_config,
+    )
+
 
+def run_robustness_path(path_idx, warmup):
+    series = KLineSeries(
+        _robustness_worker["times"], *_robustness_worker["paths"][path_idx]
+    )
+    strategy_config = _robustness_worker["strategy_config"]
+    strategy = STRATEGY_MAP[strategy_config["name"]](**strategy_config["config"])
+    strategy.refresh(series)
+
+    tester = Tester(*_robustness_worker["tester_args"])
+    net_profit_history, is_bankrupt = tester.simulate(
+        strategy, series.slice(warmup), verbose=False
+    )
+    profits = np.array([record["profit"] for record in net_profit_history])
+    return {
+        "path": path_idx,
+        "final_profit": float(profits[-1]),
+        "max_drawdown": float(np.max(np.maximum.accumulate(profits) - profits)),
+        "is_bankrupt": is_bankrupt,
+    }
+
+
+def robustness_test(
+    tester: Tester,
+    strategy_config,
+    num_paths: int,
+    method="bootstrap",
+    seed=1102,
+    num_workers=None,
+    warmup=1440,
+):
+    # indicators of the synthetic paths are warmed up on the bars before start_time
+    first_time = FormattedDateTime(int(tester.price_store.times[0]))
+    warmup_start = max(tester.start_time - warmup * 60, first_time)
+    series = tester.load_data(warmup_start)
+    warmup = int(tester.start_time - warmup_start) // 60
+    # every path needs bars left to test once its indicators are warmed up
+    if len(series) <= warmup:
+        raise ValueError(
+            f"No bars to test from {tester.start_time.string} to "
+            f"{tester.end_time.string} after a warmup of {warmup} bars"
+        )
+
+    shape = (num_paths, 4, len(series))
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    try:
+        paths = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        generate_variants(series, num_paths, method, seed, out=paths)
+
+        tester_args = (
+            tester.start_time,
+            tester.end_time,
+            tester.symbol,
+            tester.window_size,
+            tester.batch_size,
+        )
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=init_robustness_worker,
+            initargs=(shm.name, shape, series.times, tester_args, strategy_config),
+        ) as executor:
+            results = list(
+                tqdm(
+                    executor.map(
+                        run_robustness_path, range(num_paths), [warmup] * num_paths
+                    ),
+                    total=num_paths,
+                )
+            )
+        del paths
+    finally:
+        shm.close()
+        shm.unlink()
+
+    summary = {
+        "method": method,
+        "seed": seed,
+        "num_paths": num_paths,
+        "bankruptcy_rate": float(np.mean([r["is_bankrupt"] for r in results])),
+    }
+    for key in ["final_profit", "max_drawdown"]:
+        values = np.array([r[key] for r in results])
+        summary[key] = {
+            "mean": float(values.mean()),
+            "std": float(values.std()),
+            **{
+                f"p{q}": float(np.percentile(values, q))
+                for q in [1, 5, 25, 50, 75, 95, 99]
+            },
+        }
 
-def fetch_price(start_time, end_time=None, symbol="btcusdt", interval="1m"):
+    strategy_name = STRATEGY_MAP[strategy_config["name"]]._name
+    dump(
+        {"summary": summary, "paths": results},
+        ResultsPath(f"{strategy_name}/{tester.symbol}/robustness_{method}.json"),
+    )
+
+    print("=" * 100)
+    print(f"Robustness ({method}, {num_paths} paths, seed {seed})")
+    print(f"Bankruptcy Rate: {summary['bankruptcy_rate']:.2%}")
+    for key in ["final_profit", "max_drawdown"]:
+        print(
+            f"{key}: "
+            + ", ".join(f"{name}={value:.4f}" for name, value in summary[key].items())
+        )
+    print("=" * 100, end="\n" * 2)
+    return summary
+
+
+def fetch_price(start_time, end_time=None, symbols=("btcusdt",), intervals=("1m",)):
     if end_time is None:
         end_time = datetime.now() - timedelta(minutes=1)
     end_time = FormattedDateTime(end_time)
-    fetch_amount = int((end_time - start_time) // 60)
-    commands = [
-        PYTHON_PATH,
-        "-m",
-        "script.price_fetcher",
-        "--symbol",
-        symbol,
-        "--total_num",
-        str(fetch_amount),
-        "--end_time",
-        end_time.string,
-        "--interval",
-        interval,
-    ]
-    print("+", " ".join(commands))
-    subprocess.run(commands)
+
+    async def fetch():
+        async with BinancePriceFetcher() as fetcher:
+            await fetcher.fetch_many(
+                symbols, intervals, end_time.string, start_time=start_time.string
+            )
+
+    asyncio.run(fetch())
 
 
 def argument_parsing():
@@ -158,20 +565,69 @@ def argument_parsing():
         default=StrategyPath("config/grid_trading_config.json"),
     )
     parser.add_argument("--window_size", type=int, default=1440)
+    parser.add_argument("--batch_size", type=int, default=10000)
     parser.add_argument("--fetch_price", action="store_true", default=False)
+    parser.add_argument("--no_resume", action="store_true", default=False)
+    parser.add_argument("--robustness", type=int, default=0)
+    parser.add_argument(
+        "--robustness_method",
+        type=str,
+        default="bootstrap",
+        choices=list(VARIANT_GENERATORS.keys()),
+    )
+    parser.add_argument("--seed", type=int, default=1102)
+    parser.add_argument("--num_workers", type=int, default=None)
+    parser.add_argument("--profile", action="store_true", default=False)
+    parser.add_argument(
+        "--stream_url",
+        type=str,
+        default=STREAM_URL,
+        help="Dashboard server to stream the progress to, e.g., http://localhost:9898",
+    )
+    parser.add_argument("--no_catalog", action="store_true", default=False)
 
     return parser.parse_args()
 
 
 def main(args):
+    if args.profile:
+        PROFILER.enable()
+
     if args.fetch_price:
         logging.info("Fetching price")
-        for interval in ["1m", "3m", "5m", "15m"]:
-            fetch_price(args.start_time, args.end_time, args.symbol, interval)
+        fetch_price(
+            args.start_time, args.end_time, [args.symbol], ["1m", "3m", "5m", "15m"]
+        )
+
+    tester = Tester(
+        args.start_time,
+        args.end_time,
+        args.symbol,
+        args.window_size,
+        args.batch_size,
+    )
+    strategy_config = load(args.strategy_config_path)
+    if args.robustness > 0:
+        robustness_test(
+            tester,
+            strategy_config,
+            args.robustness,
+            args.robustness_method,
+            args.seed,
+            args.num_workers,
+        )
+        return
 
-    tester = Tester(args.start_time, args.end_time, args.symbol, args.window_size)
-    strategy = get_strategy(load(args.strategy_config_path))
-    tester.test(strategy)
+    strategy = get_strategy(strategy_config)
+    tester.publisher = get_publisher(args.stream_url, strategy.name, args.symbol)
+    if not args.no_catalog:
+        tester.catalog = RunCatalog(ResultsPath("catalog.sqlite"))
+    try:
+        tester.test(strategy, strategy_config, resume=not args.no_resume)
+    finally:
+        tester.publisher.close()
+        if tester.catalog is not None:
+            tester.catalog.close()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,9 @@
 from dataclasses import dataclass
+from typing import Dict
+
+import numpy as np
+
+from protocol.datetime import FormattedDateTime
 
 
 @dataclass
@@ -16,6 +21,92 @@ class KLine:
             "close": self.close,
         }
 
+    @classmethod
+    def concatenate(cls, series_list) -> "KLineSeries":
+        return cls(
+            *(
+                np.concatenate([getattr(series, name) for series in series_list])
+                for name in ["times", "open", "high", "low", "close"]
+            )
+        )
+
     @classmethod
     def from_api(cls, data):
         return cls(float(data[1]), float(data[2]), float(data[3]), float(data[4]))
+
+
+@dataclass
+class KLineSeries:
+    # columnar klines, `times` holds the open time of each bar in ms
+    times: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, idx) -> KLine:
+        return KLine(
+            float(self.open[idx]),
+            float(self.high[idx]),
+            float(self.low[idx]),
+            float(self.close[idx]),
+        )
+
+    def time(self, idx) -> FormattedDateTime:
+        return FormattedDateTime(int(self.times[idx]))
+
+    def slice(self, start_idx=None, end_idx=None) -> "KLineSeries":
+        return KLineSeries(
+            *(
+                getattr(self, name)[start_idx:end_idx]
+                for name in ["times", "open", "high", "low", "close"]
+            )
+        )
+
+    def resample(self, minutes: int) -> "KLineSeries":
+        # bars are bucketed by their open time, aligned to multiples of `minutes`
+        buckets = self.times // (minutes * 60000)
+        starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+        ends = np.append(starts[1:], len(self)) - 1
+        return KLineSeries(
+            buckets[starts] * minutes * 60000,
+            self.open[starts],
+            np.maximum.reduceat(self.high, starts),
+            np.minimum.reduceat(self.low, starts),
+            self.close[ends],
+        )
+
+    def to_dict(self) -> Dict[FormattedDateTime, KLine]:
+        return dict(self.items())
+
+    def items(self):
+        for idx in range(len(self)):
+            yield self.time(idx), self[idx]
+
+    @classmethod
+    def concatenate(cls, series_list) -> "KLineSeries":
+        return cls(
+            *(
+                np.concatenate([getattr(series, name) for series in series_list])
+                for name in ["times", "open", "high", "low", "close"]
+            )
+        )
+
+    @classmethod
+    def from_api(cls, data):
+        # rows of the klines api, open times first and prices as strings
+        columns = np.array([row[:5] for row in data], dtype=object).reshape(-1, 5).T
+        return cls(columns[0].astype(np.int64), *columns[1:].astype(np.float64))
+
+    @classmethod
+    def from_dict(cls, data: Dict[FormattedDateTime, KLine]):
+        return cls(
+            np.fromiter((t.ms_timestamp for t in data), dtype=np.int64),
+            np.fromiter((k.open for k in data.values()), dtype=np.float64),
+            np.fromiter((k.high for k in data.values()), dtype=np.float64),
+            np.fromiter((k.low for k in data.values()), dtype=np.float64),
+            np.fromiter((k.close for k in data.values()), dtype=np.float64),
+        )
@@ -0,0 +1,112 @@
+from array import array
+from typing import Any, Dict, List
+
+from protocol.datetime import FormattedDateTime
+from protocol.transaction import Transaction, TransactionFlow, TransactionType
+
+COLUMNS = {
+    "time": "q",
+    "side": "b",
+    "price": "d",
+    "amount": "d",
+    "fee": "d",
+    "current_price": "d",
+    "position": "d",
+    "average_price": "d",
+    "realized_profit": "d",
+}
+
+
+class TransactionLedger:
+    # one typed array per column, snapshot dicts are only built on export
+    def __init__(self):
+        for name, typecode in COLUMNS.items():
+            setattr(self, name, array(typecode))
+
+    def __len__(self):
+        return len(self.time)
+
+    def append(
+        self,
+        time: FormattedDateTime,
+        transaction: Transaction,
+        transaction_flow: TransactionFlow,
+        current_price: float,
+    ):
+        self.time.append(time.ms_timestamp)
+        self.side.append(transaction.mode.value)
+        self.price.append(transaction.price)
+        self.amount.append(transaction.amount)
+        self.fee.append(transaction.transaction_fee)
+        self.current_price.append(current_price)
+        self.position.append(transaction_flow.amount)
+        self.average_price.append(transaction_flow.average_price)
+        self.realized_profit.append(transaction_flow.realized_profit)
+
+    @property
+    def last_time(self) -> FormattedDateTime:
+        return FormattedDateTime(self.time[-1]) if len(self) > 0 else None
+
+    def transaction_flow(self, idx: int) -> TransactionFlow:
+        return TransactionFlow(
+            self.position[idx], self.average_price[idx], self.realized_profit[idx]
+        )
+
+    def snapshot(self, idx: int) -> Dict[str, Any]:
+        time = FormattedDateTime(self.time[idx])
+        return {
+            "formattedTime": time,
+            "timestamp": time.timestamp,
+            "transaction_flow": self.transaction_flow(idx).dump(
+                self.current_price[idx]
+            ),
+            "transaction": {
+                "mode": TransactionType(self.side[idx]).name,
+                "price": self.price[idx],
+                "amount": self.amount[idx],
+            },
+        }
+
+    def snapshots(self, start_idx: int = 0) -> List[Dict[str, Any]]:
+        return [self.snapshot(idx) for idx in range(start_idx, len(self))]
+
+    def columns(self) -> Dict[str, array]:
+        # copies, so later fills do not show up in a state taken before them
+        return {
+            name: array(typecode, getattr(self, name))
+            for name, typecode in COLUMNS.items()
+        }
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, array]):
+        ledger = cls()
+        for name, typecode in COLUMNS.items():
+            setattr(ledger, name, array(typecode, columns[name]))
+        return ledger
+
+    @classmethod
+    def from_snapshots(cls, snapshots: List[Dict[str, Any]]):
+        # rebuilds the ledger of strategies pickled with their snapshot dicts
+        ledger = cls()
+        for snapshot in snapshots:
+            transaction = Transaction(
+                snapshot["transaction"]["mode"],
+                snapshot["transaction"]["price"],
+                snapshot["transaction"]["amount"],
+                snapshot["formattedTime"],
+            )
+            flow = snapshot["transaction_flow"][0]
+            current_price = (
+                flow["average_price"] + flow["unrealized_profit"] / flow["amount"]
+                if flow["amount"] != 0
+                else transaction.price
+            )
+            ledger.append(
+                transaction.time,
+                transaction,
+                TransactionFlow(
+                    flow["amount"], flow["average_price"], flow["realized_profit"]
+                ),
+                current_price,
+            )
+        return ledger
@@ -1,9 +1,7 @@
-from collections import deque
 from dataclasses import dataclass
 
-from sortedcontainers import SortedList
-
 from protocol.datetime import FormattedDateTime
+from utils.rolling import RollingMax, RollingMin
 
 
 @dataclass
@@ -43,24 +41,25 @@ class TimeValue:
 class TimeValueQueue:
     def __init__(self, max_size):
         self.max_size = max_size
-        self.sorted_values = SortedList()
-        self.time_queue = deque()
-        self.time_to_value = {}
+        self.rolling_min = RollingMin(max_size)
+        self.rolling_max = RollingMax(max_size)
+
+    def __setstate__(self, state):
+        # queues pickled before the rolling windows kept a sorted list
+        if "time_queue" in state:
+            time_to_value = state["time_to_value"]
+            self.__init__(state["max_size"])
+            for time in state["time_queue"]:
+                self.append(time_to_value[time])
+            return
+        self.__dict__.update(state)
 
     def append(self, time_value: TimeValue) -> None:
-        # Check for max size and remove oldest entry if needed
-        if len(self.time_queue) >= self.max_size:
-            oldest_time = self.time_queue.popleft()
-            oldest_value = self.time_to_value.pop(oldest_time)
-            self.sorted_values.remove(oldest_value)
-
-        # Insert new entry
-        self.time_queue.append(time_value.time)
-        self.time_to_value[time_value.time] = time_value
-        self.sorted_values.add(time_value)
+        self.rolling_min.append(time_value)
+        self.rolling_max.append(time_value)
 
     def min(self) -> TimeValue:
-        return self.sorted_values[0] if self.sorted_values else None
+        return self.rolling_min.value
 
     def max(self) -> TimeValue:
-        return self.sorted_values[-1] if self.sorted_values else None
+        return self.rolling_max.value
@@ -91,27 +91,7 @@ class TransactionFlow:
         )
 
     def __add__(self, other: Union["TransactionFlow", Transaction]):
-        if isinstance(other, Transaction):
-            other = TransactionFlow.from_transaction(other)
-
-        amount = self.amount + other.amount
-        realized_profit = other.realized_profit
-
-        if self.amount * other.amount < 0:
-            realized_profit += (other.average_price - self.average_price) * -(
-                other.amount
-            )
-            average_price = 0 if amount == 0 else self.average_price
-        else:
-            average_price = (
-                self.average_price * self.amount + other.average_price * other.amount
-            ) / amount
-
-        return TransactionFlow(
-            round(amount, self.rounding),
-            round(average_price, self.rounding),
-            round(self.realized_profit + realized_profit, self.rounding),
-        )
+        return PositionAccumulator.from_flow(self) + other
 
     @classmethod
     def from_transaction(cls, transaction: Transaction):
@@ -144,6 +124,146 @@ class TransactionFlow:
         )
 
 
+# fixed-point units of the accumulator: prices in ticks of 1e-10, amounts in
+# lots of 1e-10 and fee ratios in parts per million. realized profits are kept
+# in units of tick * lot / FEE_SCALE, so fees stay integral as well.
+PRICE_SCALE = 10**10
+LOT_SCALE = 10**10
+FEE_SCALE = 10**6
+PROFIT_SCALE = PRICE_SCALE * LOT_SCALE * FEE_SCALE
+
+
+def fill_position(lots, cost, realized, net_lots, price_ticks, fee_ppm):
+    realized -= price_ticks * abs(net_lots) * fee_ppm
+    if lots == 0 or (lots > 0) == (net_lots > 0):
+        return lots + net_lots, cost + price_ticks * net_lots, realized
+
+    sign = 1 if lots > 0 else -1
+    closed_lots = min(abs(net_lots), abs(lots))
+    # the remainder of the division stays in the position's cost, so closing a
+    # position entirely always releases its whole cost
+    closed_cost = sign * (abs(cost) * closed_lots // abs(lots))
+    realized += (sign * closed_lots * price_ticks - closed_cost) * FEE_SCALE
+    lots -= sign * closed_lots
+    cost -= closed_cost
+
+    # the rest of the fill opens a position on the other side
+    opened_lots = net_lots + sign * closed_lots
+    return lots + opened_lots, cost + price_ticks * opened_lots, realized
+
+
+class PositionAccumulator:
+    # mutable, integer-based counterpart of TransactionFlow
+    __slots__ = [
+        "lots",
+        "cost",
+        "realized",
+        "amount",
+        "average_price",
+        "realized_profit",
+    ]
+
+    def __init__(self, lots: int = 0, cost: int = 0, realized: int = 0):
+        self.set(lots, cost, realized)
+
+    def set(self, lots: int, cost: int, realized: int):
+        self.lots, self.cost, self.realized = lots, cost, realized
+        # floats for reporting, refreshed on every fill rather than every read
+        self.amount = lots / LOT_SCALE
+        self.average_price = cost / lots / PRICE_SCALE if lots != 0 else 0
+        self.realized_profit = realized / PROFIT_SCALE
+
+    def __getstate__(self):
+        return self.lots, self.cost, self.realized
+
+    def __setstate__(self, state):
+        self.set(*state)
+
+    def __repr__(self):
+        return f"PositionAccumulator(amount={self.amount:.3f}, average_price={self.average_price:.1f}, realized_profit={self.realized_profit:.4f})"
+
+    @classmethod
+    def from_flow(cls, flow: TransactionFlow):
+        lots = round(flow.amount * LOT_SCALE)
+        return cls(
+            lots,
+            round(flow.average_price * PRICE_SCALE) * lots,
+            round(flow.realized_profit * PROFIT_SCALE),
+        )
+
+    @staticmethod
+    def fill_arguments(transaction: Transaction):
+        return (
+            round(transaction.net_amount * LOT_SCALE),
+            round(transaction.price * PRICE_SCALE),
+            round(transaction.fee_ratio * FEE_SCALE),
+        )
+
+    def copy(self):
+        return PositionAccumulator(self.lots, self.cost, self.realized)
+
+    def add(self, other: Union[Transaction, TransactionFlow, "PositionAccumulator"]):
+        if isinstance(other, Transaction):
+            self.set(
+                *fill_position(
+                    self.lots, self.cost, self.realized, *self.fill_arguments(other)
+                )
+            )
+            return self
+
+        # a flow is merged as a fee-free fill at its average price
+        if isinstance(other, TransactionFlow):
+            other = PositionAccumulator.from_flow(other)
+        lots, cost, realized = self.lots, self.cost, self.realized + other.realized
+        if other.lots != 0:
+            lots, cost, realized = fill_position(
+                lots, cost, realized, other.lots, round(other.cost / other.lots), 0
+            )
+        self.set(lots, cost, realized)
+        return self
+
+    def __iadd__(self, other: Union[Transaction, TransactionFlow]):
+        return self.add(other)
+
+    def __add__(self, other: Union[Transaction, TransactionFlow]) -> TransactionFlow:
+        return self.copy().add(other).to_flow()
+
+    def net_profit_after(self, transaction: Transaction, current_price: float):
+        # net profit if `transaction` were filled, without touching the position
+        lots, cost, realized = fill_position(
+            self.lots, self.cost, self.realized, *self.fill_arguments(transaction)
+        )
+        return (
+            current_price * lots / LOT_SCALE
+            - cost / (PRICE_SCALE * LOT_SCALE)
+            + realized / PROFIT_SCALE
+        )
+
+    def unrealized_profit(self, current_price=None):
+        if current_price is None:
+            current_price = get_btcusdt_futures_price()
+
+        if self.average_price == 0:
+            return 0
+        return (current_price - self.average_price) * self.amount
+
+    def net_profit(self, current_price=None, funding_rate=0):
+        if current_price is None:
+            current_price = get_btcusdt_futures_price()
+        return (
+            self.unrealized_profit(current_price) + self.realized_profit + funding_rate
+        )
+
+    def to_flow(self) -> TransactionFlow:
+        return TransactionFlow(self.amount, self.average_price, self.realized_profit)
+
+    def to_dict(self):
+        return self.to_flow().to_dict()
+
+    def dump(self, current_price):
+        return self.to_flow().dump(current_price)
+
+
 def read_transactions(filename):
     with open(filename) as f:
         transactions = [Transaction.from_dict(d) for d in json.load(f)]
@@ -0,0 +1,222 @@
+import argparse
+import platform
+import random
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from main import Tester
+from protocol.transaction import PositionAccumulator, Transaction, TransactionFlow
+from strategy import STRATEGY_MAP
+from strategy.kdj_grid_trading.kdj_counter import KDJCalculator
+from utils.config import ResultsPath, StrategyPath
+from utils.json import dump, load
+from utils.price_store import PriceStore
+from utils.synthetic import generate_gbm_series
+
+# bundled configs, all tuned around the 0.8 start price of the synthetic series
+STRATEGY_CONFIGS = {
+    "grid_trading": "config/grid_trading_config.json",
+    "kdj_grid_trading": "config/kdj_grid_trading_config.json",
+    "kdj_time": "config/kdj_time_config.json",
+    "optimal": "config/local_optimal_config.json",
+    "dca": "config/dca_config.json",
+}
+WARMUP_BARS = 1440
+
+
+def bench_tester(series, strategy_name):
+    strategy_config = load(StrategyPath(STRATEGY_CONFIGS[strategy_name]))
+    config = {
+        **strategy_config["config"],
+        "symbol": "synthetic",
+        # large enough that no strategy goes bankrupt halfway through
+        "budget": 1e12,
+    }
+    strategy = STRATEGY_MAP[strategy_config["name"]](**config)
+    strategy.refresh(series)
+
+    # the first bars only warm up the indicators
+    series = series.slice(WARMUP_BARS)
+    tester = Tester(series.time(0), series.time(len(series) - 1), "synthetic")
+    start = time.perf_counter()
+    net_profit_history, _ = tester.simulate(strategy, series, verbose=False)
+    return time.perf_counter() - start, len(net_profit_history)
+
+
+def bench_kdj(series):
+    historical_prices = series.to_dict()
+    start = time.perf_counter()
+    KDJCalculator(historical_prices).calculate_kdj()
+    return time.perf_counter() - start, len(series)
+
+
+def bench_transaction_flow(series, transaction_flow_cls=TransactionFlow):
+    rng = random.Random(1102)
+    transactions = [
+        Transaction(rng.choice(["BUY", "SELL"]), price, rng.randint(1, 10), ms_time)
+        for ms_time, price in zip(series.times.tolist(), series.close.tolist())
+    ]
+    transaction_flow = transaction_flow_cls()
+    start = time.perf_counter()
+    for transaction in transactions:
+        transaction_flow += transaction
+    return time.perf_counter() - start, len(transactions)
+
+
+def bench_json(series):
+    prices = {bar_time: kline.to_dict() for bar_time, kline in series.items()}
+    with tempfile.TemporaryDirectory() as directory:
+        path = f"{directory}/prices.json"
+        start = time.perf_counter()
+        dump(prices, path)
+        load(path)
+        return time.perf_counter() - start, len(series)
+
+
+def bench_price_store(series):
+    with tempfile.TemporaryDirectory() as directory:
+        store = PriceStore(f"{directory}/prices")
+        start = time.perf_counter()
+        store.append(series)
+        store.read()
+        return time.perf_counter() - start, len(series)
+
+
+BENCHMARKS = {
+    "kdj": bench_kdj,
+    "transaction_flow": bench_transaction_flow,
+    "position_accumulator": lambda series: bench_transaction_flow(
+        series, PositionAccumulator
+    ),
+    "json": bench_json,
+    "price_store": bench_price_store,
+    **{
+        f"tester/{name}": lambda series, name=name: bench_tester(series, name)
+        for name in STRATEGY_CONFIGS
+    },
+}
+
+
+def run_benchmark(name, num_bars, seed, trace_allocations):
+    # runs in a fresh process, so the peak rss belongs to this benchmark alone
+    series = generate_gbm_series(num_bars, seed=seed)
+    if trace_allocations:
+        tracemalloc.start()
+    seconds, num_processed = BENCHMARKS[name](series)
+    result = {
+        "name": name,
+        "bars": num_bars,
+        "seconds": seconds,
+        "bars_per_second": num_processed / seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    if trace_allocations:
+        result["peak_allocated_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+
+def compare(results, baseline, tolerance):
+    baseline = {(r["name"], r["bars"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = baseline.get((result["name"], result["bars"]))
+        if base is None:
+            continue
+        ratio = result["bars_per_second"] / base["bars_per_second"]
+        flag = "REGRESSION" if ratio < 1 - tolerance else ""
+        print(f"{result['name']:<30}{result['bars']:>12}{ratio:>10.2f}x  {flag}")
+        if flag:
+            regressions.append(result)
+    return regressions
+
+
+def argument_parsing():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the backtest engine on seeded synthetic prices"
+    )
+    parser.add_argument(
+        "--benchmarks",
+        type=str,
+        nargs="+",
+        default=list(BENCHMARKS.keys()),
+        choices=list(BENCHMARKS.keys()),
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000, 1_000_000],
+        help="Number of 1m bars to benchmark on, e.g., up to 50000000",
+    )
+    parser.add_argument("--seed", type=int, default=1102)
+    parser.add_argument("--trace_allocations", action="store_true", default=False)
+    parser.add_argument(
+        "--output_path",
+        type=str,
+        default=ResultsPath(f"benchmark/{time.strftime('%Y%m%d-%H%M%S')}.json"),
+    )
+    parser.add_argument(
+        "--baseline_path",
+        type=str,
+        default=None,
+        help="Results of a previous run to compare against",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed relative drop in bars per second before flagging a regression",
+    )
+
+    return parser.parse_args()
+
+
+def main(args):
+    results = []
+    for num_bars in args.sizes:
+        for name in args.benchmarks:
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+                result = executor.submit(
+                    run_benchmark, name, num_bars, args.seed, args.trace_allocations
+                ).result()
+            print(
+                f"{name:<30}{num_bars:>12}{result['bars_per_second']:>16.0f} bars/s"
+                f"{result['peak_rss_mb']:>12.1f} MB"
+            )
+            results.append(result)
+
+    commit = subprocess.run(
+        ["git", "rev-parse", "HEAD"], capture_output=True, text=True
+    ).stdout.strip()
+    dump(
+        {
+            "meta": {
+                "commit": commit,
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "seed": args.seed,
+            },
+            "results": results,
+        },
+        args.output_path,
+    )
+    print(f"Saved to {args.output_path}")
+
+    if args.baseline_path is not None:
+        regressions = compare(results, load(args.baseline_path), args.tolerance)
+        if regressions:
+            exit(1)
+
+
+if __name__ == "__main__":
+    args = argument_parsing()
+    main(args)
@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import time
+from collections import deque
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+from protocol.kline import KLine, KLineSeries
+from script.price_fetcher import BinancePriceFetcher, FetchError, interval_ms
+from strategy.kdj_grid_trading.kdj_counter import StreamingKDJ
+from utils.price_store import price_store
+from utils.rate_limit import backoff_delay
+
+# bars fetched for a symbol and interval without stored prices
+INITIAL_BARS = 1440
+# KDJ values kept per symbol and interval for the `/kdj` endpoint
+KDJ_HISTORY = 1440
+
+
+class KlineStore:
+    # closed bars of one symbol and interval, appended to its price store in
+    # batches, along with the streaming KDJ of every bar
+    def __init__(self, symbol: str, interval: str):
+        self.symbol = symbol
+        self.interval = interval
+        self.step = interval_ms(interval)
+        self.store = price_store(symbol, interval)
+        self.pending = []
+        self.kdj = StreamingKDJ()
+        self.kdjs = deque(maxlen=KDJ_HISTORY)
+        # held while bars are backfilled, so streamed bars wait their turn
+        self.lock = asyncio.Lock()
+        # keeps the batches written in order
+        self.write_lock = asyncio.Lock()
+
+        # the indicator state continues from the whole stored history
+        stored = self.store.read()
+        for idx, open_time in enumerate(stored.times.tolist()):
+            self.update_kdj(open_time, stored[idx])
+        self.last_time = self.store.last_time
+
+    def update_kdj(self, open_time: int, kline: KLine):
+        kdj = self.kdj.update(kline)
+        if kdj is not None:
+            self.kdjs.append((open_time, *kdj))
+
+    def append(self, series: KLineSeries):
+        # bars already stored are skipped, e.g., when a backfill overlaps the stream
+        if self.last_time is not None:
+            series = series.slice(
+                np.searchsorted(series.times, self.last_time, side="right")
+            )
+        if len(series) == 0:
+            return
+        for idx, open_time in enumerate(series.times.tolist()):
+            self.update_kdj(open_time, series[idx])
+        self.pending.append(series)
+        self.last_time = int(series.times[-1])
+
+    @property
+    def num_pending(self):
+        return sum(len(series) for series in self.pending)
+
+    async def flush(self):
+        # one write and one fsync per column and batch of bars, off the event loop
+        async with self.write_lock:
+            pending, self.pending = self.pending, []
+            if not pending:
+                return 0
+            return await asyncio.to_thread(
+                self.store.append, KLineSeries.concatenate(pending), fsync=True
+            )
+
+    def kdj_at(self, end_time: int):
+        # the KDJ of the last bar closed by `end_time`
+        for open_time, *kdj in reversed(self.kdjs):
+            if open_time + self.step <= end_time:
+                return kdj
+        return None
+
+
+class KlineDaemon:
+    def __init__(
+        self,
+        symbols,
+        intervals,
+        ws_url: str,
+        fetcher: BinancePriceFetcher,
+        flush_interval: float = 5.0,
+        flush_size: int = 1000,
+    ):
+        self.stores = {
+            (symbol.lower(), interval): KlineStore(symbol.lower(), interval)
+            for symbol in symbols
+            for interval in intervals
+        }
+        streams = "/".join(
+            f"{symbol}@kline_{interval}" for symbol, interval in self.stores
+        )
+        self.url = f"{ws_url.rstrip('/')}/stream?streams={streams}"
+        self.fetcher = fetcher
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+
+    async def flush(self, store: KlineStore):
+        num_flushed = await store.flush()
+        if num_flushed:
+            logging.info(f"Stored {num_flushed} {store.symbol} {store.interval} bars")
+
+    async def backfill(self, store: KlineStore, until: int):
+        # fetches the bars missing up to the bar opened at `until`
+        if store.last_time is None:
+            total_num = INITIAL_BARS
+        else:
+            total_num = (until - store.last_time) // store.step
+        if total_num <= 0:
+            return
+
+        logging.info(f"Backfilling {total_num} {store.symbol} {store.interval} bars")
+        async for series in self.fetcher.stream_historical_prices(
+            store.symbol.upper(), store.interval, total_num, until
+        ):
+            store.append(series)
+            await self.flush(store)
+
+    async def backfill_all(self):
+        # bars closed while disconnected, as of the local clock
+        now = int(time.time() * 1000)
+        await asyncio.gather(
+            *(
+                self.backfill_locked(store, now // store.step * store.step - store.step)
+                for store in self.stores.values()
+            )
+        )
+
+    async def backfill_locked(self, store: KlineStore, until: int):
+        async with store.lock:
+            await self.backfill(store, until)
+
+    async def on_kline(self, kline):
+        if not kline["x"]:
+            return
+        store = self.stores[(kline["s"].lower(), kline["i"])]
+        series = KLineSeries.from_api(
+            [[kline["t"], kline["o"], kline["h"], kline["l"], kline["c"]]]
+        )
+        async with store.lock:
+            # a gap means bars were missed, they are fetched before this one
+            if (
+                store.last_time is not None
+                and kline["t"] > store.last_time + store.step
+            ):
+                await self.backfill(store, kline["t"] - store.step)
+            store.append(series)
+            if store.num_pending >= self.flush_size:
+                await self.flush(store)
+
+    async def stream(self):
+        # failures reconnect with backoff, and the reconnection backfills
+        # whatever they left out
+        attempt = 0
+        while True:
+            try:
+                async with self.fetcher.session.ws_connect(
+                    self.url, heartbeat=30
+                ) as ws:
+                    logging.info(f"Connected to {self.url}")
+                    await self.backfill_all()
+                    async for message in ws:
+                        if message.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        await self.on_kline(json.loads(message.data)["data"]["k"])
+                        attempt = 0
+                logging.warning("Stream closed")
+            except (aiohttp.ClientError, FetchError) as e:
+                logging.warning(f"Stream failed: {e}")
+            except (KeyError, TypeError, ValueError) as e:
+                # frames that are not klines, or not even json
+                logging.warning(f"Stream sent a malformed frame: {e!r}")
+            delay = backoff_delay(attempt)
+            attempt += 1
+            logging.info(f"Reconnecting in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            for store in self.stores.values():
+                await self.flush(store)
+
+    async def get_kdj(self, request: web.Request):
+        # the endpoint queried by `OnlineKDJTimeStrategy`
+        query = request.query
+        store = self.stores.get((query["symbol"].lower(), query["interval"]))
+        if store is None:
+            raise web.HTTPNotFound(text="Symbol or interval is not ingested")
+        kdj = store.kdj_at(int(query.get("end_time", time.time() * 1000)))
+        if kdj is None:
+            raise web.HTTPNotFound(text="No KDJ before end_time")
+        return web.json_response(kdj)
+
+    async def run(self, port: int):
+        app = web.Application()
+        app.router.add_get("/kdj", self.get_kdj)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        try:
+            await asyncio.gather(self.stream(), self.flush_loop())
+        finally:
+            for store in self.stores.values():
+                await self.flush(store)
+            await runner.cleanup()
+
+
+def argument_parsing():
+    parser = argparse.ArgumentParser(
+        description="Keep the stored prices current from the kline streams of Binance"
+    )
+    parser.add_argument("--symbol", type=str, nargs="+", default=["BTCUSDT"])
+    parser.add_argument(
+        "--interval", type=str, nargs="+", default=["1m", "3m", "5m", "15m"]
+    )
+    parser.add_argument(
+        "--ws_url",
+        type=str,
+        default="wss://fstream.binance.com",
+        help="Stream to subscribe to, e.g., the mock server of script.mock_binance",
+    )
+    parser.add_argument(
+        "--base_url",
+        type=str,
+        default=BinancePriceFetcher.BINANCE_API_URL,
+        help="Api to backfill missed bars from",
+    )
+    parser.add_argument(
+        "--flush_interval",
+        type=float,
+        default=5.0,
+        help="Seconds between writes of the received bars",
+    )
+    parser.add_argument(
+        "--flush_size",
+        type=int,
+        default=1000,
+        help="Bars of a symbol and interval received before they are written early",
+    )
+    parser.add_argument(
+        "--port", type=int, default=8000, help="Port of the `/kdj` endpoint"
+    )
+
+    return parser.parse_args()
+
+
+async def main(args):
+    # stopping the daemon writes the bars received so far
+    task = asyncio.current_task()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(sig, task.cancel)
+
+    async with BinancePriceFetcher(args.base_url) as fetcher:
+        daemon = KlineDaemon(
+            args.symbol,
+            args.interval,
+            args.ws_url,
+            fetcher,
+            args.flush_interval,
+            args.flush_size,
+        )
+        try:
+            await daemon.run(args.port)
+        except asyncio.CancelledError:
+            logging.info("Stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    args = argument_parsing()
+    asyncio.run(main(args))
@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import math
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from script.price_fetcher import interval_ms, request_weight
+
+# a local stand-in for the klines endpoint and the kline streams of the futures
+# api, serving deterministic synthetic bars. it enforces the request weight
+# limit per minute like the exchange, and injects throttling, server errors,
+# truncated responses and dropped streams to exercise the fetcher and the
+# kline daemon.
+
+
+def synthetic_kline(open_time: int, step: int):
+    rng = random.Random(open_time)
+    open_ = 100 * (1 + 0.2 * math.sin(open_time / 86400000 * math.tau))
+    close = open_ * (1 + rng.gauss(0, 0.002))
+    high = max(open_, close) * (1 + abs(rng.gauss(0, 0.001)))
+    low = min(open_, close) * (1 - abs(rng.gauss(0, 0.001)))
+    return [
+        open_time,
+        str(open_),
+        str(high),
+        str(low),
+        str(close),
+        str(rng.uniform(0, 1000)),
+        open_time + step - 1,
+    ]
+
+
+class MockBinance:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.window_start = time.monotonic()
+        self.used_weight = 0
+        self.stats = Counter()
+        # the clock of the streams, which may run faster than the wall clock
+        self.started = time.monotonic()
+        self.origin = int(time.time() * 1000) // 60000 * 60000
+
+    def stream_time(self):
+        elapsed = time.monotonic() - self.started
+        return self.origin + int(elapsed / self.args.bar_seconds * 60000)
+
+    def spend(self, weight: int):
+        now = time.monotonic()
+        if now - self.window_start >= self.args.window:
+            self.window_start += (
+                (now - self.window_start) // self.args.window * (self.args.window)
+            )
+            self.used_weight = 0
+        self.used_weight += weight
+        retry_after = self.window_start + self.args.window - now
+        return self.used_weight <= self.args.weight_limit, retry_after
+
+    async def klines(self, request: web.Request):
+        query = request.query
+        limit = min(int(query.get("limit", 500)), 1500)
+        is_allowed, retry_after = self.spend(request_weight(limit))
+        headers = {"X-MBX-USED-WEIGHT-1M": str(self.used_weight)}
+        self.stats["requests"] += 1
+
+        if self.args.latency > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.args.latency))
+
+        if not is_allowed:
+            self.stats["rate_limited"] += 1
+            headers["Retry-After"] = str(math.ceil(retry_after))
+            return web.json_response(
+                {"code": -1003, "msg": "Too many requests"}, status=429, headers=headers
+            )
+        if self.rng.random() < self.args.throttle_rate:
+            self.stats["throttled"] += 1
+            headers["Retry-After"] = "1"
+            return web.json_response(
+                {"code": -1003, "msg": "Too many requests"}, status=429, headers=headers
+            )
+        if self.rng.random() < self.args.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response(
+                {"code": -1001, "msg": "Internal error"}, status=503, headers=headers
+            )
+
+        step = interval_ms(query["interval"])
+        start_time = max(int(query["startTime"]), self.args.listing_time)
+        first_open = -(-start_time // step) * step
+        end_time = int(query["endTime"])
+        klines = [
+            synthetic_kline(open_time, step)
+            for open_time in range(first_open, end_time + 1, step)[:limit]
+        ]
+        if klines and self.rng.random() < self.args.truncate_rate:
+            self.stats["truncated"] += 1
+            klines = klines[: len(klines) // 2]
+        self.stats["served"] += 1
+        self.stats["bars"] += len(klines)
+        return web.json_response(klines, headers=headers)
+
+    async def stream(self, request: web.Request):
+        # combined kline streams, e.g., `?streams=btcusdt@kline_1m/btcusdt@kline_5m`
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.stats["connections"] += 1
+
+        streams = [
+            stream.split("@kline_") for stream in request.query["streams"].split("/")
+        ]
+        now = self.stream_time()
+        # the bar currently open on every stream, closed bars are sent once over
+        next_opens = [
+            now // interval_ms(interval) * interval_ms(interval)
+            for _, interval in streams
+        ]
+        num_sent = 0
+        # reading answers the close of the client, which ends the loop below
+        reader = asyncio.ensure_future(self.drain(ws))
+        try:
+            while not ws.closed:
+                now = self.stream_time()
+                for idx, (symbol, interval) in enumerate(streams):
+                    step = interval_ms(interval)
+                    while next_opens[idx] + step <= now:
+                        await ws.send_json(
+                            self.stream_message(symbol, interval, next_opens[idx], True)
+                        )
+                        next_opens[idx] += step
+                        num_sent += 1
+                        if num_sent == self.args.disconnect_after:
+                            self.stats["disconnected"] += 1
+                            await ws.close()
+                            return ws
+                    # the bar still open is updated as well, like on the exchange
+                    await ws.send_json(
+                        self.stream_message(symbol, interval, next_opens[idx], False)
+                    )
+                await asyncio.sleep(min(0.5, self.args.bar_seconds / 4))
+        except ConnectionResetError:
+            # the client went away between two messages
+            pass
+        finally:
+            reader.cancel()
+        return ws
+
+    async def drain(self, ws: web.WebSocketResponse):
+        async for _ in ws:
+            pass
+
+    def stream_message(self, symbol: str, interval: str, open_time: int, is_closed):
+        kline = synthetic_kline(open_time, interval_ms(interval))
+        return {
+            "stream": f"{symbol}@kline_{interval}",
+            "data": {
+                "e": "kline",
+                "E": int(time.time() * 1000),
+                "s": symbol.upper(),
+                "k": {
+                    "t": open_time,
+                    "T": kline[6],
+                    "s": symbol.upper(),
+                    "i": interval,
+                    "o": kline[1],
+                    "h": kline[2],
+                    "l": kline[3],
+                    "c": kline[4],
+                    "v": kline[5],
+                    "x": is_closed,
+                },
+            },
+        }
+
+    async def get_stats(self, request: web.Request):
+        return web.json_response(dict(self.stats))
+
+
+def argument_parsing(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Mock of the Binance futures klines api for testing the fetcher"
+    )
+    parser.add_argument("--port", type=int, default=9797)
+    parser.add_argument("--weight_limit", type=int, default=2400)
+    parser.add_argument(
+        "--window", type=float, default=60, help="Seconds the weight limit spans"
+    )
+    parser.add_argument("--throttle_rate", type=float, default=0.0)
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--truncate_rate", type=float, default=0.0)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Mean response latency in seconds"
+    )
+    parser.add_argument(
+        "--listing_time", type=int, default=0, help="No bars before this ms timestamp"
+    )
+    parser.add_argument(
+        "--bar_seconds",
+        type=float,
+        default=60,
+        help="Seconds a 1m bar of the streams lasts, lower to speed the streams up",
+    )
+    parser.add_argument(
+        "--disconnect_after",
+        type=int,
+        default=0,
+        help="Closed bars sent before a stream is dropped, 0 to never drop it",
+    )
+    parser.add_argument("--seed", type=int, default=1102)
+
+    return parser.parse_args(argv)
+
+
+def create_app(mock: MockBinance) -> web.Application:
+    app = web.Application()
+    app.router.add_get("/fapi/v1/klines", mock.klines)
+    app.router.add_get("/stream", mock.stream)
+    app.router.add_get("/stats", mock.get_stats)
+    return app
+
+
+def main(args):
+    web.run_app(create_app(MockBinance(args)), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    args = argument_parsing()
+    main(args)
@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import random
+from collections import Counter
+
+from aiohttp import web
+
+# a local stand-in for `chat.postMessage` of the slack api, to exercise the
+# notifications of the trader. it injects latency, rate limiting and server
+# errors, and keeps the posted messages for inspection at `/messages`.
+
+
+class MockSlack:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.messages = []
+        self.stats = Counter()
+
+    async def post_message(self, request: web.Request):
+        if request.content_type == "application/json":
+            data = await request.json()
+        else:
+            data = await request.post()
+        self.stats["requests"] += 1
+
+        if self.args.latency > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.args.latency))
+
+        if self.rng.random() < self.args.rate_limit_rate:
+            self.stats["rate_limited"] += 1
+            return web.json_response(
+                {"ok": False, "error": "ratelimited"},
+                status=429,
+                headers={"Retry-After": "1"},
+            )
+        if self.rng.random() < self.args.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response(
+                {"ok": False, "error": "internal_error"}, status=500
+            )
+
+        self.stats["posted"] += 1
+        self.messages.append({"channel": data.get("channel"), "text": data["text"]})
+        return web.json_response(
+            {"ok": True, "channel": data.get("channel"), "ts": str(len(self.messages))}
+        )
+
+    async def get_messages(self, request: web.Request):
+        return web.json_response(self.messages)
+
+    async def get_stats(self, request: web.Request):
+        return web.json_response(dict(self.stats))
+
+
+def argument_parsing(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Mock of the slack api for testing the notifications"
+    )
+    parser.add_argument("--port", type=int, default=9696)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Mean response latency in seconds"
+    )
+    parser.add_argument("--rate_limit_rate", type=float, default=0.0)
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1102)
+
+    return parser.parse_args(argv)
+
+
+def create_app(mock: MockSlack) -> web.Application:
+    app = web.Application()
+    app.router.add_post("/api/chat.postMessage", mock.post_message)
+    app.router.add_get("/messages", mock.get_messages)
+    app.router.add_get("/stats", mock.get_stats)
+    return app
+
+
+def main(args):
+    web.run_app(create_app(MockSlack(args)), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    args = argument_parsing()
+    main(args)
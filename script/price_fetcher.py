@@ -1,20 +1,80 @@
 import argparse
 import asyncio
-from datetime import datetime, timedelta
+import logging
+from collections import deque
+from datetime import datetime
 
 import aiohttp
+import numpy as np
 
 from protocol.datetime import FormattedDateTime
-from protocol.kline import KLine
-from utils.config import DataPath
-from utils.json import dump
+from protocol.kline import KLineSeries
+from utils.price_store import PriceStore, price_store
+from utils.rate_limit import TokenBucket, backoff_delay
+
+INTERVAL_SECONDS = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+# request weight limit of the futures api per minute and ip
+WEIGHT_LIMIT = 2400
+# windows fetched ahead of the oldest one not yet stored
+MAX_PENDING_WINDOWS = 32
+
+
+def interval_ms(interval: str) -> int:
+    return int(interval[:-1]) * INTERVAL_SECONDS[interval[-1]] * 1000
+
+
+def count_bars(start_time, end_time, interval: str) -> int:
+    # number of bars opened within [start_time, end_time]
+    step = interval_ms(interval)
+    return (
+        FormattedDateTime(end_time).ms_timestamp // step
+        - -(-FormattedDateTime(start_time).ms_timestamp // step)
+        + 1
+    )
+
+
+def request_weight(limit: int) -> int:
+    # weight of a klines request on the futures api, by number of bars
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+class FetchError(Exception):
+    pass
+
+
+class RetryableFetchError(FetchError):
+    pass
 
 
 class BinancePriceFetcher:
     BINANCE_API_URL = "https://fapi.binance.com"
 
-    def __init__(self):
-        self.session = aiohttp.ClientSession()
+    def __init__(
+        self,
+        base_url: str = BINANCE_API_URL,
+        weight_limit: int = WEIGHT_LIMIT,
+        max_in_flight: int = 8,
+        max_retries: int = 6,
+    ):
+        self.base_url = base_url
+        # one pool of connections, shared by every symbol and interval
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_in_flight),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+        # the server counts weight in fixed minutes, so a burst of `capacity`
+        # right before a new minute must still fit into the previous one
+        capacity = weight_limit / 10
+        self.limiter = TokenBucket(capacity, (weight_limit - capacity) / 60)
+        self.weight_limit = weight_limit
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.max_retries = max_retries
 
     async def __aenter__(self):
         return self
@@ -22,69 +82,199 @@ class BinancePriceFetcher:
     async def __aexit__(self, *args, **kwargs):
         await self.session.close()
 
+    async def request_window(self, symbol, interval, start_time, end_time, limit):
+        params = {
+            "symbol": symbol,
+            "interval": interval,
+            "startTime": start_time,
+            "endTime": end_time,
+            "limit": limit,
+        }
+        await self.limiter.acquire(request_weight(limit))
+        async with self.semaphore:
+            try:
+                async with self.session.get(
+                    f"{self.base_url}/fapi/v1/klines", params=params
+                ) as response:
+                    used_weight = response.headers.get("X-MBX-USED-WEIGHT-1M")
+                    if used_weight is not None:
+                        self.limiter.sync(self.weight_limit - int(used_weight))
+
+                    if response.status in (418, 429):
+                        retry_after = float(response.headers.get("Retry-After", 60))
+                        self.limiter.pause(retry_after)
+                        raise RetryableFetchError(
+                            f"Throttled for {retry_after}s ({response.status})"
+                        )
+                    if response.status >= 500:
+                        raise RetryableFetchError(f"Server error ({response.status})")
+                    if response.status != 200:
+                        raise FetchError(
+                            f"Failed to fetch {params}: {response.status}, "
+                            f"{await response.text()}"
+                        )
+                    return await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise RetryableFetchError(f"{type(e).__name__}: {e}")
+
     async def fetch_historical_prices(
-        self, symbol, interval, max_num_per_request, start_time
+        self, symbol, interval, start_time, end_time, limit
     ):
-        try:
-            url = f"{self.BINANCE_API_URL}/fapi/v1/klines"
-            params = {
-                "symbol": symbol,
-                "interval": interval,
-                "limit": max_num_per_request,
-                "endTime": start_time,
-            }
-            async with self.session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    prices = {
-                        int(item[0])
-                        // 1000: KLine(
-                            float(item[1]),
-                            float(item[2]),
-                            float(item[3]),
-                            float(item[4]),
-                        ).to_dict()
-                        for item in data
-                    }
-                    return prices
-                else:
-                    print(
-                        f"Failed to fetch historical prices from Binance API: {response.status}"
+        # klines opened within [start_time, end_time], retried on throttling,
+        # server errors and dropped connections
+        for attempt in range(self.max_retries + 1):
+            try:
+                data = await self.request_window(
+                    symbol, interval, start_time, end_time, limit
+                )
+                break
+            except RetryableFetchError as e:
+                if attempt == self.max_retries:
+                    raise FetchError(
+                        f"Failed to fetch {symbol} {interval} from {start_time} "
+                        f"to {end_time} after {attempt + 1} attempts: {e}"
                     )
-                    return {}
-        except Exception as e:
-            print(f"Error fetching historical prices from Binance API: {str(e)}")
-            return {}
+                delay = backoff_delay(attempt)
+                logging.warning(f"{e}, retry in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+        series = KLineSeries.from_api(data)
+        return series.slice(
+            np.searchsorted(series.times, start_time),
+            np.searchsorted(series.times, end_time, side="right"),
+        )
 
-    def split_endtimes(self, total_num, end_time=None, batch_size=1000):
+    async def fetch_window(self, symbol, interval, window):
+        # bars are served in order, so a window missing its last bar was cut
+        # short and is requested again, after the same backoff as failed
+        # requests. empty windows and bars missing before the last one do not
+        # exist on the exchange, e.g., before the listing or during maintenance.
+        series = await self.fetch_historical_prices(symbol, interval, *window)
+        for attempt in range(self.max_retries):
+            if len(series) == 0 or series.times[-1] == window[1]:
+                break
+            delay = backoff_delay(attempt)
+            logging.warning(
+                f"{symbol} {interval} window from {window[0]} was cut short after "
+                f"{len(series)} bars, retry in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+            refetched = await self.fetch_historical_prices(symbol, interval, *window)
+            if len(refetched) >= len(series):
+                series = refetched
+        return series
+
+    def split_windows(self, total_num, interval="1m", end_time=None, batch_size=1000):
+        # [start, end] open times of `total_num` bars up to `end_time`, oldest first
         if end_time is None:
             end_time = datetime.now()
+        step = interval_ms(interval)
+        last_open = FormattedDateTime(end_time).ms_timestamp // step * step
+        first_open = last_open - (total_num - 1) * step
+        windows = []
+        for offset in range(0, total_num, batch_size):
+            num = min(batch_size, total_num - offset)
+            start = first_open + offset * step
+            windows.append((start, start + (num - 1) * step, num))
+        return windows
+
+    async def stream_historical_prices(
+        self, symbol, interval, total_num, end_time, max_pending=MAX_PENDING_WINDOWS
+    ):
+        # yields the windows as `KLineSeries` in time order. at most
+        # `max_pending` windows are requested ahead of the one to yield next,
+        # windows completed early wait in that queue, so memory does not grow
+        # with the number of bars. a window that still fails after its retries
+        # fails the whole fetch, rather than leaving a hole in the stored prices.
+        windows = self.split_windows(total_num, interval, end_time)
+        pending = deque()
+        num_fetched = 0
+        try:
+            for window in windows:
+                pending.append(
+                    asyncio.create_task(self.fetch_window(symbol, interval, window))
+                )
+                if len(pending) >= max_pending:
+                    series = await pending.popleft()
+                    num_fetched += len(series)
+                    yield series
+            while pending:
+                series = await pending.popleft()
+                num_fetched += len(series)
+                yield series
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if num_fetched < total_num:
+            logging.warning(
+                f"{total_num - num_fetched} of {total_num} {symbol} {interval} bars "
+                "are missing on the exchange"
+            )
+
+    async def append_historical_prices(
+        self, store: PriceStore, symbol, interval, total_num, end_time
+    ):
+        num_stored = 0
+        async for series in self.stream_historical_prices(
+            symbol.upper(), interval, total_num, end_time
+        ):
+            # writing must not hold back the requests of the other jobs
+            num_stored += await asyncio.to_thread(store.append, series)
+        return num_stored
+
+    async def fetch_and_store(self, symbol, interval, total_num, end_time):
+        store = price_store(symbol, interval)
+        first_open = self.split_windows(total_num, interval, end_time)[0][0]
+        # windows that continue the stored bars are appended as they arrive.
+        # any other range is written aside, and replaces the stored bars once
+        # all of its windows are written.
+        if len(store) and (
+            store.times[0] <= first_open <= store.last_time + interval_ms(interval)
+        ):
+            num_stored = await self.append_historical_prices(
+                store, symbol, interval, total_num, end_time
+            )
         else:
-            end_time = FormattedDateTime(end_time).datetime
-        closest_now = datetime(
-            end_time.year, end_time.month, end_time.day, end_time.hour, end_time.minute
-        )
-        return [
-            int((closest_now - timedelta(minutes=i)).timestamp()) * 1000
-            for i in range(0, total_num, batch_size)
-        ]
+            with store.replace() as temp:
+                num_stored = await self.append_historical_prices(
+                    temp, symbol, interval, total_num, end_time
+                )
+        print(f"Stored {num_stored} {symbol} {interval} bars")
+        return store
 
     async def fetch_all_historical_prices(self, symbol, interval, total_num, end_time):
-        endtimes = self.split_endtimes(total_num, end_time)
-        tasks = [
-            self.fetch_historical_prices(symbol, interval, 1000, endtime)
-            for endtime in endtimes
-        ]
-        historical_prices = await asyncio.gather(*tasks)
-        historical_prices = {
-            FormattedDateTime(timestamp): price
-            for prices in historical_prices
-            for timestamp, price in prices.items()
-        }
-        sorted_historical_prices = dict(
-            sorted(historical_prices.items(), key=lambda x: x[0].timestamp)
+        # stored on the way, so only the typed columns are held in memory
+        if end_time is None:
+            end_time = datetime.now()
+        store = await self.fetch_and_store(symbol, interval, total_num, end_time)
+        windows = self.split_windows(total_num, interval, end_time)
+        return store.read(windows[0][0], windows[-1][1])
+
+    async def fetch_many(
+        self, symbols, intervals, end_time, total_num=None, start_time=None
+    ):
+        # every symbol and interval shares the session and the rate limit. jobs
+        # are queued in order, so each is stored as soon as it is complete
+        # rather than after the whole universe.
+        if end_time is None:
+            end_time = datetime.now()
+        await asyncio.gather(
+            *(
+                self.fetch_and_store(
+                    symbol,
+                    interval,
+                    (
+                        total_num
+                        if start_time is None
+                        else count_bars(start_time, end_time, interval)
+                    ),
+                    end_time,
+                )
+                for symbol in symbols
+                for interval in intervals
+            )
         )
-        return sorted_historical_prices
 
 
 def argument_parsing():
@@ -94,20 +284,28 @@ def argument_parsing():
     parser.add_argument(
         "--symbol",
         type=str,
-        default="BTCUSDT",
-        help="Symbol to fetch historical prices for",
+        nargs="+",
+        default=["BTCUSDT"],
+        help="Symbols to fetch historical prices for",
     )
     parser.add_argument(
         "--interval",
         type=str,
-        default="1m",
-        help="Interval to fetch historical prices for",
+        nargs="+",
+        default=["1m"],
+        help="Intervals to fetch historical prices for",
     )
     parser.add_argument(
         "--total_num",
         type=int,
         default=100,
-        help="Total number of historical prices to fetch",
+        help="Total number of historical prices to fetch per interval",
+    )
+    parser.add_argument(
+        "--start_time",
+        type=str,
+        default=None,
+        help="Start time of the historical prices to fetch, instead of --total_num",
     )
     parser.add_argument(
         "--end_time",
@@ -115,25 +313,37 @@ def argument_parsing():
         default=None,
         help="End time of the historical prices to fetch",
     )
+    parser.add_argument(
+        "--base_url",
+        type=str,
+        default=BinancePriceFetcher.BINANCE_API_URL,
+        help="Api to fetch from, e.g., the mock server of script.mock_binance",
+    )
+    parser.add_argument(
+        "--weight_limit",
+        type=int,
+        default=WEIGHT_LIMIT,
+        help="Request weight to spend per minute",
+    )
+    parser.add_argument(
+        "--max_in_flight",
+        type=int,
+        default=8,
+        help="Maximum number of concurrent requests",
+    )
 
     return parser.parse_args()
 
 
 async def main(args):
-    async with BinancePriceFetcher() as fetcher:
-        historical_prices = await fetcher.fetch_all_historical_prices(
-            args.symbol.upper(), args.interval, args.total_num, args.end_time
+    async with BinancePriceFetcher(
+        args.base_url, args.weight_limit, args.max_in_flight
+    ) as fetcher:
+        await fetcher.fetch_many(
+            args.symbol, args.interval, args.end_time, args.total_num, args.start_time
         )
 
-        dump(historical_prices, args.output_path)
-
 
 if __name__ == "__main__":
     args = argument_parsing()
-    args.output_path = (
-        DataPath(f"{args.symbol.lower()}/prices.json")
-        if args.interval == "1m"
-        else DataPath(f"{args.symbol.lower()}/prices{args.interval}.json")
-    )
-
     asyncio.run(main(args))
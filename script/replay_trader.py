@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import shutil
+from time import perf_counter
+
+from protocol.datetime import FormattedDateTime
+from strategy import get_strategy
+from trader import TraderHost
+from utils.clock import SimulatedClock
+from utils.config import ResultsPath, StatusPath
+from utils.json import load
+from utils.latency import LATENCY
+from utils.price_store import price_store
+from utils.profiler import PROFILER
+from utils.simulated_exchange import FillModel, SimulatedExchange
+from utils.slack import NULL_NOTIFIER
+
+
+def bot_paths(strategy_config):
+    # everything a bot keeps between runs
+    name, symbol = strategy_config["name"], strategy_config["config"]["symbol"]
+    return [
+        StatusPath(f"trader/{name}/{symbol}"),
+        StatusPath(f"strategy/{name}/{symbol.lower()}"),
+        ResultsPath(f"trader/{name}/{symbol}"),
+    ]
+
+
+def argument_parsing():
+    parser = argparse.ArgumentParser(
+        description="Replay the trader against stored prices on a simulated exchange"
+    )
+    parser.add_argument("--strategy_config_path", type=str, nargs="+", required=True)
+    parser.add_argument("--start_time", type=str, required=True)
+    parser.add_argument("--end_time", type=str, required=True)
+    parser.add_argument(
+        "--min_cross",
+        type=float,
+        default=0.0,
+        help="Relative distance the price must trade through a limit order to fill it",
+    )
+    parser.add_argument(
+        "--order_latency",
+        type=int,
+        default=0,
+        help="Milliseconds before a placed order can fill",
+    )
+    parser.add_argument("--order_timeout", type=float, default=50)
+    parser.add_argument("--poll_interval", type=float, default=0.5)
+    parser.add_argument("--max_poll_interval", type=float, default=8.0)
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        default=False,
+        help="Remove the status and results the bots left from earlier runs",
+    )
+    parser.add_argument("--profile", action="store_true", default=False)
+
+    return parser.parse_args()
+
+
+async def main(args):
+    strategy_configs = [load(path) for path in args.strategy_config_path]
+    # a replay must neither resume from nor clobber the status of a live bot
+    for strategy_config in strategy_configs:
+        for path in bot_paths(strategy_config):
+            if path.exists() and not args.overwrite:
+                raise SystemExit(
+                    f"{path} exists, point STATUS_ROOT and RESULTS_ROOT to a scratch "
+                    "directory or pass --overwrite"
+                )
+            shutil.rmtree(path, ignore_errors=True)
+
+    start_time = FormattedDateTime(args.start_time).ms_timestamp
+    end_time = FormattedDateTime(args.end_time).ms_timestamp
+    clock = SimulatedClock(start_time, end_time)
+    symbols = {config["config"]["symbol"] for config in strategy_configs}
+    exchange = SimulatedExchange(
+        {symbol: price_store(symbol).read() for symbol in symbols},
+        clock,
+        FillModel(args.min_cross, args.order_latency),
+    )
+
+    host = TraderHost(exchange, NULL_NOTIFIER)
+    for strategy_config in strategy_configs:
+        host.add(
+            get_strategy(strategy_config),
+            order_timeout=args.order_timeout,
+            poll_interval=args.poll_interval,
+            max_poll_interval=args.max_poll_interval,
+            verbose=False,
+        )
+
+    start = perf_counter()
+    await host.run()
+    elapsed = perf_counter() - start
+
+    print("=" * 100)
+    num_minutes = (end_time - start_time) / 60000
+    print(
+        f"Replayed {num_minutes:.0f} minutes in {elapsed:.2f}s "
+        f"({num_minutes * 60 / elapsed:.0f}x real time)"
+    )
+    print(
+        f"Orders: {exchange.stats['orders']}, filled: {exchange.stats['filled']}, "
+        f"cancelled: {exchange.stats['cancelled']}"
+    )
+    for (name, symbol), trader in host.traders.items():
+        series = exchange.series[symbol.upper()]
+        last_price = float(series.close[exchange.bar_index(symbol.upper(), end_time)])
+        print(
+            f"{name} {symbol}: {len(trader.strategy.ledger)} fills, "
+            f"net profit {trader.strategy.transaction_flow.net_profit(last_price)}"
+        )
+    print("=" * 100, end="\n" * 2)
+    # stages timed on the clock are simulated, the others are measured
+    LATENCY.print_report()
+
+
+if __name__ == "__main__":
+    args = argument_parsing()
+    if args.profile:
+        PROFILER.enable()
+    asyncio.run(main(args))
+    PROFILER.print_report()
@@ -21,7 +21,11 @@ def get_strategy(strategy_config):
     strategy_class = STRATEGY_MAP[strategy_config["name"]]
     new_strategy = strategy_class(**strategy_config["config"])
 
-    if new_strategy.dump_path and new_strategy.dump_path.exists():
-        return load(new_strategy.dump_path, is_pickle=True)
+    # the mutable state is restored onto a strategy built from the config, the
+    # whole strategies pickled before are read once and saved as state then
+    if new_strategy.state_path.exists():
+        new_strategy.load_state(load(new_strategy.state_path, is_pickle=True))
+    elif new_strategy.dump_path.exists():
+        new_strategy.load_state(load(new_strategy.dump_path, is_pickle=True).state())
 
     return new_strategy
@@ -1,15 +1,28 @@
 from abc import abstractmethod
-from typing import List
+from typing import List, Optional, Tuple
 
 from protocol.datetime import FormattedDateTime
-from protocol.kline import KLine
-from protocol.transaction import Transaction, TransactionFlow
+from protocol.kline import KLine, KLineSeries
+from protocol.ledger import TransactionLedger
+from protocol.transaction import (
+    PositionAccumulator,
+    Transaction,
+    TransactionFlow,
+)
 from utils.config import StatusPath
 from utils.json import dump
 
+# layout of the state written by `BaseStrategy.dump`, bumped on every change
+STATE_VERSION = 1
+
 
 class BaseStrategy:
     _name = "base"
+    # mutable attributes saved along with the position and the ledger, the
+    # others follow from the config or are rebuilt by `refresh`
+    _state_fields = ()
+    # bars before a bar that its indicators are computed from
+    warmup_bars = 0
 
     def __init__(
         self,
@@ -20,16 +33,28 @@ class BaseStrategy:
     ):
         self.original_budget = budget
         self.leverage = leverage
-        self._transaction_snapshots = []
-        self.transaction_flow = TransactionFlow()
+        self.ledger = TransactionLedger()
+        self.transaction_flow = PositionAccumulator()
 
         self._symbol = symbol
         self._dump_path = (
             StatusPath() / "strategy" / self.name / symbol.lower() / dump_path
         )
 
+    def __setstate__(self, state):
+        # strategies pickled before the ledger kept a list of snapshot dicts
+        if "_transaction_snapshots" in state:
+            state["ledger"] = TransactionLedger.from_snapshots(
+                state.pop("_transaction_snapshots")
+            )
+        if isinstance(state.get("transaction_flow"), TransactionFlow):
+            state["transaction_flow"] = PositionAccumulator.from_flow(
+                state["transaction_flow"]
+            )
+        self.__dict__.update(state)
+
     def is_empty(self):
-        return len(self._transaction_snapshots) == 0
+        return len(self.ledger) == 0
 
     @property
     def symbol(self):
@@ -43,9 +68,13 @@ class BaseStrategy:
     def dump_path(self):
         return self._dump_path
 
+    @property
+    def state_path(self):
+        return self._dump_path.with_suffix(".state")
+
     @property
     def transaction_snapshots(self):
-        return self._transaction_snapshots
+        return self.ledger.snapshots()
 
     @property
     def current_average_price(self):
@@ -56,9 +85,9 @@ class BaseStrategy:
         return self.transaction_flow.amount
 
     def get_last_transaction_snapshot(self) -> Transaction:
-        if len(self._transaction_snapshots) == 0:
+        if len(self.ledger) == 0:
             return None
-        return self._transaction_snapshots[-1]
+        return self.ledger.snapshot(-1)
 
     def get_last_transaction(self):
         last_snapshot = self.get_last_transaction_snapshot()
@@ -79,9 +108,7 @@ class BaseStrategy:
 
     def update_transaction(self, time, transaction, current_price):
         self.transaction_flow += transaction
-        self._transaction_snapshots.append(
-            self.get_transaction_snapshot(time, current_price, transaction)
-        )
+        self.ledger.append(time, transaction, self.transaction_flow, current_price)
 
     def check_budget(
         self, current_price: float, transaction_flow: TransactionFlow = None
@@ -91,8 +118,53 @@ class BaseStrategy:
         total_budget = self.original_budget + transaction_flow.net_profit(current_price)
         return total_budget > 0
 
+    def check_budget_after(self, transaction: Transaction, current_price: float):
+        net_profit = self.transaction_flow.net_profit_after(transaction, current_price)
+        return self.original_budget + net_profit > 0
+
+    def state(self):
+        # plain values and arrays only, so the state does not depend on the
+        # classes of the strategy
+        return {
+            "version": STATE_VERSION,
+            "name": self.name,
+            "symbol": self.symbol,
+            "position": self.transaction_flow.__getstate__(),
+            "ledger": self.ledger.columns(),
+            "fields": {name: getattr(self, name) for name in self._state_fields},
+        }
+
+    def load_state(self, state):
+        if state["version"] != STATE_VERSION:
+            raise ValueError(f"Unsupported strategy state version: {state['version']}")
+        if (state["name"], state["symbol"]) != (self.name, self.symbol):
+            raise ValueError(
+                f"State of {state['name']} on {state['symbol']} does not belong to "
+                f"{self.name} on {self.symbol}"
+            )
+        self.transaction_flow = PositionAccumulator(*state["position"])
+        self.ledger = TransactionLedger.from_columns(state["ledger"])
+        for name, value in state["fields"].items():
+            setattr(self, name, value)
+
     def dump(self):
-        dump(self, self.dump_path, is_pickle=True)
+        dump(self.state(), self.state_path, is_pickle=True, atomic=True)
+
+    def refresh(self, series: KLineSeries = None):
+        # rebuild data derived from the price history, e.g., after the strategy
+        # is restored from a checkpoint and new prices have arrived. `series`
+        # replaces the stored prices, e.g., for synthetic price paths.
+        pass
+
+    def indicator_state(self, time: FormattedDateTime):
+        # what `resume` needs to continue the indicators after the bar at
+        # `time`, None if they have to be computed over the whole history
+        return None
+
+    def resume(self, series: KLineSeries, indicator_state=None):
+        # `refresh` for a strategy restored from a checkpoint. `series` holds
+        # the new bars, after the `warmup_bars` bars before them.
+        self.refresh()
 
     @abstractmethod
     def _get_action(
@@ -100,18 +172,29 @@ class BaseStrategy:
     ) -> List[Transaction]:
         raise NotImplementedError
 
+    def get_actions_batch(
+        self, series: KLineSeries, start_idx: int, end_idx: int
+    ) -> Optional[List[Tuple[int, Transaction]]]:
+        # optional vectorized path, returns the transactions of
+        # series[start_idx:end_idx] with their bar indices, assuming all of
+        # them would be accepted. returning None falls back to `get_action`.
+        return None
+
     @abstractmethod
     def get_action(self, time: FormattedDateTime, kline):
         transactions = self._get_action(time, kline)
+        self.apply_transactions(time, kline, transactions)
 
+    def apply_transactions(
+        self, time: FormattedDateTime, kline, transactions: List[Transaction]
+    ) -> bool:
         if transactions is not None and len(transactions) > 0:
             for transaction in transactions:
                 transaction.amount *= self.leverage
 
-                if not self.check_budget(
-                    kline.close, self.transaction_flow + transaction
-                ):
+                if not self.check_budget_after(transaction, kline.close):
                     print("Budget is not enough")
-                    break
+                    return False
                 else:
                     self.update_transaction(time, transaction, kline.close)
+        return True
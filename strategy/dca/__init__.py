@@ -1,4 +1,7 @@
+import numpy as np
+
 from protocol.datetime import FormattedDateTime
+from protocol.kline import KLineSeries
 from protocol.transaction import Transaction
 from strategy.base import BaseStrategy
 
@@ -28,19 +31,44 @@ class DCAStrategy(BaseStrategy):
             return 86400 * 7 * 30
 
     def _get_action(self, time: FormattedDateTime, kline):
-        last_transaction_snapshot = self.get_last_transaction_snapshot()
+        last_time = self.ledger.last_time
 
         amount = self.amount_in_usd / kline.close
 
-        if last_transaction_snapshot is None:
+        if last_time is None:
             return [
                 Transaction(mode="BUY", amount=amount, price=kline.close, time=time)
             ]
-        elif time - last_transaction_snapshot["time"] >= self.time_interval:
+        elif time - last_time >= self.time_interval:
             return [
                 Transaction(mode="BUY", amount=amount, price=kline.close, time=time)
             ]
 
+    def get_actions_batch(self, series: KLineSeries, start_idx: int, end_idx: int):
+        times = series.times[start_idx:end_idx] // 1000
+        last_time = self.ledger.last_time
+        next_time = (
+            times[0] if last_time is None else last_time.timestamp + self.time_interval
+        )
+
+        transactions = []
+        idx = np.searchsorted(times, next_time)
+        while idx < len(times):
+            price = float(series.close[start_idx + idx])
+            transactions.append(
+                (
+                    start_idx + idx,
+                    Transaction(
+                        mode="BUY",
+                        amount=self.amount_in_usd / price,
+                        price=price,
+                        time=series.time(start_idx + idx),
+                    ),
+                )
+            )
+            idx = np.searchsorted(times, times[idx] + self.time_interval)
+        return transactions
+
 
 class GoingShortStrategy(BaseStrategy):
     _name = "going_short"
@@ -57,16 +85,16 @@ class GoingShortStrategy(BaseStrategy):
         self.amount_in_usd = amount_in_usd
 
     def _get_action(self, time: FormattedDateTime, kline):
-        last_transaction_snapshot = self.get_last_transaction_snapshot()
+        last_time = self.ledger.last_time
 
         amount = self.amount_in_usd / kline.close
 
-        if last_transaction_snapshot is None:
+        if last_time is None:
             return [
                 Transaction(mode="SELL", amount=amount, price=kline.close, time=time)
             ]
 
-        elif time - last_transaction_snapshot["time"] >= self.time_interval:
+        elif time - last_time >= self.time_interval:
             return [
                 Transaction(mode="SELL", amount=amount, price=kline.close, time=time)
             ]
@@ -1,3 +1,5 @@
+import math
+from bisect import bisect_left, bisect_right
 from typing import List
 
 from protocol.datetime import FormattedDateTime
@@ -5,8 +7,21 @@ from protocol.transaction import Transaction
 from strategy.base import BaseStrategy
 
 
+def build_levels(
+    lowest: float, highest: float, num_interval: int, spacing: str = "arithmetic"
+) -> List[float]:
+    if spacing == "arithmetic":
+        interval = (highest - lowest) / num_interval
+        return [lowest + i * interval for i in range(num_interval + 1)]
+    if spacing == "geometric":
+        ratio = (highest / lowest) ** (1 / num_interval)
+        return [lowest * ratio**i for i in range(num_interval + 1)]
+    raise ValueError(f"Unknown grid spacing: {spacing}")
+
+
 class GridTradingStrategy(BaseStrategy):
     _name = "grid_trading"
+    _state_fields = ("buy_price", "sell_price")
 
     def __init__(
         self,
@@ -18,54 +33,72 @@ class GridTradingStrategy(BaseStrategy):
         lowest: float = 60000,
         num_interval: int = 20,
         amount: float = 0.003,
+        spacing: str = "arithmetic",
     ):
         super().__init__(symbol, budget, leverage, dump_path)
         self.highest = highest
         self.lowest = lowest
-        self.interval = (highest - lowest) / num_interval
+        self.num_interval = num_interval
+        self.spacing = spacing
+        self.levels = build_levels(lowest, highest, num_interval, spacing)
         self.buy_price = None
         self.sell_price = None
         self.amount = amount
 
+    def __setstate__(self, state):
+        # strategies pickled before the ladder only kept the interval
+        if "levels" not in state:
+            state["num_interval"] = round(
+                (state["highest"] - state["lowest"]) / state.pop("interval")
+            )
+            state["spacing"] = "arithmetic"
+            state["levels"] = build_levels(
+                state["lowest"], state["highest"], state["num_interval"]
+            )
+        super().__setstate__(state)
+
+    def level(self, idx: int):
+        # levels beyond the ladder are never reached
+        if idx < 0:
+            return -math.inf
+        if idx >= len(self.levels):
+            return math.inf
+        return self.levels[idx]
+
+    def lower_level_index(self, price: float):
+        return bisect_right(self.levels, price) - 1
+
+    def upper_level_index(self, price: float):
+        return bisect_right(self.levels, price)
+
     def get_closest_lower_bound(self, price: float):
-        return self.lowest + (price - self.lowest) // self.interval * self.interval
+        return self.level(self.lower_level_index(price))
 
     def get_closest_upper_bound(self, price: float):
-        return (
-            self.lowest
-            + (price - self.lowest) // self.interval * self.interval
-            + self.interval
-        )
+        return self.level(self.upper_level_index(price))
 
     def buy_process(self, time, kline):
-        total_transactions = []
-        while kline.low <= self.buy_price:
-            total_transactions.append(
-                Transaction(
-                    mode="BUY", amount=self.amount, price=self.buy_price, time=time
-                )
-            )
-            self.buy_price = self.get_closest_lower_bound(self.buy_price * 0.999)
-        self.sell_price = self.get_closest_upper_bound(
-            (self.buy_price + 2 * self.interval) * 0.999
-        )
+        # every level from the buy price down to the low of the bar is crossed
+        start_idx = bisect_left(self.levels, kline.low)
+        end_idx = self.lower_level_index(self.buy_price)
+        total_transactions = [
+            Transaction(mode="BUY", amount=self.amount, price=price, time=time)
+            for price in reversed(self.levels[start_idx : end_idx + 1])
+        ]
+        self.buy_price = self.level(start_idx - 1)
+        self.sell_price = self.level(start_idx + 1)
         return total_transactions
 
     def sell_process(self, time, kline):
-        total_transactions = []
-        while kline.high >= self.sell_price:
-            total_transactions.append(
-                Transaction(
-                    mode="SELL",
-                    amount=self.amount,
-                    price=self.sell_price,
-                    time=time,
-                )
-            )
-            self.sell_price = self.get_closest_upper_bound(self.sell_price * 1.001)
-        self.buy_price = self.get_closest_lower_bound(
-            (self.sell_price - 2 * self.interval) * 1.001
-        )
+        # every level from the sell price up to the high of the bar is crossed
+        start_idx = bisect_left(self.levels, self.sell_price)
+        end_idx = self.lower_level_index(kline.high)
+        total_transactions = [
+            Transaction(mode="SELL", amount=self.amount, price=price, time=time)
+            for price in self.levels[start_idx : end_idx + 1]
+        ]
+        self.sell_price = self.level(end_idx + 1)
+        self.buy_price = self.level(end_idx - 1)
         return total_transactions
 
     def has_intersect(self, a1, b1, a2, b2):
@@ -80,10 +113,9 @@ class GridTradingStrategy(BaseStrategy):
 
             # initialization
             if self.buy_price is None and self.sell_price is None:
-                self.buy_price = self.get_closest_lower_bound(kline.close)
-                self.sell_price = (
-                    self.get_closest_upper_bound(kline.close) + self.interval
-                )
+                level_idx = self.lower_level_index(kline.close)
+                self.buy_price = self.level(level_idx)
+                self.sell_price = self.level(level_idx + 2)
 
             # if the close price is higher than the open price,
             # we simulate the process by first buying, then selling.
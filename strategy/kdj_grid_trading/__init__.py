@@ -2,13 +2,15 @@ from dataclasses import dataclass
 from typing import List
 
 from protocol.datetime import FormattedDateTime
-from protocol.kline import KLine
+from protocol.kline import KLine, KLineSeries
 from protocol.transaction import Transaction, TransactionFlow
 from strategy.base import BaseStrategy
 from strategy.grid_trading import GridTradingStrategy
 from strategy.kdj_grid_trading.kdj_counter import KDJCalculator
 from utils.config import DataPath
-from utils.json import dump, load
+from utils.json import dump
+from utils.price_store import price_store
+from utils.profiler import PROFILER
 
 
 @dataclass
@@ -22,22 +24,31 @@ class KDJ:
         return cls(**{k.lower(): v for k, v in data.items() if k in ["K", "D", "J"]})
 
 
-def kdj_calculator(symbol: str = "btcusdt"):
-    historical_prices = {
-        FormattedDateTime(time): KLine(**data)
-        for time, data in load(DataPath(f"{symbol}/prices.json")).items()
-    }
+def kdj_calculator(symbol: str = "btcusdt", series: KLineSeries = None, initial=None):
+    if series is None:
+        with PROFILER.phase("strategy.load_prices"):
+            historical_prices = price_store(symbol).read().to_dict()
+    else:
+        historical_prices = series.to_dict()
 
     kdj_calculator = KDJCalculator(historical_prices)
-    k_values, d_values, j_values = kdj_calculator.calculate_kdj()
-    kdj_data = kdj_calculator.generate_kdj_data(k_values, d_values, j_values)
+    with PROFILER.phase("indicator.kdj"):
+        k_values, d_values, j_values = kdj_calculator.calculate_kdj(initial)
+        kdj_data = kdj_calculator.generate_kdj_data(k_values, d_values, j_values)
 
-    dump(kdj_data, DataPath(f"{symbol}/kdj_data.json"))
+    if series is None:
+        dump(kdj_data, DataPath(f"{symbol}/kdj_data.json"))
     return kdj_data
 
 
 class KDJGridTradingStrategy(GridTradingStrategy):
     _name = "kdj_grid_trading"
+    _state_fields = GridTradingStrategy._state_fields + (
+        "counter",
+        "sell_interval_counter",
+        "buy_interval_counter",
+    )
+    warmup_bars = 8
 
     def __init__(
         self,
@@ -54,9 +65,18 @@ class KDJGridTradingStrategy(GridTradingStrategy):
         epsilon: float = 1,
         num_interval: int = 20,
         min_interval: int = 5,
+        spacing: str = "arithmetic",
     ):
         super().__init__(
-            symbol, budget, leverage, dump_path, highest, lowest, num_interval, amount
+            symbol,
+            budget,
+            leverage,
+            dump_path,
+            highest,
+            lowest,
+            num_interval,
+            amount,
+            spacing,
         )
         self.cold_start = cold_start
         self.lower_bound = lower_bound
@@ -67,7 +87,28 @@ class KDJGridTradingStrategy(GridTradingStrategy):
         self.buy_interval_counter = min_interval
         self.min_interval = min_interval
 
-        self.kdj_data = kdj_calculator(symbol)
+        # computed on the first bar, unless `refresh` provides them earlier
+        self.kdj_data = None
+
+    def refresh(self, series: KLineSeries = None):
+        self.kdj_data = kdj_calculator(self.symbol, series)
+
+    def indicator_state(self, time: FormattedDateTime):
+        # the KDJ of the bar at `time` and of the one before, which the next
+        # bars are decided on
+        if self.kdj_data is None:
+            return None
+        return {t: self.kdj_data[t] for t in [time - 60, time] if t in self.kdj_data}
+
+    def resume(self, series: KLineSeries, indicator_state=None):
+        if not indicator_state or len(indicator_state) < 2:
+            return self.refresh()
+        # the KDJ goes on from the last one of the checkpoint
+        last_kdj = list(indicator_state.values())[-1]
+        self.kdj_data = {
+            **indicator_state,
+            **kdj_calculator(self.symbol, series, (last_kdj["K"], last_kdj["D"])),
+        }
 
     def has_intersect(self, a1, b1, a2, b2):
         if max(a1, a2) > min(b1, b2):
@@ -76,11 +117,13 @@ class KDJGridTradingStrategy(GridTradingStrategy):
 
     def price_initialization(self, price, base="buy"):
         if base == "buy":
-            self.buy_price = self.get_closest_lower_bound(price)
-            self.sell_price = self.buy_price + self.interval
+            level_idx = self.lower_level_index(price)
+            self.buy_price = self.level(level_idx)
+            self.sell_price = self.level(level_idx + 1)
         else:
-            self.sell_price = self.get_closest_upper_bound(price)
-            self.buy_price = self.sell_price - self.interval
+            level_idx = self.upper_level_index(price)
+            self.sell_price = self.level(level_idx)
+            self.buy_price = self.level(level_idx - 1)
 
     def buy_criteria(self, kline: KLine, prev_kdj: KDJ, pprev_kdj: KDJ) -> bool:
         kdj_criteria = [
@@ -119,8 +162,9 @@ class KDJGridTradingStrategy(GridTradingStrategy):
             total_transactions.append(
                 Transaction(mode="BUY", amount=self.amount, price=kline.open, time=time)
             )
-        self.buy_price = self.get_closest_lower_bound(kline.open * 0.999)
-        self.sell_price = self.buy_price + self.interval
+        level_idx = self.lower_level_index(kline.open * 0.999)
+        self.buy_price = self.level(level_idx)
+        self.sell_price = self.level(level_idx + 1)
         return total_transactions
 
     def sell_process(self, time, kline):
@@ -134,11 +178,15 @@ class KDJGridTradingStrategy(GridTradingStrategy):
                     time=time,
                 )
             )
-        self.sell_price = self.get_closest_upper_bound(kline.open * 1.001)
-        self.buy_price = self.sell_price - self.interval
+        level_idx = self.upper_level_index(kline.open * 1.001)
+        self.sell_price = self.level(level_idx)
+        self.buy_price = self.level(level_idx - 1)
         return total_transactions
 
     def _get_action(self, time: FormattedDateTime, kline: KLine) -> List[Transaction]:
+        if self.kdj_data is None:
+            self.refresh()
+
         total_transactions = []
         if self.counter >= self.cold_start and self.has_intersect(
             kline.low, kline.high, self.lowest, self.highest
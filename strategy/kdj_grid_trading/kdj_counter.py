@@ -1,45 +1,46 @@
 import argparse
 import json
-from collections import deque
 from typing import Dict
 
 from protocol.datetime import FormattedDateTime
 from protocol.kline import KLine
 from utils.config import DataPath
-from utils.json import dump, load
+from utils.json import dump
+from utils.price_store import price_store
+from utils.rolling import RollingMax, RollingMin, rolling_max, rolling_min
 
 
 class KDJCalculator:
     def __init__(self, historical_prices: Dict[FormattedDateTime, KLine]):
         self.historical_prices = historical_prices
 
-    def calculate_kdj(self):
+    def calculate_kdj(self, initial=None):
+        # `initial` is the (K, D) of the bar before the first one computed, the
+        # first K and D are 50 without it
         k_values, d_values, j_values = [], [], []
-        highest_prices = deque(maxlen=9)
-        lowest_prices = deque(maxlen=9)
+        k, d = (None, None) if initial is None else initial
+        klines = list(self.historical_prices.values())
+        highest_highs = rolling_max([kline.high for kline in klines], 9).tolist()
+        lowest_lows = rolling_min([kline.low for kline in klines], 9).tolist()
 
-        for kline in self.historical_prices.values():
-            highest_prices.append(kline.high)
-            lowest_prices.append(kline.low)
-            if len(highest_prices) < 9:
-                continue
-
-            highest_high = max(highest_prices)
-            lowest_low = min(lowest_prices)
+        for kline, highest_high, lowest_low in zip(
+            klines[8:], highest_highs[8:], lowest_lows[8:]
+        ):
 
             dominator = (
                 highest_high - lowest_low if highest_high - lowest_low != 0 else 0.001
             )
             rsv = (kline.close - lowest_low) / dominator * 100
 
-            if not k_values:
-                k_values.append(50)
-                d_values.append(50)
+            if k is None:
+                k, d = 50, 50
             else:
-                k_values.append((2 / 3) * k_values[-1] + (1 / 3) * rsv)
-                d_values.append((2 / 3) * d_values[-1] + (1 / 3) * k_values[-1])
+                k = (2 / 3) * k + (1 / 3) * rsv
+                d = (2 / 3) * d + (1 / 3) * k
 
-            j_values.append(3 * k_values[-1] - 2 * d_values[-1])
+            k_values.append(k)
+            d_values.append(d)
+            j_values.append(3 * k - 2 * d)
 
         return k_values, d_values, j_values
 
@@ -60,6 +61,36 @@ class KDJCalculator:
             json.dump(kdj_data, json_file, indent=4)
 
 
+class StreamingKDJ:
+    # the KDJ of `KDJCalculator`, updated one bar at a time
+    def __init__(self, window_size: int = 9):
+        self.highs = RollingMax(window_size)
+        self.lows = RollingMin(window_size)
+        self.window_size = window_size
+        self.k = None
+        self.d = None
+
+    def update(self, kline: KLine):
+        # the (K, D, J) of the bar, None until the window is filled
+        self.highs.append(kline.high)
+        self.lows.append(kline.low)
+        if len(self.highs) < self.window_size:
+            return None
+
+        highest_high, lowest_low = self.highs.value, self.lows.value
+        dominator = (
+            highest_high - lowest_low if highest_high - lowest_low != 0 else 0.001
+        )
+        rsv = (kline.close - lowest_low) / dominator * 100
+
+        if self.k is None:
+            self.k, self.d = 50, 50
+        else:
+            self.k = (2 / 3) * self.k + (1 / 3) * rsv
+            self.d = (2 / 3) * self.d + (1 / 3) * self.k
+        return self.k, self.d, 3 * self.k - 2 * self.d
+
+
 def argument_parsing():
     parser = argparse.ArgumentParser(
         description="Calculate KDJ values for a given symbol and interval."
@@ -82,7 +113,7 @@ def argument_parsing():
 
 
 def main(args):
-    historical_prices = load(args.prices_path)
+    historical_prices = price_store(args.symbol).read().to_dict()
 
     kdj_calculator = KDJCalculator(historical_prices)
     k_values, d_values, j_values = kdj_calculator.calculate_kdj()
@@ -93,7 +124,6 @@ def main(args):
 
 if __name__ == "__main__":
     args = argument_parsing()
-    args.prices_path = DataPath(f"{args.symbol.lower()}/prices.json")
     args.output_path = DataPath(f"{args.symbol.lower()}/{args.output_file}")
 
     main(args)
@@ -4,12 +4,14 @@ from typing import List
 import requests
 
 from protocol.datetime import FormattedDateTime
-from protocol.kline import KLine
+from protocol.kline import KLine, KLineSeries
 from protocol.transaction import Transaction, TransactionFlow
 from strategy.base import BaseStrategy
 from strategy.kdj_grid_trading.kdj_counter import KDJCalculator
-from utils.config import DataPath, StrategyPath
-from utils.json import dump, load
+from utils.config import StrategyPath
+from utils.json import dump
+from utils.price_store import price_store
+from utils.profiler import PROFILER
 
 
 def to_closest_time(time: FormattedDateTime, interval=15, latter=False):
@@ -21,20 +23,11 @@ def to_closest_time(time: FormattedDateTime, interval=15, latter=False):
 
 
 def get_price_data(symbol, intervals=["3m", "5m", "15m"]):
-    price_data = {
-        "1m": {
-            FormattedDateTime(time): KLine(**data)
-            for time, data in load(DataPath(f"{symbol}/prices.json")).items()
-        }
+    return {
+        interval: price_store(symbol, interval).read().to_dict()
+        for interval in ["1m", *intervals]
     }
 
-    for interval in intervals:
-        price_data[interval] = {
-            FormattedDateTime(time): KLine(**data)
-            for time, data in load(DataPath(f"{symbol}/prices{interval}.json")).items()
-        }
-    return price_data
-
 
 @dataclass
 class KDJ:
@@ -49,14 +42,21 @@ class KDJ:
 
 def kdj_calculator(price_data):
     kdj_calculator = KDJCalculator(price_data)
-    k_values, d_values, j_values = kdj_calculator.calculate_kdj()
-    kdj_data = kdj_calculator.generate_kdj_data(k_values, d_values, j_values)
+    with PROFILER.phase("indicator.kdj"):
+        k_values, d_values, j_values = kdj_calculator.calculate_kdj()
+        kdj_data = kdj_calculator.generate_kdj_data(k_values, d_values, j_values)
 
     return kdj_data
 
 
 class KDJTimeStrategy(BaseStrategy):
     _name = "kdj_time"
+    _state_fields = (
+        "prev_action",
+        "prev_buy_price",
+        "prev_sell_price",
+        "purchase_weight",
+    )
 
     def __init__(
         self,
@@ -73,10 +73,8 @@ class KDJTimeStrategy(BaseStrategy):
     ):
         super().__init__(symbol, budget, leverage, dump_path)
         self.amount = amount
-        price_data = get_price_data(symbol)
-        self.kdj_data = {
-            interval: kdj_calculator(data) for interval, data in price_data.items()
-        }
+        # computed on the first bar, unless `refresh` provides them earlier
+        self.kdj_data = None
         self.low = low
         self.high = high
         self.min_ratio = min_ratio
@@ -87,6 +85,18 @@ class KDJTimeStrategy(BaseStrategy):
         self.purchase_weight = 0
         self.kdj_intervals = [1] if kdj_intervals is None else kdj_intervals
 
+    def refresh(self, series: KLineSeries = None):
+        if series is None:
+            with PROFILER.phase("strategy.load_prices"):
+                price_data = get_price_data(self.symbol)
+        else:
+            price_data = {"1m": series.to_dict()}
+            for interval in [3, 5, 15]:
+                price_data[f"{interval}m"] = series.resample(interval).to_dict()
+        self.kdj_data = {
+            interval: kdj_calculator(data) for interval, data in price_data.items()
+        }
+
     def buy_kdj_criteria(self, kdjs: List[KDJ]):
         return all(
             kdj.k < self.low and kdj.d < self.low and kdj.k >= kdj.d for kdj in kdjs
@@ -101,6 +111,9 @@ class KDJTimeStrategy(BaseStrategy):
         return abs(prev_price - current_price) / prev_price
 
     def _get_action(self, time: FormattedDateTime, kline: KLine) -> List[Transaction]:
+        if self.kdj_data is None:
+            self.refresh()
+
         kdjs = [
             KDJ.from_dict(
                 self.kdj_data[f"{interval}m"][to_closest_time(time, interval)]
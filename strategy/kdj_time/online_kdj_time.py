@@ -22,6 +22,12 @@ class KDJ:
 
 class OnlineKDJTimeStrategy(BaseStrategy):
     _name = "online_kdj_time"
+    _state_fields = (
+        "prev_action",
+        "prev_buy_price",
+        "prev_sell_price",
+        "purchase_weight",
+    )
 
     def __init__(
         self,
@@ -4,19 +4,23 @@ from protocol.datetime import FormattedDateTime
 from protocol.kline import KLine
 from protocol.transaction import Transaction, TransactionFlow
 from strategy.base import BaseStrategy
-from utils.config import DataPath
-from utils.json import load
+from utils.price_store import price_store
+from utils.rolling import RollingMax, RollingMin
 
 
 def get_price_data(symbol):
-    return {
-        FormattedDateTime(time): KLine(**data)
-        for time, data in load(DataPath(f"{symbol}/prices.json")).items()
-    }
+    return price_store(symbol).read().to_dict()
 
 
 class OptimalStrategy(BaseStrategy):
     _name = "optimal"
+    _state_fields = (
+        "prev_buy_price",
+        "buy_counter",
+        "sell_counter",
+        "prev_sell_price",
+        "prev_action",
+    )
 
     def __init__(
         self,
@@ -40,23 +44,51 @@ class OptimalStrategy(BaseStrategy):
         self.buy_counter = 0
         self.sell_counter = 0
         self.prev_sell_price = 0
-        self.prev_price_list = []
+        self.rolling_min = RollingMin(window_size)
+        self.rolling_max = RollingMax(window_size)
         self.prev_action = None
 
+    def __setstate__(self, state):
+        # strategies pickled before the rolling windows kept a list of prices
+        if "prev_price_list" in state:
+            state["rolling_min"] = RollingMin(state["window_size"])
+            state["rolling_max"] = RollingMax(state["window_size"])
+            for price in state.pop("prev_price_list"):
+                state["rolling_min"].append(price)
+                state["rolling_max"].append(price)
+        super().__setstate__(state)
+
+    def state(self):
+        state = super().state()
+        for name in ("rolling_min", "rolling_max"):
+            state["fields"][name] = getattr(self, name).state()
+        return state
+
+    def load_state(self, state):
+        fields = dict(state["fields"])
+        windows = {name: fields.pop(name) for name in ("rolling_min", "rolling_max")}
+        super().load_state({**state, "fields": fields})
+        for name, window in windows.items():
+            getattr(self, name).restore(window)
+
     @property
     def org_total_amount(self):
         return self.total_amount / self.leverage
 
     def update_prev_price_list(self, current_price):
-        if len(self.prev_price_list) >= self.window_size:
-            self.prev_price_list.pop(0)
-        self.prev_price_list.append(current_price)
+        self.rolling_min.append(current_price)
+        self.rolling_max.append(current_price)
+
+    def reset_prev_price_list(self, current_price):
+        self.rolling_min.clear()
+        self.rolling_max.clear()
+        self.update_prev_price_list(current_price)
 
     def check_optimal(self, current_price, mode="min"):
         if mode == "min":
-            return current_price <= min(self.prev_price_list)
+            return current_price <= self.rolling_min.value
         elif mode == "max":
-            return current_price >= max(self.prev_price_list)
+            return current_price >= self.rolling_max.value
 
     def _get_action(self, time: FormattedDateTime, kline: KLine) -> List[Transaction]:
         total_transactions = []
@@ -77,7 +109,7 @@ class OptimalStrategy(BaseStrategy):
                 self.prev_buy_price = 0
                 self.buy_counter = 0
                 self.sell_counter = 0
-                self.prev_price_list = [kline.close]
+                self.reset_prev_price_list(kline.close)
         elif self.sell_counter == 3:
             if kline.close < self.current_average_price:
                 total_transactions.append(
@@ -93,7 +125,7 @@ class OptimalStrategy(BaseStrategy):
                 self.prev_sell_price = 0
                 self.sell_counter = 0
                 self.buy_counter = 0
-                self.prev_price_list = [kline.close]
+                self.reset_prev_price_list(kline.close)
         elif self.check_optimal(kline.close, "min") and (
             self.prev_action is None
             or self.prev_action == "SELL"
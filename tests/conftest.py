@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# the roots of utils.config are read on import, so tests never touch real data
+_root = tempfile.mkdtemp(prefix="cryptotrader_tests_")
+for name in ["DATA_ROOT", "RESULTS_ROOT", "STATUS_ROOT", "STRATEGY_ROOT"]:
+    os.environ[name] = os.path.join(_root, name.lower())
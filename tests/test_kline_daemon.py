@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+from aiohttp.test_utils import make_mocked_request
+
+from script import mock_binance
+from script.kline_daemon import INITIAL_BARS, KlineDaemon
+from script.price_fetcher import BinancePriceFetcher
+from strategy.kdj_grid_trading.kdj_counter import KDJCalculator
+from tests.servers import serve
+from utils.price_store import price_store
+
+
+def test_daemon_backfills_dropped_streams_and_serves_kdj():
+    # a 1m bar every 0.05s, and the stream is dropped every 10 closed bars
+    mock = mock_binance.MockBinance(
+        mock_binance.argument_parsing(
+            ["--bar_seconds", "0.05", "--disconnect_after", "10"]
+        )
+    )
+
+    async def run():
+        async with serve(mock_binance.create_app(mock)) as url:
+            async with BinancePriceFetcher(url) as fetcher:
+                daemon = KlineDaemon(
+                    ["KDJUSDT"], ["1m"], url, fetcher, flush_interval=0.2
+                )
+                task = asyncio.ensure_future(daemon.run(0))
+                await asyncio.sleep(4)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        return daemon
+
+    daemon = asyncio.run(run())
+    assert mock.stats["disconnected"] >= 3
+
+    prices = price_store("kdjusdt", "1m").read()
+    times = prices.times.tolist()
+    assert len(times) > INITIAL_BARS + 30
+    assert np.all(np.diff(prices.times) == 60000)
+    # streamed and backfilled bars are the same bars
+    for open_time, close in zip(times, prices.close.tolist()):
+        assert close == float(mock_binance.synthetic_kline(open_time, 60000)[4])
+
+    k_values, d_values, j_values = KDJCalculator(prices.to_dict()).calculate_kdj()
+    request = make_mocked_request(
+        "GET", f"/kdj?symbol=kdjusdt&interval=1m&end_time={times[-1] + 60000}"
+    )
+    response = asyncio.run(daemon.get_kdj(request))
+    assert json.loads(response.text) == pytest.approx(
+        [k_values[-1], d_values[-1], j_values[-1]]
+    )
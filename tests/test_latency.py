@@ -0,0 +1,32 @@
+import pytest
+
+from utils.config import ResultsPath
+from utils.json import load
+from utils.latency import LatencyMonitor, LatencyRecorder
+
+
+def run_once(path, seconds):
+    # one start of the trader, which records and dumps one interval
+    recorder = LatencyRecorder()
+    monitor = LatencyMonitor(path, recorder=recorder)
+    recorder.record("decision", seconds)
+    monitor.flush()
+
+
+def test_restarted_monitor_appends_to_the_intervals_of_earlier_runs():
+    path = ResultsPath("trader/latency.json")
+    for seconds in [0.001, 0.002, 0.004]:
+        run_once(path, seconds)
+    intervals = load(path)
+    assert [interval["stages"]["decision"]["max"] for interval in intervals] == (
+        pytest.approx([1.0, 2.0, 4.0])
+    )
+
+
+def test_monitor_starts_over_a_broken_file():
+    path = ResultsPath("trader/broken_latency.json")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text('[\n    {"time": 1')
+    run_once(path, 0.001)
+    run_once(path, 0.001)
+    assert len(load(path)) == 2
@@ -0,0 +1,95 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from script import mock_binance, price_fetcher
+from script.price_fetcher import BinancePriceFetcher, FetchError
+from tests.servers import serve
+from utils.price_store import price_store
+
+END_TIME = "2024-04-01 00:00:00"
+
+
+def fetch(mock_argv, total_num, symbol="BTCUSDT", **fetcher_kwargs):
+    # stores `total_num` 1m bars up to END_TIME, fetched from a mock api
+    mock = mock_binance.MockBinance(mock_binance.argument_parsing(mock_argv))
+
+    async def run():
+        async with serve(mock_binance.create_app(mock)) as url:
+            async with BinancePriceFetcher(url, **fetcher_kwargs) as fetcher:
+                await fetcher.fetch_and_store(symbol, "1m", total_num, END_TIME)
+
+    asyncio.run(run())
+    return mock
+
+
+def assert_no_gaps(symbol, total_num):
+    times = price_store(symbol).times
+    assert len(times) == total_num
+    assert np.all(np.diff(times) == 60000)
+
+
+def test_fetch_survives_throttling_errors_and_truncation():
+    mock = fetch(
+        ["--throttle_rate", "0.1", "--error_rate", "0.2", "--truncate_rate", "0.3"],
+        20000,
+        symbol="FAILUSDT",
+        max_retries=10,
+    )
+    assert mock.stats["throttled"] > 0
+    assert mock.stats["errors"] > 0
+    assert mock.stats["truncated"] > 0
+    assert_no_gaps("FAILUSDT", 20000)
+
+
+def test_truncated_window_is_requested_again_after_a_backoff(monkeypatch):
+    delays = []
+
+    def backoff_delay(attempt):
+        delays.append(attempt)
+        return 0.01
+
+    monkeypatch.setattr(price_fetcher, "backoff_delay", backoff_delay)
+    mock = fetch(["--truncate_rate", "1"], 1000, symbol="SHORTUSDT", max_retries=3)
+    assert mock.stats["truncated"] == 4
+    assert delays == [0, 1, 2]
+
+
+def test_fetch_respects_weight_limit():
+    # the mock allows 20 weight per second, a window of 1000 bars weighs 5
+    mock = fetch(["--weight_limit", "20", "--window", "1"], 12000, symbol="SLOWUSDT")
+    assert mock.stats["rate_limited"] > 0
+    assert_no_gaps("SLOWUSDT", 12000)
+
+
+def test_window_that_keeps_failing_raises():
+    with pytest.raises(FetchError):
+        fetch(["--error_rate", "1"], 3000, symbol="DOWNUSDT", max_retries=2)
+    # the prices are only replaced once every window is written
+    assert not price_store("DOWNUSDT").exists()
+
+
+def test_fetch_appends_to_the_stored_prices():
+    fetch([], 3000, symbol="MOREUSDT")
+    store = price_store("MOREUSDT")
+    stored = store.read()
+    stat = store.stat()
+
+    # a later fetch overlapping the stored bars only appends the new ones
+    mock = mock_binance.MockBinance(mock_binance.argument_parsing([]))
+
+    async def run():
+        async with serve(mock_binance.create_app(mock)) as url:
+            async with BinancePriceFetcher(url) as fetcher:
+                return await fetcher.fetch_all_historical_prices(
+                    "MOREUSDT", "1m", 2000, "2024-04-01 16:40:00"
+                )
+
+    fetched = asyncio.run(run())
+    assert len(fetched) == 2000
+    assert store.stat().st_ino == stat.st_ino
+    assert_no_gaps("MOREUSDT", 4000)
+    appended = store.read()
+    np.testing.assert_array_equal(appended.times[:3000], stored.times)
+    np.testing.assert_array_equal(appended.close[-2000:], fetched.close)
@@ -0,0 +1,47 @@
+import numpy as np
+
+from protocol.datetime import FormattedDateTime
+from protocol.kline import KLineSeries
+from utils.config import DataPath
+from utils.json import dump
+from utils.price_store import price_store
+
+START_TIME = FormattedDateTime("2024-04-01 00:00:00").ms_timestamp
+
+
+def bars(num_bars, offset=0):
+    times = START_TIME + 60000 * np.arange(offset, offset + num_bars, dtype=np.int64)
+    close = 100 + np.arange(offset, offset + num_bars, dtype=np.float64)
+    return KLineSeries(times, close - 1, close + 1, close - 2, close)
+
+
+def test_prices_file_is_converted_once():
+    series = bars(5)
+    dump(
+        {t.string: kline.to_dict() for t, kline in series.items()},
+        DataPath("jsonusdt/prices.json"),
+    )
+    store = price_store("jsonusdt")
+    assert store.path == DataPath("jsonusdt/prices")
+    assert len(store) == 5
+    np.testing.assert_array_equal(store.read().times, series.times)
+    np.testing.assert_array_equal(store.read().close, series.close)
+
+
+def test_append_cut_short_leaves_whole_bars():
+    store = price_store("cutusdt")
+    assert store.append(bars(3)) == 3
+    # the process died after writing the open and high of the next bars
+    for name in ["open", "high"]:
+        with open(store.path / name, "ab") as f:
+            f.write(np.zeros(2).tobytes())
+    assert len(store) == 3
+
+    # bars already stored are skipped, the others are appended
+    assert store.append(bars(4, offset=1)) == 2
+    appended = store.read()
+    np.testing.assert_array_equal(appended.times, bars(5).times)
+    np.testing.assert_array_equal(appended.open, bars(5).open)
+    np.testing.assert_array_equal(
+        store.read(bars(5).times[1], bars(5).times[3]).close, bars(5).close[1:4]
+    )
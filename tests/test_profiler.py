@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from utils.profiler import Profiler
+
+
+def test_phase_percentiles_are_within_one_percent():
+    durations = np.random.default_rng(1102).lognormal(-9, 2, 100000)
+    profiler = Profiler()
+    profiler.enable()
+    for duration in durations:
+        profiler.record("decision", duration)
+
+    report = profiler.report()["phases"]["decision"]
+    assert report["calls"] == len(durations)
+    assert report["total"] == pytest.approx(durations.sum(), rel=1e-6)
+    for name, q in [("p50", 50), ("p99", 99)]:
+        assert report[name] == pytest.approx(np.percentile(durations, q), rel=0.01)
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from utils.rolling import RollingMax, RollingMin, rolling_argmax, rolling_argmin
+
+
+@pytest.mark.parametrize(
+    "batch, scalar, name",
+    [(rolling_argmax, RollingMax, "argmax"), (rolling_argmin, RollingMin, "argmin")],
+)
+def test_batch_positions_match_the_scalar_windows(batch, scalar, name):
+    rng = np.random.default_rng(1102)
+    for num_values in [0, 1, 37, 200]:
+        for window_size in [1, 3, 50, 300]:
+            # few distinct values, so ties are common
+            values = rng.integers(0, 5, num_values).astype(np.float64)
+            window = scalar(window_size)
+            positions = []
+            for value in values:
+                window.append(value)
+                positions.append(getattr(window, name))
+            assert batch(values, window_size).tolist() == positions
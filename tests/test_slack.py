@@ -0,0 +1,85 @@
+import asyncio
+from time import perf_counter
+
+from script import mock_slack
+from tests.servers import serve
+from utils.slack import MAX_MESSAGE_LENGTH, SlackBot, SlackNotifier
+
+
+class TimedMockSlack(mock_slack.MockSlack):
+    # also keeps when each post arrived
+    def __init__(self, args):
+        super().__init__(args)
+        self.times = []
+
+    async def post_message(self, request):
+        self.times.append(perf_counter())
+        return await super().post_message(request)
+
+
+def notify(mock, messages, until=None, **notifier_kwargs):
+    # queues `messages` on a notifier posting to `mock`, and closes it once
+    # `until` holds, so only what is left is flushed on close
+    async def run():
+        async with serve(mock_slack.create_app(mock)) as url:
+            notifier = SlackNotifier(
+                SlackBot("token", "channel", base_url=f"{url}/api/"),
+                **notifier_kwargs,
+            )
+            for message in messages:
+                notifier.send_messages({"Message": message})
+            while until is not None and not until():
+                await asyncio.sleep(0.05)
+            await asyncio.to_thread(notifier.close)
+
+    asyncio.run(run())
+    return [message["text"] for message in mock.messages]
+
+
+def test_queued_messages_are_posted_together():
+    mock = TimedMockSlack(mock_slack.argument_parsing([]))
+    posts = notify(mock, ["buy", "sell", "cancel"], flush_interval=60)
+    assert posts == ["*Message*: buy\n*Message*: sell\n*Message*: cancel"]
+
+
+def test_long_posts_are_split():
+    messages = [str(idx) * 1000 for idx in range(10)]
+    mock = TimedMockSlack(mock_slack.argument_parsing([]))
+    posts = notify(mock, messages + ["x" * 5000], flush_interval=60)
+    assert all(len(post) <= MAX_MESSAGE_LENGTH for post in posts)
+    # as few posts as fit, each message whole and in order
+    assert len(posts) == 6
+    assert "\n".join(posts) == "\n".join(
+        [f"*Message*: {message}" for message in messages]
+        + [f"*Message*: {'x' * 5000}"[:MAX_MESSAGE_LENGTH]]
+    )
+
+
+def test_dropped_messages_are_reported():
+    mock = TimedMockSlack(mock_slack.argument_parsing([]))
+    posts = notify(
+        mock, [str(idx) for idx in range(8)], flush_interval=60, max_queued=5
+    )
+    assert posts == [
+        "\n".join(
+            ["_3 messages were dropped_"] + [f"*Message*: {i}" for i in range(3, 8)]
+        )
+    ]
+
+
+def test_rate_limited_posts_are_retried_after_retry_after():
+    mock = TimedMockSlack(mock_slack.argument_parsing(["--rate_limit_rate", "1"]))
+
+    def recovered():
+        # slack recovers after rate limiting two posts
+        if mock.stats["rate_limited"] >= 2:
+            mock.args.rate_limit_rate = 0
+        return mock.stats["posted"] > 0
+
+    posts = notify(mock, ["buy"], until=recovered, flush_interval=0.1)
+    assert posts == ["*Message*: buy"]
+    assert mock.stats["rate_limited"] == 2
+    # every retry waited for the `Retry-After: 1` of the mock
+    assert all(
+        later - earlier >= 1 for earlier, later in zip(mock.times, mock.times[1:])
+    )
@@ -0,0 +1,55 @@
+import pickle
+
+from protocol.datetime import FormattedDateTime
+from protocol.kline import KLine
+from protocol.transaction import Transaction
+from strategy.grid_trading import GridTradingStrategy
+from strategy.kdj_grid_trading import KDJGridTradingStrategy
+from strategy.optimal_strategy import OptimalStrategy
+from utils.synthetic import generate_gbm_series
+
+TIME = FormattedDateTime("2024-04-01 00:00:00")
+
+
+def test_loading_a_state_undoes_the_fills_since():
+    strategy = GridTradingStrategy("stateusdt", 1000, highest=110, lowest=90)
+    strategy.update_transaction(TIME, Transaction("BUY", 100, 1, TIME), 100)
+    state = strategy.state()
+
+    strategy.update_transaction(TIME, Transaction("BUY", 99, 1, TIME), 99)
+    strategy.load_state(state)
+    assert len(strategy.ledger) == 1
+    assert strategy.total_amount == 1
+
+
+def test_optimal_strategy_resumes_its_windows_from_its_state():
+    prices = [100 + (idx * 7919 % 13) - 6 for idx in range(60)]
+    strategy = OptimalStrategy("optimalusdt", 1000, 1, window_size=5)
+    for price in prices[:30]:
+        strategy.get_action(TIME, KLine(price, price, price, price))
+
+    resumed = OptimalStrategy("optimalusdt", 1000, 1, window_size=5)
+    resumed.load_state(pickle.loads(pickle.dumps(strategy.state())))
+    assert resumed.state()["fields"] == strategy.state()["fields"]
+    for price in prices[30:]:
+        for bot in [strategy, resumed]:
+            bot.get_action(TIME, KLine(price, price, price, price))
+            assert bot.rolling_min.value <= price <= bot.rolling_max.value
+    assert resumed.state()["fields"] == strategy.state()["fields"]
+    assert len(resumed.ledger) == len(strategy.ledger) > 0
+
+
+def test_kdj_resumes_from_the_indicators_of_its_checkpoint():
+    series = generate_gbm_series(600)
+    strategy = KDJGridTradingStrategy("kdjusdt", 1000)
+    strategy.refresh(series)
+
+    # resumed after the bar 299, from the bars it needs only
+    resumed = KDJGridTradingStrategy("kdjusdt", 1000)
+    resumed.resume(
+        series.slice(300 - resumed.warmup_bars),
+        pickle.loads(pickle.dumps(strategy.indicator_state(series.time(299)))),
+    )
+    assert len(resumed.kdj_data) == 302
+    for idx in range(298, 600):
+        assert resumed.kdj_data[series.time(idx)] == strategy.kdj_data[series.time(idx)]
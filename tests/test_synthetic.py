@@ -0,0 +1,18 @@
+import numpy as np
+
+from utils.synthetic import generate_gbm_series, generate_variants, relative_bars
+
+
+def test_shuffle_reorders_ranges_shorter_than_a_week():
+    series = generate_gbm_series(3 * 1440)
+    variants = generate_variants(series, 4, method="shuffle")
+    final_closes = variants[:, 3, -1]
+    assert not np.allclose(variants[0, 3], series.close)
+    assert len(np.unique(variants[:, 3, 100])) > 1
+    # the same bars, only in another order, so they end at the same price
+    assert np.allclose(final_closes, series.close[-1])
+    for variant in variants:
+        assert np.allclose(
+            np.sort(relative_bars(series)[3]),
+            np.sort(variant[3] / np.concatenate([variant[0, :1], variant[3, :-1]])),
+        )
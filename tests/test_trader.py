@@ -0,0 +1,117 @@
+import asyncio
+
+import numpy as np
+
+from protocol.datetime import FormattedDateTime
+from protocol.kline import KLineSeries
+from strategy.grid_trading import GridTradingStrategy
+from trader import TraderHost
+from utils.clock import SimulatedClock
+from utils.exchange import ExchangeError
+from utils.json import load
+from utils.simulated_exchange import BAR_MS, SimulatedExchange
+from utils.slack import NULL_NOTIFIER
+
+START_TIME = FormattedDateTime("2024-04-01 00:00:00").ms_timestamp
+NUM_BARS = 400
+
+
+def oscillating_series():
+    # swings across the levels of the grid every few dozen bars
+    close = 100 + 8 * np.sin(np.arange(NUM_BARS) / 6)
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    return KLineSeries(
+        START_TIME + BAR_MS * np.arange(NUM_BARS, dtype=np.int64),
+        open_,
+        np.maximum(open_, close) + 0.5,
+        np.minimum(open_, close) - 0.5,
+        close,
+    )
+
+
+class FlakyExchange(SimulatedExchange):
+    # rejects some orders and leaves some bars out, as a busy exchange does
+    def __init__(self, strategy, *args, failing_orders=(), missing_bars=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.strategy = strategy
+        self.failing_orders = set(failing_orders)
+        self.missing_bars = set(missing_bars)
+        self.num_new_orders = 0
+        self.failures = []
+        self.starts = []
+
+    async def change_leverage(self, symbol: str, leverage: int):
+        # called on every (re)start of the bot
+        dumped = None
+        if self.strategy.state_path.exists():
+            dumped = load(self.strategy.state_path, is_pickle=True)["fields"]
+        self.starts.append((self.clock.time(), self.strategy.state()["fields"], dumped))
+        return await super().change_leverage(symbol, leverage)
+
+    async def klines(self, symbol: str, interval: str, endTime=None, **kwargs):
+        if (endTime + 1) // BAR_MS in self.missing_bars:
+            self.failures.append(self.clock.time())
+            return []
+        return await super().klines(symbol, interval, endTime=endTime, **kwargs)
+
+    async def new_order(self, **kwargs):
+        self.num_new_orders += 1
+        if self.num_new_orders in self.failing_orders:
+            self.failures.append(self.clock.time())
+            raise ExchangeError(503, "Service Unavailable")
+        return await super().new_order(**kwargs)
+
+
+def test_failing_bot_restarts_from_its_last_decision():
+    strategy = GridTradingStrategy(
+        "flakyusdt", 1000, highest=110, lowest=90, num_interval=20, amount=1
+    )
+    clock = SimulatedClock(START_TIME + BAR_MS, START_TIME + (NUM_BARS - 1) * BAR_MS)
+    exchange = FlakyExchange(
+        strategy,
+        {"flakyusdt": oscillating_series()},
+        clock,
+        failing_orders=(2, 3, 10),
+        missing_bars=(START_TIME // BAR_MS + 200,),
+    )
+    host = TraderHost(exchange, NULL_NOTIFIER, restart_delay=5, max_restart_delay=30)
+    trader = host.add(strategy, verbose=False)
+    asyncio.run(host.run())
+
+    assert len(exchange.failures) == 4
+    # the bot was restarted after each failure, from the state it dumped last
+    assert len(exchange.starts) == 5
+    for _, fields, dumped in exchange.starts[1:]:
+        assert fields == dumped
+    # and kept trading until the end
+    assert exchange.stats["filled"] > 10
+    assert len(strategy.ledger) == exchange.stats["filled"]
+    assert strategy.ledger.time[-1] > max(exchange.failures)
+    assert trader.num_decisions > NUM_BARS - 20
+
+
+def test_fill_that_fails_to_save_is_kept():
+    strategy = GridTradingStrategy(
+        "unsavedusdt", 1000, highest=110, lowest=90, num_interval=20, amount=1
+    )
+    clock = SimulatedClock(START_TIME + BAR_MS, START_TIME + (NUM_BARS - 1) * BAR_MS)
+    exchange = FlakyExchange(strategy, {"unsavedusdt": oscillating_series()}, clock)
+    host = TraderHost(exchange, NULL_NOTIFIER, restart_delay=5, max_restart_delay=30)
+    trader = host.add(strategy, verbose=False)
+
+    # the disk fails once, right after the third fill
+    dump_results = trader.dump_results
+
+    def failing_dump_results():
+        if len(strategy.ledger) == 3 and len(exchange.starts) == 1:
+            raise OSError("No space left on device")
+        dump_results()
+
+    trader.dump_results = failing_dump_results
+    asyncio.run(host.run())
+
+    assert len(exchange.starts) == 2
+    assert len(strategy.ledger) == exchange.stats["filled"]
+    assert len(load(trader.results_path)) == exchange.stats["filled"]
+    dumped = load(strategy.state_path, is_pickle=True)
+    assert len(dumped["ledger"]["time"]) == exchange.stats["filled"]
@@ -1,23 +1,77 @@
 import argparse
+import asyncio
+import logging
 import os
+import signal
+from time import perf_counter
 
-from binance.um_futures import UMFutures
 from protocol.datetime import FormattedDateTime
 from protocol.kline import KLine
 from protocol.order import Action, Order
 from strategy import BaseStrategy, get_strategy
-from utils.config import ResultsPath, StatusPath, StrategyPath
-from utils.json import dump, load
-from utils.slack import SLACK_DEFAULT_CUSTOM_ARG, SlackBot
+from utils.config import STREAM_URL, ResultsPath, StatusPath, StrategyPath
+from utils.exchange import BinanceFuturesClient, ExchangeError
+from utils.json import dump, dump_list, load
+from utils.latency import LATENCY, LatencyMonitor
+from utils.profiler import PROFILER
+from utils.rate_limit import backoff_delay
+from utils.slack import SLACK_DEFAULT_CUSTOM_ARG, SlackBot, SlackNotifier
+from utils.stream import NULL_PUBLISHER, get_publisher
+
+
+class MarketFeed:
+    # closed 1m bars, requested once per symbol and bar however many bots
+    # trade the symbol
+    def __init__(self, client: BinanceFuturesClient, clock):
+        self.client = client
+        self.clock = clock
+        # the latest requested bar of every symbol
+        self.bars = {}
+
+    async def fetch(self, symbol: str, close_time: int) -> KLine:
+        start = perf_counter()
+        klines = await self.client.klines(
+            symbol=symbol.upper(), interval="1m", endTime=close_time - 1, limit=1
+        )
+        PROFILER.record("feed.klines", perf_counter() - start)
+        if not klines:
+            # the bar is not served yet
+            raise ExchangeError(0, f"No kline of {symbol} closed at {close_time}")
+        return KLine.from_api(klines[0])
+
+    async def kline(self, symbol: str, close_time: int) -> KLine:
+        # the bar of `symbol` closed at `close_time`
+        cached = self.bars.get(symbol)
+        if cached is None or cached[0] != close_time:
+            cached = (close_time, asyncio.ensure_future(self.fetch(symbol, close_time)))
+            self.bars[symbol] = cached
+        # a cancelled bot must not cancel the request of the others
+        return await asyncio.shield(cached[1])
 
 
 class Trader:
     def __init__(
-        self, strategy: BaseStrategy, client: UMFutures, slack_client: SlackBot
+        self,
+        strategy: BaseStrategy,
+        client: BinanceFuturesClient,
+        feed: MarketFeed,
+        slack_client: SlackNotifier,
+        publisher=NULL_PUBLISHER,
+        order_timeout: float = 50,
+        poll_interval: float = 0.5,
+        max_poll_interval: float = 8.0,
+        verbose: bool = True,
     ):
         self.strategy = strategy
         self.client = client
+        self.feed = feed
+        self.clock = feed.clock
         self.slack_client = slack_client
+        self.publisher = publisher
+        self.order_timeout = order_timeout
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.verbose = verbose
         self.action_path = (
             StatusPath()
             / "trader"
@@ -34,6 +88,11 @@ class Trader:
         )
         self.last_action = self.load_action()
         self.current_action = None
+        # kept over restarts of the bot
+        self.num_decisions = 0
+        self.is_saved = True
+        self.results_state_path = self.action_path.parent / "results_state.json"
+        self.results_offset, self.num_dumped_snapshots = self.load_results_state()
 
     def dump_action(self, action: Action):
         dump(action.to_dict(), self.action_path)
@@ -43,105 +102,235 @@ class Trader:
             return Action.from_local(load(self.action_path))
         return None
 
+    def load_results_state(self):
+        # fills already written to the results, so new ones are only appended
+        if self.results_state_path.exists() and self.results_path.exists():
+            state = load(self.results_state_path)
+            return state["offset"], state["num_dumped_snapshots"]
+        return 0, 0
+
+    def dump_results(self):
+        self.results_offset = dump_list(
+            self.strategy.ledger.snapshots(self.num_dumped_snapshots),
+            self.results_path,
+            offset=self.results_offset,
+        )
+        self.num_dumped_snapshots = len(self.strategy.ledger)
+        dump(
+            {
+                "offset": self.results_offset,
+                "num_dumped_snapshots": self.num_dumped_snapshots,
+            },
+            self.results_state_path,
+        )
+
     def dump_message(self, time, messages_dict, send_slack=False):
-        print("=" * 70)
-        print("Time:", time)
-        for k, v in messages_dict.items():
-            print(f"{k}: {v}")
-        print("=" * 70, end="\n\n")
+        if self.verbose:
+            print("=" * 70)
+            print("Time:", time)
+            print("Bot:", self.strategy.name, self.strategy.symbol)
+            for k, v in messages_dict.items():
+                print(f"{k}: {v}")
+            print("=" * 70, end="\n\n")
         if send_slack:
-            self.slack_client.send_messages(messages_dict, **SLACK_DEFAULT_CUSTOM_ARG)
-
-    def trade_and_valid_loop(self):
-        while True:
-            current_time = FormattedDateTime(self.client.time()["serverTime"])
-            # trade
-            if all(
-                [
-                    not self.current_action,
-                    (
-                        not self.last_action
-                        or (current_time - self.last_action.decision_time >= 60)
-                    ),
-                ]
-            ):
-                self.current_action = Action(current_time)
-                self.trade(current_time)
-
-            # valid
-            if self.current_action is not None:
-                is_able_to_exit = self.valid(current_time)
-
-                if is_able_to_exit:
-                    self.strategy.dump()
-                    break
-
-    def valid(self, current_time: FormattedDateTime):
-        if not self.current_action.has_order() or self.current_action.is_success():
-            return True
+            # only queued, the messages are posted by a background thread
+            self.slack_client.send_messages(
+                {
+                    "Bot": f"{self.strategy.name} {self.strategy.symbol}",
+                    **messages_dict,
+                },
+                **SLACK_DEFAULT_CUSTOM_ARG,
+            )
 
-        query_result = self.client.query_order(
+    async def call(self, method: str, **kwargs):
+        # timed per call, as the calls of concurrent bots overlap
+        start = perf_counter()
+        try:
+            return await getattr(self.client, method)(**kwargs)
+        finally:
+            PROFILER.record(f"trader.{method}", perf_counter() - start)
+
+    async def run(self, max_decisions: int = None):
+        await self.call(
+            "change_leverage",
             symbol=self.strategy.symbol.upper(),
-            orderId=self.current_action.order.order_id,
+            leverage=self.strategy.leverage,
         )
-        self.current_action.order.update_status(query_result)
-
-        if self.current_action.is_success():
-            transaction = self.current_action.order.expected_transaction
-
-            transaction.amount *= self.strategy.leverage
-            transaction.price = float(query_result["price"])
-            self.strategy.transaction_flow += transaction
-
-            self.strategy._transaction_snapshots.append(
-                self.strategy.get_transaction_snapshot(
-                    transaction.time, transaction.price, transaction
-                )
+        # a fill the bot failed to save before it was restarted
+        await self.save()
+
+        while max_decisions is None or self.num_decisions < max_decisions:
+            # decisions are taken right after the close of each bar
+            bar_close = (self.clock.time() // 60000 + 1) * 60000
+            await self.clock.sleep_until(bar_close)
+            current_time = FormattedDateTime(bar_close)
+            if self.last_action and current_time - self.last_action.decision_time < 60:
+                continue
+
+            LATENCY.record("wakeup", (self.clock.time() - bar_close) / 1000)
+            self.current_action = Action(current_time)
+            # deciding moves the strategy on, e.g., its grid, as if the order
+            # fills. a cancelled order must leave it where it was.
+            state = self.strategy.state()
+            try:
+                await self.trade(current_time)
+                is_valid = await self.valid()
+            except Exception:
+                if self.current_action.has_order() and self.current_action.is_success():
+                    # the exchange holds the fill, so it is kept and saved
+                    # once the bot is restarted
+                    self.is_saved = False
+                else:
+                    # the bot is restarted from where it was before the decision
+                    await self.abandon()
+                    self.strategy.load_state(state)
+                raise
+            if is_valid:
+                self.is_saved = False
+            else:
+                self.strategy.load_state(state)
+            self.last_action, self.current_action = self.current_action, None
+            self.num_decisions += 1
+            await self.save()
+
+    async def save(self):
+        # writes the new fills to the results and the strategy to its status
+        if self.is_saved:
+            return
+        if self.num_dumped_snapshots < len(self.strategy.ledger):
+            start = perf_counter()
+            await asyncio.to_thread(self.dump_results)
+            PROFILER.record("trader.dump", perf_counter() - start)
+        start = perf_counter()
+        await asyncio.to_thread(self.strategy.dump)
+        PROFILER.record("strategy.dump", perf_counter() - start)
+        self.is_saved = True
+
+    async def abandon(self):
+        # cancels the order of a failed decision, unless it got filled
+        if not self.current_action.has_order() or self.current_action.is_success():
+            return
+        try:
+            await self.call(
+                "cancel_order",
+                symbol=self.strategy.symbol.upper(),
+                orderId=self.current_action.order.order_id,
+            )
+        except Exception:
+            logging.exception(
+                f"Order {self.current_action.order.order_id} may still be open"
             )
 
-            dump(self.strategy.transaction_snapshots, self.results_path)
-
+    async def valid(self):
+        # polls the order on a doubling interval until it is filled, and
+        # cancels it after `order_timeout` seconds
+        if not self.current_action.has_order():
             return True
 
-        if current_time - self.current_action.order.order_time >= 50:
-            self.client.cancel_order(
+        delay = self.poll_interval
+        while True:
+            query_result = await self.call(
+                "query_order",
                 symbol=self.strategy.symbol.upper(),
                 orderId=self.current_action.order.order_id,
             )
-            self.dump_message(
-                current_time, {"Message": "Order was cancelled"}, send_slack=True
-            )
+            self.current_action.order.update_status(query_result)
+            waited = (
+                self.clock.time() - self.current_action.order.order_time.ms_timestamp
+            ) / 1000
+            if self.current_action.is_success():
+                # as seen by the bot, so it includes the polling delay
+                LATENCY.record("fill", waited)
+                break
+
+            if waited >= self.order_timeout:
+                query_result = await self.call(
+                    "cancel_order",
+                    symbol=self.strategy.symbol.upper(),
+                    orderId=self.current_action.order.order_id,
+                )
+                # the order may have filled since it was last checked
+                self.current_action.order.update_status(query_result)
+                if self.current_action.is_success():
+                    LATENCY.record("fill", waited)
+                    break
+                self.dump_message(
+                    FormattedDateTime(self.clock.time()),
+                    {"Message": "Order was cancelled"},
+                    send_slack=True,
+                )
+                return False
 
-            # TODO: find a better way to maintain status
-            exit()
+            await self.clock.sleep(min(delay, self.order_timeout - waited))
+            delay = min(delay * 2, self.max_poll_interval)
 
-        return False
+        transaction = self.current_action.order.expected_transaction
 
-    def trade(self, current_time: FormattedDateTime):
-        kline = KLine.from_api(
-            self.client.klines(
-                symbol=self.strategy.symbol.upper(), interval="1m", limit=1
-            )[0]
+        transaction.amount *= self.strategy.leverage
+        # the price of the fill, which beats the limit price when the order
+        # was marketable
+        transaction.price = float(query_result.get("avgPrice", 0)) or float(
+            query_result["price"]
+        )
+        self.strategy.update_transaction(
+            transaction.time, transaction, transaction.price
+        )
+        self.publisher.publish(
+            {"type": "fill", **self.strategy.get_last_transaction_snapshot()}
+        )
+        return True
+
+    async def trade(self, current_time: FormattedDateTime):
+        start = perf_counter()
+        kline = await self.feed.kline(self.strategy.symbol, current_time.ms_timestamp)
+        LATENCY.record("kline_fetch", perf_counter() - start)
+
+        self.publisher.publish(
+            {
+                "type": "equity",
+                "time": current_time.ms_timestamp,
+                "price": kline.close,
+                "average_price": self.strategy.transaction_flow.average_price,
+                "profit": self.strategy.transaction_flow.net_profit(kline.close),
+            }
         )
 
-        transactions = self.strategy._get_action(current_time, kline)
+        start = perf_counter()
+        # strategies may block, e.g., on the kdj of their endpoint or on their
+        # price history, so they decide in a thread and the other bots keep
+        # trading. they return None when they have nothing to do.
+        transactions = (
+            await asyncio.to_thread(self.strategy._get_action, current_time, kline)
+            or []
+        )
+        PROFILER.record("strategy.get_action", perf_counter() - start)
+        LATENCY.record("decision", perf_counter() - start)
         transaction = transactions[0] if len(transactions) > 0 else None
+        # one order per bar, while backtests take every transaction. the
+        # strategy moves on as if all of them filled, so a bar crossing
+        # several levels of a grid trades only the first one live.
+        PROFILER.count("trader.skipped_transactions", max(len(transactions) - 1, 0))
 
         if transaction:
-            order = Order.from_online(
-                self.client.new_order(
-                    **{
-                        "symbol": self.strategy.symbol.upper(),
-                        "side": transaction.mode.name,
-                        "type": "LIMIT",
-                        "timeInForce": "GTC",
-                        # TODO: set a min value to ensure the value would be at least five
-                        "quantity": transaction.amount * self.strategy.leverage,
-                        "price": f"{transaction.price:.4f}",
-                    }
-                ),
-                transaction=transaction,
+            # from the close of the bar to the order leaving the bot
+            LATENCY.record(
+                "order_submit", (self.clock.time() - current_time.ms_timestamp) / 1000
             )
+            start = perf_counter()
+            order_result = await self.call(
+                "new_order",
+                **{
+                    "symbol": self.strategy.symbol.upper(),
+                    "side": transaction.mode.name,
+                    "type": "LIMIT",
+                    "timeInForce": "GTC",
+                    # TODO: set a min value to ensure the value would be at least five
+                    "quantity": transaction.amount * self.strategy.leverage,
+                    "price": f"{transaction.price:.4f}",
+                },
+            )
+            LATENCY.record("order_ack", perf_counter() - start)
+            order = Order.from_online(order_result, transaction=transaction)
             self.current_action.update_order(order)
         self.dump_message(
             current_time,
@@ -152,38 +341,254 @@ class Trader:
         self.dump_action(self.current_action)
 
 
+class TraderHost:
+    # runs many bots in one process. they share the clock, the exchange client
+    # and the market feed, while each keeps its own strategy, status and results.
+    def __init__(
+        self,
+        client: BinanceFuturesClient,
+        slack_client: SlackNotifier,
+        restart_delay: float = 5,
+        max_restart_delay: float = 300,
+    ):
+        self.client = client
+        self.slack_client = slack_client
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        # orders are signed with the clock, so it is the one of the client
+        self.clock = client.clock
+        self.feed = MarketFeed(client, self.clock)
+        self.traders = {}
+
+    def add(self, strategy: BaseStrategy, publisher=NULL_PUBLISHER, **kwargs):
+        # bots are told apart by their status, which is kept per name and symbol
+        key = (strategy.name, strategy.symbol)
+        if key in self.traders:
+            raise ValueError(f"{strategy.name} is already trading {strategy.symbol}")
+        self.traders[key] = Trader(
+            strategy, self.client, self.feed, self.slack_client, publisher, **kwargs
+        )
+        return self.traders[key]
+
+    async def server_time(self):
+        return (await self.client.time())["serverTime"]
+
+    async def run_trader(self, trader: Trader, max_decisions: int = None):
+        # a bot failing on the exchange or the network is restarted with
+        # backoff, any other failure stops it. the others keep trading.
+        attempt = 0
+        while True:
+            num_decisions = trader.num_decisions
+            try:
+                return await trader.run(max_decisions)
+            except (ExchangeError, OSError) as e:
+                if trader.num_decisions > num_decisions:
+                    attempt = 0
+                delay = backoff_delay(
+                    attempt, self.restart_delay, self.max_restart_delay
+                )
+                attempt += 1
+                logging.warning(
+                    f"{trader.strategy.name} {trader.strategy.symbol} failed: {e!r}"
+                )
+                trader.dump_message(
+                    FormattedDateTime(self.clock.time()),
+                    {"Message": f"Trader restarts in {delay:.0f}s: {e!r}"},
+                    send_slack=True,
+                )
+                await self.clock.sleep(delay)
+            except Exception as e:
+                logging.exception(f"{trader.strategy.name} {trader.strategy.symbol}")
+                trader.dump_message(
+                    FormattedDateTime(self.clock.time()),
+                    {"Message": f"Trader stopped: {e!r}"},
+                    send_slack=True,
+                )
+                return
+
+    async def run(self, max_decisions: int = None):
+        start = perf_counter()
+        offset = await self.clock.sync(self.server_time)
+        LATENCY.record("clock_sync", perf_counter() - start)
+        print(f"Clock offset to the server: {offset} ms")
+        # a simulated clock moves on once every bot is asleep
+        await self.clock.wait(
+            [
+                asyncio.ensure_future(self.run_trader(trader, max_decisions))
+                for trader in self.traders.values()
+            ]
+        )
+
+
 def argument_parsing():
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--strategy_config_path",
         type=StrategyPath,
-        default=StrategyPath("config/optimal_config.json"),
+        nargs="+",
+        default=[StrategyPath("config/optimal_config.json")],
+        help="Configs of the bots to run, one per strategy and symbol",
+    )
+    parser.add_argument("--profile", action="store_true", default=False)
+    parser.add_argument(
+        "--stream_url",
+        type=str,
+        default=STREAM_URL,
+        help="Dashboard server to stream the trades to, e.g., http://localhost:9898",
+    )
+    parser.add_argument(
+        "--weight_budget",
+        type=int,
+        default=600,
+        help="Api request weight all bots together may spend per minute",
+    )
+    parser.add_argument(
+        "--order_timeout",
+        type=float,
+        default=50,
+        help="Seconds an order may stay unfilled before it is cancelled",
+    )
+    parser.add_argument(
+        "--poll_interval",
+        type=float,
+        default=0.5,
+        help="Seconds before an open order is first checked, doubled on every check",
+    )
+    parser.add_argument(
+        "--max_poll_interval",
+        type=float,
+        default=8.0,
+        help="Maximum seconds between checks of an open order",
+    )
+    parser.add_argument(
+        "--restart_delay",
+        type=float,
+        default=5,
+        help="Seconds before a bot failing on the exchange is first restarted",
+    )
+    parser.add_argument(
+        "--max_restart_delay",
+        type=float,
+        default=300,
+        help="Maximum seconds before a failing bot is restarted",
+    )
+    parser.add_argument(
+        "--base_url",
+        type=str,
+        default=BinanceFuturesClient.BINANCE_API_URL,
+        help="Api to trade on, e.g., https://testnet.binancefuture.com",
+    )
+    parser.add_argument(
+        "--slack_url",
+        type=str,
+        default="https://slack.com/api/",
+        help="Slack api to notify, e.g., the mock server of script.mock_slack",
+    )
+    parser.add_argument(
+        "--slack_interval",
+        type=float,
+        default=2.0,
+        help="Seconds over which notifications are gathered into one slack message",
+    )
+    parser.add_argument(
+        "--metrics_port",
+        type=int,
+        default=8001,
+        help="Local port serving the latency percentiles at /metrics, 0 to disable",
+    )
+    parser.add_argument(
+        "--metrics_interval",
+        type=float,
+        default=60,
+        help="Seconds between dumps of the latency percentiles",
+    )
+    parser.add_argument(
+        "--latency_alert",
+        type=str,
+        nargs="*",
+        default=[],
+        metavar="STAGE=MS",
+        help="Alert on slack when the p99 of a stage over an interval exceeds the "
+        "milliseconds, e.g., order_submit=500 fill=30000",
     )
 
     return parser.parse_args()
 
 
-def main(args):
-    strategy_config = load(args.strategy_config_path)
-    strategy = get_strategy(strategy_config)
-    client = UMFutures(
-        key=os.environ.get("API_KEY", None),
-        secret=os.environ.get("SECRET_KEY", None),
-        # base_url="https://testnet.binancefuture.com"
-    )
+def parse_thresholds(alerts):
+    thresholds = {}
+    for alert in alerts:
+        stage, _, milliseconds = alert.partition("=")
+        thresholds[stage] = float(milliseconds)
+    return thresholds
 
-    slack_client = SlackBot(
-        api_token=os.environ.get("SLACK_API_TOKEN"),
-        channel_id=os.environ.get("SLACK_CHANNEL_ID"),
-    )
 
-    client.change_leverage(symbol=strategy.symbol.upper(), leverage=strategy.leverage)
+async def main(args):
+    # stopping the host lets the bots close their publishers and notifications
+    task = asyncio.current_task()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(sig, task.cancel)
 
-    trader = Trader(strategy, client, slack_client)
+    slack_client = SlackNotifier(
+        SlackBot(
+            api_token=os.environ.get("SLACK_API_TOKEN"),
+            channel_id=os.environ.get("SLACK_CHANNEL_ID"),
+            base_url=args.slack_url,
+        ),
+        flush_interval=args.slack_interval,
+    )
+    monitor = LatencyMonitor(
+        ResultsPath("trader/latency.json"),
+        interval=args.metrics_interval,
+        thresholds=parse_thresholds(args.latency_alert),
+        notifier=slack_client,
+    )
 
-    trader.trade_and_valid_loop()
+    publishers = []
+    async with BinanceFuturesClient(
+        key=os.environ.get("API_KEY", None),
+        secret=os.environ.get("SECRET_KEY", None),
+        base_url=args.base_url,
+        weight_budget=args.weight_budget,
+    ) as client:
+        host = TraderHost(
+            client,
+            slack_client,
+            restart_delay=args.restart_delay,
+            max_restart_delay=args.max_restart_delay,
+        )
+        try:
+            for strategy_config_path in args.strategy_config_path:
+                strategy = get_strategy(load(strategy_config_path))
+                publishers.append(
+                    get_publisher(args.stream_url, strategy.name, strategy.symbol)
+                )
+                host.add(
+                    strategy,
+                    publishers[-1],
+                    order_timeout=args.order_timeout,
+                    poll_interval=args.poll_interval,
+                    max_poll_interval=args.max_poll_interval,
+                )
+            monitoring = asyncio.ensure_future(monitor.run(args.metrics_port))
+            try:
+                await host.run()
+            finally:
+                monitoring.cancel()
+                await asyncio.gather(monitoring, return_exceptions=True)
+        except asyncio.CancelledError:
+            logging.info("Stopped")
+        finally:
+            for publisher in publishers:
+                publisher.close()
+            slack_client.close()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
     args = argument_parsing()
-    main(args)
+    if args.profile:
+        PROFILER.enable()
+    asyncio.run(main(args))
+    PROFILER.print_report()
+    LATENCY.print_report()
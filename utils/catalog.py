@@ -0,0 +1,205 @@
+import hashlib
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    data_fingerprint TEXT NOT NULL,
+    config TEXT NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+    final_profit REAL,
+    max_profit REAL,
+    min_profit REAL,
+    max_drawdown REAL,
+    sharpe REAL,
+    num_fills INTEGER,
+    is_bankrupt INTEGER,
+    artifacts_dir TEXT,
+    UNIQUE (config_hash, data_fingerprint)
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS runs_symbol_sharpe ON runs (symbol, sharpe DESC);
+CREATE INDEX IF NOT EXISTS runs_symbol_profit ON runs (symbol, final_profit DESC);
+CREATE INDEX IF NOT EXISTS runs_symbol_drawdown ON runs (symbol, max_drawdown);
+CREATE INDEX IF NOT EXISTS runs_config_hash ON runs (config_hash, created_at);
+CREATE INDEX IF NOT EXISTS runs_strategy_symbol ON runs (strategy, symbol, created_at);
+"""
+
+RUN_FIELDS = [
+    "strategy",
+    "symbol",
+    "config_hash",
+    "data_fingerprint",
+    "config",
+    "start_time",
+    "end_time",
+    "final_profit",
+    "max_profit",
+    "min_profit",
+    "max_drawdown",
+    "sharpe",
+    "num_fills",
+    "is_bankrupt",
+]
+# the best runs come first: smaller drawdowns, higher everything else
+ORDER_BY = {
+    "sharpe": "DESC",
+    "final_profit": "DESC",
+    "max_drawdown": "ASC",
+    "created_at": "DESC",
+}
+
+
+def config_hash(strategy_config: Dict[str, Any]) -> str:
+    # the same strategy config gives the same hash, whatever the backtest range
+    return hashlib.sha256(
+        json.dumps(strategy_config, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def profit_metrics(daily_buckets, hourly_buckets, budget: float):
+    # computed from the profit pyramid, so the whole run is covered even when
+    # it was resumed. drawdowns are resolved to the hour.
+    daily_profits = np.array([0.0] + [bucket["profit"] for bucket in daily_buckets])
+    daily_returns = np.diff(daily_profits) / budget
+    std = daily_returns.std()
+    sharpe = float(daily_returns.mean() / std * np.sqrt(365)) if std > 0 else None
+
+    highs = np.array([bucket["profit_max"] for bucket in hourly_buckets])
+    lows = np.array([bucket["profit_min"] for bucket in hourly_buckets])
+    max_drawdown = (
+        float(np.max(np.maximum.accumulate(highs) - lows)) if len(highs) else 0.0
+    )
+    return {"sharpe": sharpe, "max_drawdown": max_drawdown}
+
+
+class RunCatalog:
+    # an index of past backtests, one row per strategy config and data range.
+    # the result files are pointed to with their size and mtime, so a file
+    # overwritten by a later run is told apart. runs recorded by earlier
+    # versions have their files archived in `artifacts_dir` instead.
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def add_run(self, run: Dict[str, Any], artifacts: List[Path]) -> int:
+        # the files are stat-ed before the transaction, which only writes rows
+        pointers = []
+        for artifact in artifacts:
+            if artifact.exists():
+                stat = artifact.stat()
+                pointers.append(
+                    [
+                        artifact.name,
+                        str(artifact.resolve()),
+                        stat.st_size,
+                        stat.st_mtime_ns,
+                    ]
+                )
+
+        # rerunning the same config on the same data replaces the earlier row
+        values = [run[name] for name in RUN_FIELDS]
+        with self.connection:
+            self.connection.execute(
+                f"""
+                INSERT INTO runs (created_at, {", ".join(RUN_FIELDS)})
+                VALUES (?, {", ".join("?" * len(RUN_FIELDS))})
+                ON CONFLICT (config_hash, data_fingerprint) DO UPDATE SET
+                created_at = excluded.created_at,
+                {", ".join(f"{name} = excluded.{name}" for name in RUN_FIELDS)}
+                """,
+                [datetime.now().isoformat(timespec="seconds"), *values],
+            )
+            run_id = self.connection.execute(
+                "SELECT id FROM runs WHERE config_hash = ? AND data_fingerprint = ?",
+                [run["config_hash"], run["data_fingerprint"]],
+            ).fetchone()["id"]
+
+            self.connection.execute("DELETE FROM artifacts WHERE run_id = ?", [run_id])
+            self.connection.executemany(
+                "INSERT INTO artifacts (run_id, name, path, size, mtime_ns) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [[run_id, *pointer] for pointer in pointers],
+            )
+        return run_id
+
+    def artifacts(self, run_id: int):
+        rows = self.connection.execute(
+            "SELECT name, path, size, mtime_ns FROM artifacts WHERE run_id = ?",
+            [run_id],
+        ).fetchall()
+        return {row["name"]: dict(row) for row in rows}
+
+    def get_run(self, run_id: int):
+        row = self.connection.execute(
+            "SELECT * FROM runs WHERE id = ?", [run_id]
+        ).fetchone()
+        if row is None:
+            return None
+        return {**self.to_dict(row), "artifacts": self.artifacts(run_id)}
+
+    def runs(
+        self,
+        strategy: str = None,
+        symbol: str = None,
+        config_hash: str = None,
+        order_by: str = "created_at",
+        limit: int = 100,
+    ):
+        if order_by not in ORDER_BY:
+            raise ValueError(f"Cannot order runs by {order_by}")
+
+        conditions, values = [], []
+        for name, value in [
+            ("strategy", strategy),
+            ("symbol", symbol),
+            ("config_hash", config_hash),
+        ]:
+            if value is not None:
+                conditions.append(f"{name} = ?")
+                values.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # nulls sort first in sqlite, so runs without a sharpe ratio come last
+        rows = self.connection.execute(
+            f"SELECT * FROM runs {where} ORDER BY {order_by} {ORDER_BY[order_by]} "
+            "LIMIT ?",
+            [*values, limit],
+        ).fetchall()
+        return [self.to_dict(row) for row in rows]
+
+    def best_runs(self, symbol: str, metric: str = "sharpe", limit: int = 10):
+        return self.runs(symbol=symbol, order_by=metric, limit=limit)
+
+    def runs_of_config(self, config_hash: str):
+        return self.runs(config_hash=config_hash)
+
+    @staticmethod
+    def to_dict(row: sqlite3.Row):
+        run = dict(row)
+        run["config"] = json.loads(run["config"])
+        run["is_bankrupt"] = bool(run["is_bankrupt"])
+        return run
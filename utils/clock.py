@@ -0,0 +1,94 @@
+import asyncio
+import heapq
+import time
+
+
+class SystemClock:
+    # the local clock, shifted to the server time once `sync` is called
+    def __init__(self):
+        self.offset = 0
+
+    def time(self) -> int:
+        return int(time.time() * 1000) + self.offset
+
+    async def sync(self, get_server_time):
+        # the server time is read halfway through the round trip
+        sent_at = time.time() * 1000
+        server_time = await get_server_time()
+        received_at = time.time() * 1000
+        self.offset = int(server_time - (sent_at + received_at) / 2)
+        return self.offset
+
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+    async def sleep_until(self, ms_timestamp: int):
+        delay = (ms_timestamp - self.time()) / 1000
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def wait(self, tasks):
+        return await asyncio.gather(*tasks)
+
+
+class SimulatedClock:
+    # virtual time for replays. sleeping tasks are woken in time order, and the
+    # time only moves on once every task of `wait` is asleep, so no sleep lasts
+    # longer than it takes the other tasks to reach their next one.
+    def __init__(self, start_time: int, end_time: int = None):
+        self.now = start_time
+        self.end_time = end_time
+        self.offset = 0
+        self.sleepers = []
+        self.sleeping = set()
+        self.num_sleeps = 0
+
+    def time(self) -> int:
+        return self.now + self.offset
+
+    async def sync(self, get_server_time):
+        self.offset = int(await get_server_time()) - self.now
+        return self.offset
+
+    async def sleep(self, seconds: float):
+        await self.sleep_until(self.time() + round(seconds * 1000))
+
+    async def sleep_until(self, ms_timestamp: int):
+        if ms_timestamp <= self.time():
+            return
+        future = asyncio.get_running_loop().create_future()
+        task = asyncio.current_task()
+        heapq.heappush(
+            self.sleepers, (ms_timestamp - self.offset, self.num_sleeps, future, task)
+        )
+        self.num_sleeps += 1
+        self.sleeping.add(task)
+        try:
+            await future
+        finally:
+            self.sleeping.discard(task)
+
+    def wake_next(self):
+        # moves the time to the earliest wake up and wakes every task due then
+        self.now = max(self.now, self.sleepers[0][0])
+        while self.sleepers and self.sleepers[0][0] <= self.now:
+            _, _, future, task = heapq.heappop(self.sleepers)
+            self.sleeping.discard(task)
+            if not future.done():
+                future.set_result(None)
+
+    async def wait(self, tasks):
+        # runs `tasks` until they are done, or until they sleep past `end_time`
+        try:
+            while not all(task.done() for task in tasks):
+                is_idle = all(task.done() or task in self.sleeping for task in tasks)
+                if not is_idle or not self.sleepers:
+                    await asyncio.sleep(0)
+                elif self.end_time is not None and self.sleepers[0][0] > self.end_time:
+                    break
+                else:
+                    self.wake_next()
+        finally:
+            for task in tasks:
+                task.cancel()
+        return await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,85 @@
+import struct
+from datetime import datetime
+from typing import Any, Dict, List, Union
+
+import numpy as np
+import pytz
+
+# binary columns: a little-endian uint32 number of rows and of columns, then per
+# column a uint32 name length, the utf-8 name, zero padding to a multiple of 8
+# bytes and the float64 values, so clients can view them without copying.
+
+
+def key_times(keys: List[str], tz: str = "Asia/Taipei") -> np.ndarray:
+    # ms timestamps of the datetime strings keying price files, which are
+    # written in the local time of `tz`
+    if not keys:
+        return np.empty(0)
+    local_times = np.array(keys, dtype="datetime64[s]").astype(np.int64)
+    offset = pytz.timezone(tz).localize(datetime.fromisoformat(keys[0])).utcoffset()
+    return (local_times - int(offset.total_seconds())) * 1000.0
+
+
+def time_keys(times: np.ndarray, tz: str = "Asia/Taipei") -> List[str]:
+    # the inverse of `key_times`, formatted like `FormattedDateTime.string`
+    if len(times) == 0:
+        return []
+    first = datetime.fromtimestamp(int(times[0]) // 1000, tz=pytz.timezone(tz))
+    offset = int(first.utcoffset().total_seconds()) * 1000
+    local_times = (np.asarray(times, dtype=np.int64) + offset).astype("datetime64[ms]")
+    return [
+        key.replace("T", " ")
+        for key in np.datetime_as_string(local_times, unit="s").tolist()
+    ]
+
+
+def numeric_fields(record: Dict[str, Any]) -> List[str]:
+    return [
+        name
+        for name, value in record.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    ]
+
+
+def to_columns(data: Union[Dict[str, Any], List[Dict[str, Any]]]):
+    # price dicts get a `time` column from their keys, other fields that are
+    # not numbers are left out
+    if isinstance(data, dict):
+        columns = {"time": key_times(list(data.keys()))}
+        records = list(data.values())
+    else:
+        columns, records = {}, data
+
+    for name in numeric_fields(records[0]) if records else []:
+        columns[name] = np.fromiter(
+            (record[name] for record in records), dtype=np.float64, count=len(records)
+        )
+    return columns
+
+
+def encode_columns(columns: Dict[str, np.ndarray]) -> bytes:
+    num_rows = len(next(iter(columns.values()))) if columns else 0
+    chunks = [struct.pack("<II", num_rows, len(columns))]
+    offset = 8
+    for name, values in columns.items():
+        encoded_name = name.encode()
+        header = struct.pack("<I", len(encoded_name)) + encoded_name
+        header += b"\0" * (-(offset + len(header)) % 8)
+        chunks += [header, np.asarray(values, dtype="<f8").tobytes()]
+        offset += len(header) + 8 * num_rows
+    return b"".join(chunks)
+
+
+def decode_columns(content: bytes) -> Dict[str, np.ndarray]:
+    num_rows, num_columns = struct.unpack_from("<II", content)
+    columns, offset = {}, 8
+    for _ in range(num_columns):
+        (name_length,) = struct.unpack_from("<I", content, offset)
+        name = content[offset + 4 : offset + 4 + name_length].decode()
+        offset += 4 + name_length
+        offset += -offset % 8
+        columns[name] = np.frombuffer(
+            content, dtype="<f8", count=num_rows, offset=offset
+        )
+        offset += 8 * num_rows
+    return columns
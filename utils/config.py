@@ -6,6 +6,8 @@ RESULTS_ROOT = Path(os.environ.get("RESULTS_ROOT", None))
 STRATEGY_ROOT = Path(os.environ.get("STRATEGY_ROOT", None))
 PYTHON_PATH = os.environ.get("PYTHON_PATH", None)
 STATUS_ROOT = Path(os.environ.get("STATUS_ROOT", None))
+# optional, the dashboard server to stream progress to
+STREAM_URL = os.environ.get("STREAM_URL", None)
 
 
 class BasePrefixPath(Path):
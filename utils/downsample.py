@@ -0,0 +1,61 @@
+import numpy as np
+
+# both downsamplers share the same buckets: the first and the last values on
+# their own, the rest split evenly. downsampled candles and lines of the same
+# range therefore line up point by point.
+
+
+def bucket_edges(num_values: int, num_points: int) -> np.ndarray:
+    if num_values <= num_points:
+        return np.arange(num_values + 1)
+    inner_edges = 1 + np.arange(num_points - 1) * (num_values - 2) // (num_points - 2)
+    return np.concatenate([[0], inner_edges, [num_values]])
+
+
+def lttb(x: np.ndarray, y: np.ndarray, num_points: int) -> np.ndarray:
+    # largest-triangle-three-buckets: the index of the point of every bucket
+    # forming the largest triangle with the previous pick and the average of
+    # the next bucket
+    num_values = len(x)
+    if num_points >= num_values or num_points < 3:
+        return np.arange(num_values)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = bucket_edges(num_values, num_points)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x, edges[:-1]) / counts
+    avg_y = np.add.reduceat(y, edges[:-1]) / counts
+
+    selected = np.empty(num_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, num_values - 1
+    prev_idx = 0
+    for i in range(1, num_points - 1):
+        begin, end = edges[i], edges[i + 1]
+        prev_x, prev_y = x[prev_idx], y[prev_idx]
+        areas = np.abs(
+            (prev_x - avg_x[i + 1]) * (y[begin:end] - prev_y)
+            - (prev_x - x[begin:end]) * (avg_y[i + 1] - prev_y)
+        )
+        prev_idx = begin + int(np.argmax(areas))
+        selected[i] = prev_idx
+    return selected
+
+
+def aggregate_ohlc(
+    open_: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    num_points: int,
+):
+    # one candle per bucket, along with the index of its first bar
+    edges = bucket_edges(len(open_), num_points)
+    starts = edges[:-1]
+    return (
+        starts,
+        open_[starts],
+        np.maximum.reduceat(high, starts),
+        np.minimum.reduceat(low, starts),
+        close[edges[1:] - 1],
+    )
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+from urllib.parse import urlencode
+
+import aiohttp
+
+from utils.clock import SystemClock
+from utils.rate_limit import TokenBucket, backoff_delay
+
+# request weight limit of the futures api per minute and ip
+WEIGHT_LIMIT = 2400
+# request weight of the endpoints on the futures api, new orders only count
+# towards the order rate limit
+API_WEIGHTS = {
+    "time": 1,
+    "klines": 1,
+    "new_order": 0,
+    "query_order": 1,
+    "cancel_order": 1,
+    "change_leverage": 1,
+}
+
+
+class ExchangeError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+class BinanceFuturesClient:
+    # an async stand-in for the calls of `UMFutures` the trader makes. one
+    # client is shared by every bot of a process: requests go through one pool
+    # of connections and draw from one budget of request weight per minute.
+    BINANCE_API_URL = "https://fapi.binance.com"
+
+    def __init__(
+        self,
+        key: str = None,
+        secret: str = None,
+        base_url: str = BINANCE_API_URL,
+        weight_budget: int = 1200,
+        max_connections: int = 8,
+        max_retries: int = 3,
+        clock=None,
+    ):
+        self.key = key
+        self.secret = secret
+        self.base_url = base_url
+        self.clock = clock or SystemClock()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_connections),
+            timeout=aiohttp.ClientTimeout(total=10),
+        )
+        # spent in bursts of up to a tenth of the budget
+        self.limiter = TokenBucket(weight_budget / 10, weight_budget * 0.9 / 60)
+        self.weight_budget = weight_budget
+        self.max_retries = max_retries
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args, **kwargs):
+        await self.close()
+
+    async def close(self):
+        await self.session.close()
+
+    def sign(self, params):
+        params = {k: v for k, v in params.items() if v is not None}
+        params["timestamp"] = self.clock.time()
+        query = urlencode(params)
+        signature = hmac.new(
+            self.secret.encode(), query.encode(), hashlib.sha256
+        ).hexdigest()
+        return f"{query}&signature={signature}"
+
+    async def request(
+        self, method: str, path: str, weight: int, params=None, signed=False
+    ):
+        # only reads are retried, a retried order could be placed twice
+        params = params or {}
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(weight)
+            if signed:
+                query = self.sign(params)
+            else:
+                query = urlencode({k: v for k, v in params.items() if v is not None})
+            try:
+                async with self.session.request(
+                    method,
+                    f"{self.base_url}{path}?{query}",
+                    headers={"X-MBX-APIKEY": self.key} if self.key else None,
+                ) as response:
+                    used_weight = response.headers.get("X-MBX-USED-WEIGHT-1M")
+                    if used_weight is not None:
+                        # other clients on the same ip, e.g., the kline daemon,
+                        # spend from the same limit
+                        self.limiter.sync(WEIGHT_LIMIT - int(used_weight))
+                    if response.status in (418, 429):
+                        self.limiter.pause(
+                            float(response.headers.get("Retry-After", 60))
+                        )
+                    if response.status == 200:
+                        return await response.json()
+                    error = ExchangeError(response.status, await response.text())
+                    if response.status < 500 and response.status not in (418, 429):
+                        raise error
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = ExchangeError(0, f"{type(e).__name__}: {e}")
+
+            if method != "GET" or attempt == self.max_retries:
+                raise error
+            delay = backoff_delay(attempt)
+            logging.warning(f"{method} {path} failed ({error}), retry in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def time(self):
+        return await self.request("GET", "/fapi/v1/time", API_WEIGHTS["time"])
+
+    async def klines(self, symbol: str, interval: str, **kwargs):
+        return await self.request(
+            "GET",
+            "/fapi/v1/klines",
+            API_WEIGHTS["klines"],
+            {"symbol": symbol, "interval": interval, **kwargs},
+        )
+
+    async def new_order(self, **kwargs):
+        return await self.request(
+            "POST", "/fapi/v1/order", API_WEIGHTS["new_order"], kwargs, signed=True
+        )
+
+    async def query_order(self, symbol: str, orderId: int):
+        return await self.request(
+            "GET",
+            "/fapi/v1/order",
+            API_WEIGHTS["query_order"],
+            {"symbol": symbol, "orderId": orderId},
+            signed=True,
+        )
+
+    async def cancel_order(self, symbol: str, orderId: int):
+        return await self.request(
+            "DELETE",
+            "/fapi/v1/order",
+            API_WEIGHTS["cancel_order"],
+            {"symbol": symbol, "orderId": orderId},
+            signed=True,
+        )
+
+    async def change_leverage(self, symbol: str, leverage: int):
+        return await self.request(
+            "POST",
+            "/fapi/v1/leverage",
+            API_WEIGHTS["change_leverage"],
+            {"symbol": symbol, "leverage": leverage},
+            signed=True,
+        )
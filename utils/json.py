@@ -1,5 +1,7 @@
 import json
+import os
 import pickle
+import textwrap
 from pathlib import Path
 
 from protocol.datetime import DatetimeJsonEncoder
@@ -17,15 +19,67 @@ def load(path: Path, is_pickle=False):
     return data
 
 
-def dump(obj, path: Path, is_pickle=False, mode="w"):
+def dump(obj, path: Path, is_pickle=False, mode="w", atomic=False):
+    # an atomic dump writes a temporary file that replaces `path` once it is
+    # on disk, so a crash never leaves a partly written file behind
     if not isinstance(path, Path):
         path = Path(path)
     path.parent.mkdir(exist_ok=True, parents=True)
-    with path.open(mode if not is_pickle else mode + "b") as f:
+    write_path = path.with_name(f".{path.name}.tmp") if atomic else path
+    with write_path.open(mode if not is_pickle else mode + "b") as f:
         if is_pickle:
-            pickle.dump(obj, f)
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
         else:
             json.dump(obj, f, indent=4, cls=DatetimeJsonEncoder)
+        if atomic:
+            f.flush()
+            os.fsync(f.fileno())
+    if atomic:
+        write_path.replace(path)
+
+
+def _encode_list_item(item, is_first):
+    encoded = json.dumps(item, indent=4, cls=DatetimeJsonEncoder)
+    return ("\n" if is_first else ",\n") + textwrap.indent(encoded, " " * 4)
+
+
+def dump_list(items, path: Path, offset=0, tail=()):
+    # writes a json list laid out like `dump`, starting from `offset` when the
+    # file already holds a prefix of the list. `tail` is written after `items`
+    # but is not covered by the returned offset, so it gets overwritten by the
+    # next append.
+    if not isinstance(path, Path):
+        path = Path(path)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with path.open("r+b" if offset else "wb") as f:
+        if offset:
+            f.seek(offset)
+            f.truncate()
+        else:
+            f.write(b"[")
+            offset = 1
+        for item in items:
+            f.write(_encode_list_item(item, offset == 1).encode())
+            offset = f.tell()
+        for item in tail:
+            f.write(_encode_list_item(item, f.tell() == 1).encode())
+        f.write(b"\n]")
+    return offset
+
+
+def list_offset(path: Path):
+    # the offset for `dump_list` to append to the json list at `path`
+    if not isinstance(path, Path):
+        path = Path(path)
+    if not path.exists():
+        return 0
+    size = path.stat().st_size
+    with path.open("rb") as f:
+        f.seek(max(size - 2, 0))
+        end = f.read()
+    if end not in (b"\n]", b"[]"):
+        raise ValueError(f"{path} does not end like a json list")
+    return size - (1 if end == b"[]" else 2)
 
 
 if __name__ == "__main__":
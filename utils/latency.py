@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import time
+from array import array
+
+import numpy as np
+from aiohttp import web
+
+from utils.json import dump_list, list_offset
+
+PERCENTILES = {"p50": 50, "p90": 90, "p99": 99, "p999": 99.9}
+
+
+class LatencyHistogram:
+    # hdr-style histogram of microseconds: values below 2**precision are
+    # counted exactly, every later power of two is split into 2**(precision-1)
+    # linear buckets. memory is constant and every value is kept within a
+    # relative error of 2**(1-precision), below 1% by default.
+    def __init__(self, precision: int = 8, max_bits: int = 40):
+        self.precision = precision
+        self.num_exact = 1 << precision
+        self.half = self.num_exact >> 1
+        self.max_value = (1 << max_bits) - 1
+        self.num_buckets = self.index(self.max_value) + 1
+        self.reset()
+
+    def reset(self):
+        self.counts = array("q", bytes(8 * self.num_buckets))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def index(self, value: int) -> int:
+        if value < self.num_exact:
+            return value
+        shift = value.bit_length() - self.precision
+        return self.num_exact + (shift - 1) * self.half + (value >> shift) - self.half
+
+    def highest_value(self, idx: int) -> int:
+        # the highest value counted in the bucket
+        if idx < self.num_exact:
+            return idx
+        shift, top = divmod(idx - self.num_exact, self.half)
+        shift += 1
+        return ((top + self.half + 1) << shift) - 1
+
+    def record(self, value: int):
+        value = min(max(int(value), 0), self.max_value)
+        self.counts[self.index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> int:
+        if self.count == 0:
+            return 0
+        cumulative = np.cumsum(np.frombuffer(self.counts, dtype=np.int64))
+        idx = int(np.searchsorted(cumulative, max(1, np.ceil(q / 100 * self.count))))
+        return min(self.highest_value(idx), self.max)
+
+    def summary(self):
+        # in milliseconds
+        return {
+            "count": self.count,
+            "mean": self.total / self.count / 1000 if self.count else 0.0,
+            **{name: self.percentile(q) / 1000 for name, q in PERCENTILES.items()},
+            "max": self.max / 1000,
+        }
+
+
+class LatencyRecorder:
+    # latency of every stage of the live trading path, since the start and
+    # since the last `flush`
+    def __init__(self):
+        self.totals = {}
+        self.intervals = {}
+
+    def record(self, stage: str, seconds: float):
+        if stage not in self.totals:
+            self.totals[stage] = LatencyHistogram()
+            self.intervals[stage] = LatencyHistogram()
+        microseconds = seconds * 1e6
+        self.totals[stage].record(microseconds)
+        self.intervals[stage].record(microseconds)
+
+    def report(self):
+        return {stage: histogram.summary() for stage, histogram in self.totals.items()}
+
+    def flush(self):
+        # the summary of the stages recorded since the last flush
+        report = {
+            stage: histogram.summary()
+            for stage, histogram in self.intervals.items()
+            if histogram.count > 0
+        }
+        for histogram in self.intervals.values():
+            histogram.reset()
+        return report
+
+    def print_report(self):
+        print("=" * 100)
+        print(
+            f"{'Stage (ms)':<24}{'Count':>10}{'Mean':>11}{'P50':>11}"
+            f"{'P90':>11}{'P99':>11}{'P99.9':>11}{'Max':>11}"
+        )
+        for stage, summary in self.report().items():
+            print(
+                f"{stage:<24}{summary['count']:>10}{summary['mean']:>11.3f}"
+                f"{summary['p50']:>11.3f}{summary['p90']:>11.3f}"
+                f"{summary['p99']:>11.3f}{summary['p999']:>11.3f}"
+                f"{summary['max']:>11.3f}"
+            )
+        print("=" * 100, end="\n" * 2)
+
+
+LATENCY = LatencyRecorder()
+
+
+class LatencyMonitor:
+    # appends the percentiles of every `interval` seconds to `path`, serves
+    # them at `/metrics`, and alerts when the p99 of a stage exceeds its
+    # threshold in `thresholds`, in milliseconds
+    def __init__(
+        self,
+        path,
+        interval: float = 60,
+        thresholds=None,
+        notifier=None,
+        recorder: LatencyRecorder = LATENCY,
+    ):
+        self.path = path
+        self.interval = interval
+        self.thresholds = thresholds or {}
+        self.notifier = notifier
+        self.recorder = recorder
+        # the intervals of earlier runs are kept, new ones are appended
+        try:
+            self.offset = list_offset(path)
+        except ValueError as e:
+            logging.warning(f"{e}, it is written anew")
+            self.offset = 0
+        self.last_report = {}
+
+    def alerts(self, report):
+        return [
+            f"p99 of {stage} was {report[stage]['p99']:.1f} ms "
+            f"over the last {self.interval:g}s, above {threshold:g} ms"
+            for stage, threshold in self.thresholds.items()
+            if stage in report and report[stage]["p99"] > threshold
+        ]
+
+    def flush(self):
+        self.last_report = self.recorder.flush()
+        if not self.last_report:
+            return
+        self.offset = dump_list(
+            [{"time": int(time.time() * 1000), "stages": self.last_report}],
+            self.path,
+            offset=self.offset,
+        )
+        for alert in self.alerts(self.last_report):
+            logging.warning(alert)
+            if self.notifier is not None:
+                self.notifier.send_messages({"Latency": alert})
+
+    async def get_metrics(self, request: web.Request):
+        return web.json_response(
+            {"total": self.recorder.report(), "last_interval": self.last_report}
+        )
+
+    async def run(self, port: int = None):
+        runner = None
+        if port:
+            app = web.Application()
+            app.router.add_get("/metrics", self.get_metrics)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", port).start()
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                self.flush()
+        finally:
+            self.flush()
+            if runner is not None:
+                await runner.cleanup()
@@ -0,0 +1,140 @@
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from protocol.kline import KLineSeries
+from utils.columnar import key_times
+from utils.config import DataPath
+from utils.json import load
+
+# one file of raw little-endian values per column of `KLineSeries`. the time
+# column is written last, so its length is the number of complete bars.
+COLUMNS = {
+    "times": "<i8",
+    "open": "<f8",
+    "high": "<f8",
+    "low": "<f8",
+    "close": "<f8",
+}
+
+
+class PriceStore:
+    # bars of one symbol and interval in time order. new bars are appended
+    # without rewriting the stored ones, and ranges are read through a memory
+    # map without loading the rest.
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def exists(self):
+        return (self.path / "times").exists()
+
+    def stat(self):
+        # changes with every append
+        return (self.path / "times").stat()
+
+    def __len__(self):
+        if not self.exists():
+            return 0
+        return self.stat().st_size // np.dtype(COLUMNS["times"]).itemsize
+
+    def column(self, name: str, num_bars: int = None) -> np.ndarray:
+        num_bars = len(self) if num_bars is None else num_bars
+        if num_bars == 0:
+            return np.empty(0, dtype=COLUMNS[name])
+        return np.memmap(
+            self.path / name, dtype=COLUMNS[name], mode="r", shape=(num_bars,)
+        )
+
+    @property
+    def times(self) -> np.ndarray:
+        return self.column("times")
+
+    @property
+    def last_time(self):
+        num_bars = len(self)
+        return int(self.column("times", num_bars)[-1]) if num_bars else None
+
+    def rows(self, begin: int = None, end: int = None) -> KLineSeries:
+        # bars [begin, end) in store order, copied out of the store
+        num_bars = len(self)
+        return KLineSeries(
+            *(
+                np.array(self.column(name, num_bars)[begin:end], dtype=dtype[1:])
+                for name, dtype in COLUMNS.items()
+            )
+        )
+
+    def read(self, start_time: int = None, end_time: int = None) -> KLineSeries:
+        # bars opened within [start_time, end_time]
+        times = self.times
+        return self.rows(
+            None if start_time is None else np.searchsorted(times, start_time),
+            None if end_time is None else np.searchsorted(times, end_time, "right"),
+        )
+
+    def append(self, series: KLineSeries, fsync=False) -> int:
+        # bars not newer than the last stored one are skipped, e.g., when a
+        # fetch overlaps the stored range. returns the number of bars appended.
+        num_bars = len(self)
+        if num_bars:
+            series = series.slice(
+                np.searchsorted(series.times, self.last_time, side="right")
+            )
+        if len(series) == 0:
+            return 0
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        for name in [*COLUMNS][1:] + ["times"]:
+            dtype = np.dtype(COLUMNS[name])
+            with open(self.path / name, "ab") as f:
+                # drops the values of an append cut short before its times
+                f.truncate(num_bars * dtype.itemsize)
+                f.write(np.asarray(getattr(series, name), dtype=dtype).tobytes())
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        return len(series)
+
+    @contextmanager
+    def replace(self):
+        # a store written aside, which replaces this one once it is complete.
+        # the stored bars are left untouched if writing fails.
+        temp = PriceStore(self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp"))
+        shutil.rmtree(temp.path, ignore_errors=True)
+        temp.path.mkdir(parents=True)
+        try:
+            yield temp
+        except BaseException:
+            shutil.rmtree(temp.path, ignore_errors=True)
+            raise
+
+        old_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.old")
+        if self.path.exists():
+            self.path.rename(old_path)
+        temp.path.rename(self.path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def price_store(symbol: str, interval: str = "1m") -> PriceStore:
+    suffix = "" if interval == "1m" else interval
+    store = PriceStore(DataPath(f"{symbol.lower()}/prices{suffix}"))
+    json_path = store.path.with_suffix(".json")
+    if not store.exists() and json_path.exists():
+        # prices files from before the store are converted once
+        prices = load(json_path)
+        with store.replace() as temp:
+            temp.append(
+                KLineSeries(
+                    key_times(list(prices.keys())).astype(np.int64),
+                    *(
+                        np.fromiter(
+                            (bar[name] for bar in prices.values()), dtype=np.float64
+                        )
+                        for name in ["open", "high", "low", "close"]
+                    ),
+                )
+            )
+    return store
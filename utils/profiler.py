@@ -0,0 +1,109 @@
+from collections import defaultdict
+from time import perf_counter
+
+from utils.latency import LatencyHistogram
+
+
+class Phase:
+    # durations are counted in a histogram of nanoseconds, so a phase takes
+    # the same memory however many calls it times
+    __slots__ = ["histogram", "start"]
+
+    def __init__(self):
+        self.histogram = LatencyHistogram(max_bits=44)
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.record(perf_counter() - self.start)
+
+    def record(self, seconds: float):
+        self.histogram.record(seconds * 1e9)
+
+
+class NullPhase:
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+NULL_PHASE = NullPhase()
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.phases = {}
+        self.counters = defaultdict(int)
+
+    def enable(self):
+        self.enabled = True
+
+    def reset(self):
+        self.phases = {}
+        self.counters = defaultdict(int)
+
+    def phase(self, name: str):
+        # a disabled profiler hands out a shared no-op context manager
+        if not self.enabled:
+            return NULL_PHASE
+        if name not in self.phases:
+            self.phases[name] = Phase()
+        return self.phases[name]
+
+    def record(self, name: str, duration: float):
+        # a duration measured outside of a phase, e.g., a scheduling delay
+        if self.enabled:
+            self.phase(name).record(duration)
+
+    def count(self, name: str, value: int = 1):
+        if self.enabled:
+            self.counters[name] += value
+
+    def report(self):
+        report = {}
+        for name, phase in self.phases.items():
+            histogram = phase.histogram
+            if histogram.count == 0:
+                continue
+            report[name] = {
+                "calls": histogram.count,
+                "total": histogram.total / 1e9,
+                "mean": histogram.total / histogram.count / 1e9,
+                "p50": histogram.percentile(50) / 1e9,
+                "p99": histogram.percentile(99) / 1e9,
+            }
+        return {"phases": report, "counters": dict(self.counters)}
+
+    def print_report(self):
+        if not self.enabled:
+            return
+
+        # phases may be nested, e.g., indicators computed within a decision
+        report = self.report()
+        print("=" * 100)
+        print(
+            f"{'Phase':<32}{'Calls':>10}{'Total (s)':>12}"
+            f"{'Mean (us)':>12}{'P50 (us)':>12}{'P99 (us)':>12}"
+        )
+        for name, phase in sorted(
+            report["phases"].items(), key=lambda item: -item[1]["total"]
+        ):
+            print(
+                f"{name:<32}{phase['calls']:>10}{phase['total']:>12.3f}"
+                f"{phase['mean'] * 1e6:>12.2f}"
+                f"{phase['p50'] * 1e6:>12.2f}{phase['p99'] * 1e6:>12.2f}"
+            )
+        for name, value in report["counters"].items():
+            print(f"{name}: {value}")
+        print("=" * 100, end="\n" * 2)
+
+
+PROFILER = Profiler()
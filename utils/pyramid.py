@@ -0,0 +1,57 @@
+from typing import Any, Dict, List
+
+# coarser levels on top of the 1m profit flow, in minutes
+PYRAMID_LEVELS = {"15m": 15, "1h": 60, "1d": 1440}
+
+
+class ProfitPyramid:
+    # min/max/last of the price and profit within every bucket, built bar by
+    # bar, so a chart at any zoom level reads a bounded number of points.
+    # buckets are aligned to the epoch and keep the `price` and `profit` keys of
+    # the 1m records for their last values.
+    def __init__(self, levels: Dict[str, int] = PYRAMID_LEVELS):
+        self.bucket_ms = {name: minutes * 60000 for name, minutes in levels.items()}
+        self.open_buckets = {name: None for name in levels}
+        self.closed_buckets = {name: [] for name in levels}
+
+    @property
+    def levels(self):
+        return list(self.bucket_ms.keys())
+
+    def append(self, record: Dict[str, Any]):
+        price, profit = record["price"], record["profit"]
+        for name, bucket_ms in self.bucket_ms.items():
+            bucket_time = record["time"] - record["time"] % bucket_ms
+            bucket = self.open_buckets[name]
+            if bucket is None or bucket["time"] != bucket_time:
+                if bucket is not None:
+                    self.closed_buckets[name].append(bucket)
+                self.open_buckets[name] = {
+                    "time": bucket_time,
+                    "price_min": price,
+                    "price_max": price,
+                    "price": price,
+                    "average_price": record["average_price"],
+                    "profit_min": profit,
+                    "profit_max": profit,
+                    "profit": profit,
+                }
+                continue
+
+            if price < bucket["price_min"]:
+                bucket["price_min"] = price
+            elif price > bucket["price_max"]:
+                bucket["price_max"] = price
+            if profit < bucket["profit_min"]:
+                bucket["profit_min"] = profit
+            elif profit > bucket["profit_max"]:
+                bucket["profit_max"] = profit
+            bucket["price"] = price
+            bucket["average_price"] = record["average_price"]
+            bucket["profit"] = profit
+
+    def flush(self) -> Dict[str, List[Dict[str, Any]]]:
+        # buckets closed since the previous flush, the open ones may still change
+        closed_buckets = self.closed_buckets
+        self.closed_buckets = {name: [] for name in self.bucket_ms}
+        return closed_buckets
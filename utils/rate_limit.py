@@ -0,0 +1,57 @@
+import asyncio
+import random
+import time
+
+
+class TokenBucket:
+    # request weights are drawn from a bucket refilled at `rate` per second, so
+    # bursts of up to `capacity` go out at once and the long-run throughput
+    # stays at the rate limit
+    def __init__(self, capacity: float, rate: float, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = rate
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+        self.paused_until = 0.0
+        # waiters are served in order, a heavy request is not starved by light ones
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+        return now
+
+    def wait_time(self, weight: float) -> float:
+        now = self.refill()
+        if now < self.paused_until:
+            return self.paused_until - now
+        return max(0.0, (min(weight, self.capacity) - self.tokens) / self.rate)
+
+    async def acquire(self, weight: float = 1):
+        async with self.lock:
+            while (delay := self.wait_time(weight)) > 0:
+                await asyncio.sleep(delay)
+            self.tokens -= weight
+
+    def sync(self, remaining: float):
+        # the server counts the weight of other clients on the same ip too
+        self.refill()
+        self.tokens = min(self.tokens, remaining)
+
+    def pause(self, seconds: float):
+        # throttled by the server: nothing goes out until the ban is over
+        self.refill()
+        self.tokens = 0.0
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+
+def backoff_delay(
+    attempt: int, base_delay: float = 0.5, max_delay: float = 30.0
+) -> float:
+    # exponential backoff with full jitter, so that retries of concurrent
+    # requests do not hit the server at the same moment
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
@@ -0,0 +1,313 @@
+from collections import deque
+
+import numpy as np
+
+# every structure covers the last `window_size` values appended, or all of them
+# while fewer have been appended. the batch variants return the value of that
+# window at every position, so they match the scalar ones appended in order.
+
+
+class RingBuffer:
+    __slots__ = ["window_size", "values", "start", "size"]
+
+    def __init__(self, window_size: int):
+        self.window_size = window_size
+        self.values = [None] * window_size
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, idx: int):
+        # 0 is the oldest value, -1 the newest one
+        if idx < 0:
+            idx += self.size
+        if not 0 <= idx < self.size:
+            raise IndexError("ring buffer index out of range")
+        return self.values[(self.start + idx) % self.window_size]
+
+    def __iter__(self):
+        for idx in range(self.size):
+            yield self.values[(self.start + idx) % self.window_size]
+
+    def is_full(self):
+        return self.size == self.window_size
+
+    def append(self, value):
+        # returns the value pushed out of the window, if any
+        if self.size < self.window_size:
+            self.values[(self.start + self.size) % self.window_size] = value
+            self.size += 1
+            return None
+        evicted = self.values[self.start]
+        self.values[self.start] = value
+        self.start = (self.start + 1) % self.window_size
+        return evicted
+
+    def clear(self):
+        self.values = [None] * self.window_size
+        self.start = 0
+        self.size = 0
+
+
+class MonotonicDeque:
+    # ties keep the newest value for max and the earliest one for min, the same
+    # as the last and first entries of a sorted list
+    __slots__ = ["window_size", "is_max", "entries", "count"]
+
+    def __init__(self, window_size: int, mode: str = "max"):
+        if mode not in ("max", "min"):
+            raise ValueError(f"Unknown mode: {mode}")
+        self.window_size = window_size
+        self.is_max = mode == "max"
+        self.entries = deque()
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.window_size)
+
+    def append(self, value):
+        entries = self.entries
+        if self.is_max:
+            while entries and entries[-1][1] <= value:
+                entries.pop()
+        else:
+            while entries and entries[-1][1] > value:
+                entries.pop()
+        entries.append((self.count, value))
+        self.count += 1
+        if entries[0][0] <= self.count - 1 - self.window_size:
+            entries.popleft()
+
+    @property
+    def value(self):
+        return self.entries[0][1] if self.entries else None
+
+    @property
+    def index(self):
+        # position of the extreme among all values appended so far
+        return self.entries[0][0] if self.entries else None
+
+    @property
+    def position(self):
+        # position of the extreme within the window, 0 being the oldest value
+        return self.entries[0][0] - self.count + len(self) if self.entries else None
+
+    def clear(self):
+        self.entries.clear()
+        self.count = 0
+
+    def state(self):
+        # plain values only, for the state of the strategies
+        return self.count, list(self.entries)
+
+    def restore(self, state):
+        count, entries = state
+        self.count = count
+        self.entries = deque(tuple(entry) for entry in entries)
+
+
+class RollingMax(MonotonicDeque):
+    def __init__(self, window_size: int):
+        super().__init__(window_size, "max")
+
+    @property
+    def argmax(self):
+        return self.position
+
+
+class RollingMin(MonotonicDeque):
+    def __init__(self, window_size: int):
+        super().__init__(window_size, "min")
+
+    @property
+    def argmin(self):
+        return self.position
+
+
+class RollingSum:
+    __slots__ = ["buffer", "sum", "num_updates"]
+
+    def __init__(self, window_size: int):
+        self.buffer = RingBuffer(window_size)
+        self.sum = 0.0
+        self.num_updates = 0
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def append(self, value: float):
+        evicted = self.buffer.append(value)
+        self.sum += value if evicted is None else value - evicted
+        # recompute now and then, so rounding errors do not pile up
+        self.num_updates += 1
+        if self.num_updates == self.buffer.window_size:
+            self.sum = float(sum(self.buffer))
+            self.num_updates = 0
+
+    @property
+    def value(self):
+        return self.sum
+
+    def clear(self):
+        self.buffer.clear()
+        self.sum = 0.0
+        self.num_updates = 0
+
+
+class RollingMeanVar:
+    # welford's algorithm, extended to values leaving the window
+    __slots__ = ["buffer", "mean", "m2"]
+
+    def __init__(self, window_size: int):
+        self.buffer = RingBuffer(window_size)
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def append(self, value: float):
+        evicted = self.buffer.append(value)
+        if evicted is None:
+            delta = value - self.mean
+            self.mean += delta / len(self.buffer)
+            self.m2 += delta * (value - self.mean)
+        else:
+            prev_mean = self.mean
+            self.mean += (value - evicted) / len(self.buffer)
+            self.m2 += (value - evicted) * (value - self.mean + evicted - prev_mean)
+
+    def variance(self, ddof: int = 0):
+        if len(self.buffer) <= ddof:
+            return None
+        return max(self.m2, 0.0) / (len(self.buffer) - ddof)
+
+    def std(self, ddof: int = 0):
+        variance = self.variance(ddof)
+        return None if variance is None else variance**0.5
+
+    def clear(self):
+        self.buffer.clear()
+        self.mean = 0.0
+        self.m2 = 0.0
+
+
+def _rolling_extreme(values: np.ndarray, window_size: int, ufunc):
+    # van herk/gil-werman: prefix and suffix extremes within blocks of the
+    # window size, any window is then covered by one suffix and one prefix
+    values = np.asarray(values, dtype=np.float64)
+    num_values = len(values)
+    window_size = min(window_size, num_values)
+    if num_values == 0:
+        return values.copy()
+
+    identity = -np.inf if ufunc is np.maximum else np.inf
+    blocks = np.concatenate(
+        [values, np.full(-num_values % window_size, identity)]
+    ).reshape(-1, window_size)
+    prefix = ufunc.accumulate(blocks, axis=1).ravel()
+    suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    out = np.empty(num_values)
+    out[: window_size - 1] = ufunc.accumulate(values[: window_size - 1])
+    ufunc(
+        suffix[: num_values - window_size + 1],
+        prefix[window_size - 1 : num_values],
+        out=out[window_size - 1 :],
+    )
+    return out
+
+
+def rolling_max(values: np.ndarray, window_size: int):
+    return _rolling_extreme(values, window_size, np.maximum)
+
+
+def rolling_min(values: np.ndarray, window_size: int):
+    return _rolling_extreme(values, window_size, np.minimum)
+
+
+def _running_arg_extreme(values: np.ndarray, ufunc, keep_newest: bool):
+    # running extremes along the last axis, and the positions of them where
+    # ties keep the newest or the earliest position
+    running = ufunc.accumulate(values, axis=-1)
+    if keep_newest:
+        is_new = values == running
+    else:
+        is_new = np.empty(values.shape, dtype=bool)
+        is_new[..., 1:] = running[..., 1:] != running[..., :-1]
+    is_new[..., 0] = True
+    positions = np.where(is_new, np.arange(values.shape[-1]), 0)
+    return running, np.maximum.accumulate(positions, axis=-1)
+
+
+def _rolling_arg_extreme(values: np.ndarray, window_size: int, is_max: bool):
+    # the blocks of `_rolling_extreme`, carrying the positions of the prefix
+    # and suffix extremes. ties keep the newest maximum and the earliest
+    # minimum, like `MonotonicDeque`.
+    values = np.asarray(values, dtype=np.float64)
+    num_values = len(values)
+    window_size = min(window_size, num_values)
+    if num_values == 0:
+        return np.empty(0, dtype=np.int64)
+
+    ufunc = np.maximum if is_max else np.minimum
+    identity = -np.inf if is_max else np.inf
+    blocks = np.concatenate(
+        [values, np.full(-num_values % window_size, identity)]
+    ).reshape(-1, window_size)
+    starts = np.arange(0, blocks.size, window_size)[:, None]
+    prefix, prefix_arg = _running_arg_extreme(blocks, ufunc, is_max)
+    # the newest position of a block is the earliest one of it reversed
+    suffix, suffix_arg = _running_arg_extreme(blocks[:, ::-1], ufunc, not is_max)
+    prefix, prefix_arg = prefix.ravel(), (starts + prefix_arg).ravel()
+    suffix = suffix[:, ::-1].ravel()
+    suffix_arg = (starts + window_size - 1 - suffix_arg[:, ::-1]).ravel()
+
+    out = np.empty(num_values, dtype=np.int64)
+    if window_size > 1:
+        out[: window_size - 1] = _running_arg_extreme(
+            values[: window_size - 1], ufunc, is_max
+        )[1]
+    prefix = prefix[window_size - 1 : num_values]
+    prefix_arg = prefix_arg[window_size - 1 : num_values]
+    suffix = suffix[: num_values - window_size + 1]
+    suffix_arg = suffix_arg[: num_values - window_size + 1]
+    # on a tie the prefix holds the newer position
+    if is_max:
+        is_prefix = prefix >= suffix
+    else:
+        is_prefix = prefix < suffix
+    out[window_size - 1 :] = np.where(is_prefix, prefix_arg, suffix_arg)
+    # positions within the window, 0 being the oldest value
+    return out - np.maximum(np.arange(num_values) - window_size + 1, 0)
+
+
+def rolling_argmax(values: np.ndarray, window_size: int):
+    return _rolling_arg_extreme(values, window_size, True)
+
+
+def rolling_argmin(values: np.ndarray, window_size: int):
+    return _rolling_arg_extreme(values, window_size, False)
+
+
+def rolling_sum(values: np.ndarray, window_size: int):
+    values = np.asarray(values, dtype=np.float64)
+    cumsum = np.concatenate([[0.0], np.cumsum(values)])
+    start_idx = np.maximum(np.arange(len(values)) - window_size + 1, 0)
+    return cumsum[1:] - cumsum[start_idx]
+
+
+def rolling_mean_var(values: np.ndarray, window_size: int, ddof: int = 0):
+    # shifted by the first value, so the sums of squares stay small
+    values = np.asarray(values, dtype=np.float64)
+    shifted = values - values[0] if len(values) else values
+    counts = np.minimum(np.arange(1, len(values) + 1), window_size)
+    sums = rolling_sum(shifted, window_size)
+    squared_sums = rolling_sum(shifted**2, window_size)
+    mean = sums / counts
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = np.maximum(squared_sums - sums * mean, 0.0) / (counts - ddof)
+    variance[counts <= ddof] = np.nan
+    return mean + (values[0] if len(values) else 0.0), variance
@@ -0,0 +1,197 @@
+import numpy as np
+
+from protocol.kline import KLineSeries
+
+BAR_MS = 60000
+# fractions of a bar at which the simulated path passes its open, the first
+# extreme, the second extreme and the close
+PATH_FRACTIONS = (0.0, 1 / 3, 2 / 3, 1.0)
+
+
+def bar_path(series: KLineSeries, idx: int):
+    # the path within a bar assumed by the backtests: a rising bar visits its
+    # low before its high, a falling bar its high before its low
+    open_, high, low, close = (
+        series.open[idx],
+        series.high[idx],
+        series.low[idx],
+        series.close[idx],
+    )
+    if close >= open_:
+        return (open_, low, high, close)
+    return (open_, high, low, close)
+
+
+def path_range(path, start: float, end: float):
+    # lowest and highest price of `path` between the fractions `start` and `end`
+    prices = [np.interp(start, PATH_FRACTIONS, path)]
+    prices += [p for f, p in zip(PATH_FRACTIONS, path) if start < f < end]
+    prices.append(np.interp(end, PATH_FRACTIONS, path))
+    return min(prices), max(prices)
+
+
+class FillModel:
+    # a resting limit order is filled once the path reaches its price, or
+    # only once the path trades through it by `min_cross`, a relative
+    # distance that stands in for the queue ahead of the order. orders are
+    # active `latency` ms after they are placed.
+    def __init__(self, min_cross: float = 0.0, latency: int = 0):
+        self.min_cross = min_cross
+        self.latency = latency
+
+    def is_filled(self, side: str, price: float, low: float, high: float):
+        if side == "BUY":
+            return low <= price * (1 - self.min_cross)
+        return high >= price * (1 + self.min_cross)
+
+
+class SimulatedExchange:
+    # a local stand-in for the calls of the futures api the trader makes,
+    # replaying stored 1m bars on a simulated clock. only bars closed by the
+    # clock are served, and orders fill along the path of the open bar.
+    def __init__(self, series: dict, clock, fill_model: FillModel = None):
+        self.series = {symbol.upper(): data for symbol, data in series.items()}
+        self.clock = clock
+        self.fill_model = fill_model or FillModel()
+        self.orders = {}
+        self.leverages = {}
+        self.stats = {"orders": 0, "filled": 0, "cancelled": 0}
+
+    def bar_index(self, symbol: str, time: int):
+        # index of the bar open at `time`
+        return int(np.searchsorted(self.series[symbol].times, time, side="right")) - 1
+
+    def price_range(self, symbol: str, start: int, end: int):
+        # lowest and highest price along the path from `start` to `end`
+        series = self.series[symbol]
+        low, high = np.inf, -np.inf
+        for idx in range(
+            max(self.bar_index(symbol, start), 0), self.bar_index(symbol, end) + 1
+        ):
+            bar_start = int(series.times[idx])
+            bar_low, bar_high = path_range(
+                bar_path(series, idx),
+                min(max((start - bar_start) / BAR_MS, 0.0), 1.0),
+                min(max((end - bar_start) / BAR_MS, 0.0), 1.0),
+            )
+            low, high = min(low, bar_low), max(high, bar_high)
+        return low, high
+
+    def price_at(self, symbol: str, time: int):
+        idx = self.bar_index(symbol, time)
+        fraction = min(max((time - int(self.series[symbol].times[idx])) / BAR_MS, 0), 1)
+        return float(
+            np.interp(fraction, PATH_FRACTIONS, bar_path(self.series[symbol], idx))
+        )
+
+    def match(self, order):
+        # fills the order along the path up to now
+        now = self.clock.time()
+        active_time = order["time"] + self.fill_model.latency
+        if order["status"] != "NEW" or now < active_time:
+            return
+        if order["checked_until"] is None:
+            # a marketable order fills at once, at the price of the moment
+            price = self.price_at(order["symbol"], active_time)
+            is_marketable = (
+                price <= order["price"]
+                if order["side"] == "BUY"
+                else price >= order["price"]
+            )
+            order["checked_until"] = active_time
+            if order["type"] == "MARKET" or is_marketable:
+                self.fill(order, price, active_time)
+                return
+
+        low, high = self.price_range(order["symbol"], order["checked_until"], now)
+        order["checked_until"] = now
+        if self.fill_model.is_filled(order["side"], order["price"], low, high):
+            self.fill(order, order["price"], now)
+
+    def fill(self, order, price: float, time: int):
+        order.update(status="FILLED", avg_price=price, update_time=time)
+        self.stats["filled"] += 1
+
+    def order_response(self, order):
+        return {
+            "orderId": order["order_id"],
+            "symbol": order["symbol"],
+            "status": order["status"],
+            "side": order["side"],
+            "type": order["type"],
+            "price": str(order["price"]),
+            "avgPrice": str(order["avg_price"]),
+            "origQty": str(order["quantity"]),
+            "executedQty": str(order["quantity"] if order["status"] == "FILLED" else 0),
+            "updateTime": order["update_time"],
+        }
+
+    async def time(self):
+        return {"serverTime": self.clock.time()}
+
+    async def klines(
+        self, symbol: str, interval: str, startTime=None, endTime=None, limit=500
+    ):
+        if interval != "1m":
+            raise ValueError(f"Only 1m bars are simulated, not {interval}")
+        series = self.series[symbol]
+        # bars still open would leak their future prices
+        end = min(
+            endTime if endTime is not None else np.inf, self.clock.time() - BAR_MS
+        )
+        end_idx = int(np.searchsorted(series.times, end, side="right"))
+        start_idx = (
+            int(np.searchsorted(series.times, startTime))
+            if startTime is not None
+            else 0
+        )
+        start_idx = max(start_idx, end_idx - limit)
+        return [
+            [
+                int(series.times[idx]),
+                str(series.open[idx]),
+                str(series.high[idx]),
+                str(series.low[idx]),
+                str(series.close[idx]),
+                "0",
+                int(series.times[idx]) + BAR_MS - 1,
+            ]
+            for idx in range(start_idx, end_idx)
+        ]
+
+    async def new_order(self, symbol: str, side: str, type: str, quantity, **kwargs):
+        now = self.clock.time()
+        order = {
+            "order_id": len(self.orders) + 1,
+            "symbol": symbol,
+            "side": side,
+            "type": type,
+            "quantity": float(quantity),
+            "price": float(kwargs.get("price", 0)),
+            "avg_price": 0.0,
+            "status": "NEW",
+            "time": now,
+            "update_time": now,
+            "checked_until": None,
+        }
+        self.orders[order["order_id"]] = order
+        self.stats["orders"] += 1
+        self.match(order)
+        return self.order_response(order)
+
+    async def query_order(self, symbol: str, orderId: int):
+        order = self.orders[orderId]
+        self.match(order)
+        return self.order_response(order)
+
+    async def cancel_order(self, symbol: str, orderId: int):
+        order = self.orders[orderId]
+        self.match(order)
+        if order["status"] == "NEW":
+            order.update(status="CANCELED", update_time=self.clock.time())
+            self.stats["cancelled"] += 1
+        return self.order_response(order)
+
+    async def change_leverage(self, symbol: str, leverage: int):
+        self.leverages[symbol] = leverage
+        return {"symbol": symbol, "leverage": leverage}
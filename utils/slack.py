@@ -1,8 +1,16 @@
 import logging
+import threading
+from collections import deque
 
 from slack_sdk import WebClient
 from slack_sdk.errors import SlackApiError
 
+from utils.rate_limit import backoff_delay
+
+# slack truncates longer messages
+MAX_MESSAGE_LENGTH = 3000
+MAX_QUEUED_MESSAGES = 1000
+
 SLACK_DEFAULT_CUSTOM_ARG = {
     "slack_emoji": ":shiba-head:",
     "emoji_repeat_time": 3,
@@ -12,8 +20,8 @@ SLACK_DEFAULT_CUSTOM_ARG = {
 
 
 class SlackBot:
-    def __init__(self, api_token, channel_id):
-        self.client = WebClient(token=api_token)
+    def __init__(self, api_token, channel_id, base_url=WebClient.BASE_URL):
+        self.client = WebClient(token=api_token, base_url=base_url)
         self.channel_id = channel_id
 
     def set_customize_message(
@@ -39,20 +47,118 @@ class SlackBot:
 
         return " ".join(total_messages)
 
-    def send_one_message(self, message):
-        try:
-            _ = self.client.chat_postMessage(
-                channel=self.channel_id,
-                text=message,
-            )
-        except SlackApiError as e:
-            logging.error(f"Error: {e}")
-
-    def send_messages(self, message_dict, **slack_customize_arguments):
+    def format_messages(self, message_dict, **slack_customize_arguments):
+        messages = []
         for k, v in message_dict.items():
             message = f"*{k}*: {v}"
             if len(slack_customize_arguments) > 0:
                 message = self.set_customize_message(
                     message, **slack_customize_arguments
                 )
+            messages.append(message)
+        return messages
+
+    def post(self, message):
+        self.client.chat_postMessage(channel=self.channel_id, text=message)
+
+    def send_one_message(self, message):
+        try:
+            self.post(message)
+        except SlackApiError as e:
+            logging.error(f"Error: {e}")
+
+    def send_messages(self, message_dict, **slack_customize_arguments):
+        for message in self.format_messages(message_dict, **slack_customize_arguments):
             self.send_one_message(message)
+
+
+class SlackNotifier:
+    # queues messages for a background thread, which posts everything queued
+    # within `flush_interval` as a single message, so a slow or failing slack
+    # never holds back a trader. beyond `max_queued` messages the oldest ones
+    # are dropped, and the next post says how many were lost.
+    def __init__(
+        self,
+        bot: SlackBot,
+        flush_interval: float = 2.0,
+        max_queued: int = MAX_QUEUED_MESSAGES,
+        max_retries: int = 5,
+    ):
+        self.bot = bot
+        self.flush_interval = flush_interval
+        self.max_queued = max_queued
+        self.max_retries = max_retries
+        self.messages = deque()
+        self.num_dropped = 0
+        self.lock = threading.Lock()
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def send_messages(self, message_dict, **slack_customize_arguments):
+        messages = self.bot.format_messages(message_dict, **slack_customize_arguments)
+        with self.lock:
+            self.messages.extend(messages)
+            while len(self.messages) > self.max_queued:
+                self.messages.popleft()
+                self.num_dropped += 1
+
+    def batches(self):
+        # the queued messages, joined into posts of at most MAX_MESSAGE_LENGTH
+        with self.lock:
+            messages, self.messages = self.messages, deque()
+            num_dropped, self.num_dropped = self.num_dropped, 0
+        if num_dropped:
+            messages.appendleft(f"_{num_dropped} messages were dropped_")
+
+        batch = ""
+        for message in messages:
+            message = message[:MAX_MESSAGE_LENGTH]
+            if batch and len(batch) + 1 + len(message) > MAX_MESSAGE_LENGTH:
+                yield batch
+                batch = ""
+            batch = f"{batch}\n{message}" if batch else message
+        if batch:
+            yield batch
+
+    def post(self, message):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.bot.post(message)
+                return True
+            except (SlackApiError, OSError) as e:
+                # a closing notifier does not wait for slack to recover
+                if attempt == self.max_retries or self.stopped.is_set():
+                    logging.error(f"Failed to post to slack: {e}")
+                    return False
+                delay = backoff_delay(attempt)
+                response = getattr(e, "response", None)
+                if response is not None and response.status_code == 429:
+                    delay = max(delay, float(response.headers.get("Retry-After", 1)))
+                logging.warning(f"Failed to post to slack ({e}), retry in {delay:.2f}s")
+                self.stopped.wait(delay)
+
+    def flush(self):
+        for batch in self.batches():
+            self.post(batch)
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+class NullNotifier:
+    def send_messages(self, message_dict, **slack_customize_arguments):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_NOTIFIER = NullNotifier()
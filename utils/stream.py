@@ -0,0 +1,93 @@
+import json
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable
+
+import requests
+
+from protocol.datetime import DatetimeJsonEncoder
+
+MAX_BUFFERED_EVENTS = 100000
+MAX_EVENTS_PER_REQUEST = 5000
+
+
+class StreamPublisher:
+    # pushes events to the dashboard server from a background thread, so a slow
+    # or missing server never holds back a backtest or a trader. events beyond
+    # `max_buffered` are dropped, the oldest first.
+    enabled = True
+
+    def __init__(
+        self,
+        url: str,
+        strategy: str,
+        symbol: str,
+        flush_interval: float = 0.5,
+        max_buffered: int = MAX_BUFFERED_EVENTS,
+    ):
+        self.url = f"{url.rstrip('/')}/publish/{strategy}/{symbol.lower()}"
+        self.flush_interval = flush_interval
+        self.events = deque(maxlen=max_buffered)
+        self.session = requests.Session()
+        self.is_reachable = True
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def publish(self, event: Dict[str, Any]):
+        self.events.append(event)
+
+    def publish_many(self, events: Iterable[Dict[str, Any]]):
+        self.events.extend(events)
+
+    def flush(self):
+        while self.events:
+            events = []
+            while self.events and len(events) < MAX_EVENTS_PER_REQUEST:
+                events.append(self.events.popleft())
+            try:
+                self.session.post(
+                    self.url,
+                    data=json.dumps(events, cls=DatetimeJsonEncoder),
+                    headers={"Content-Type": "application/json"},
+                    timeout=2,
+                )
+                self.is_reachable = True
+            except requests.RequestException as e:
+                # warn once per outage, the events are simply lost
+                if self.is_reachable:
+                    logging.warning(f"Failed to publish to {self.url}: {e}")
+                self.is_reachable = False
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+class NullPublisher:
+    enabled = False
+
+    def publish(self, event: Dict[str, Any]):
+        pass
+
+    def publish_many(self, events: Iterable[Dict[str, Any]]):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_PUBLISHER = NullPublisher()
+
+
+def get_publisher(url: str, strategy: str, symbol: str):
+    if url is None:
+        return NULL_PUBLISHER
+    return StreamPublisher(url, strategy, symbol)
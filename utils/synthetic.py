@@ -0,0 +1,111 @@
+import numpy as np
+
+from protocol.kline import KLineSeries
+
+
+def relative_bars(series: KLineSeries):
+    # every bar as ratios to the previous close, so bars can be reordered and
+    # chained into a new price path
+    prev_close = np.concatenate([series.open[:1], series.close[:-1]])
+    return np.stack([series.open, series.high, series.low, series.close]) / prev_close
+
+
+def chain_bars(relative: np.ndarray, start_price: float, out: np.ndarray = None):
+    prev_close = np.empty(relative.shape[1])
+    prev_close[0] = start_price
+    np.cumprod(relative[3, :-1], out=prev_close[1:])
+    prev_close[1:] *= start_price
+    return np.multiply(relative, prev_close, out=out)
+
+
+def block_bootstrap(series: KLineSeries, rng, out=None, block_size=1440):
+    block_size = min(block_size, len(series))
+    num_blocks = -(-len(series) // block_size)
+    starts = rng.integers(0, len(series) - block_size + 1, num_blocks)
+    bar_idx = (starts[:, None] + np.arange(block_size)).ravel()[: len(series)]
+    return chain_bars(relative_bars(series)[:, bar_idx], series.open[0], out)
+
+
+def regime_shuffle(
+    series: KLineSeries, rng, out=None, segment_size=10080, min_segments=8
+):
+    # a range shorter than `min_segments` weeks is cut into `min_segments`
+    # shorter segments, so even a few days get shuffled
+    num_segments = min(max(min_segments, len(series) // segment_size), len(series))
+    segments = np.array_split(np.arange(len(series)), num_segments)
+    bar_idx = np.concatenate([segments[i] for i in rng.permutation(len(segments))])
+    return chain_bars(relative_bars(series)[:, bar_idx], series.open[0], out)
+
+
+def perturb_noise(series: KLineSeries, rng, out=None, scale=5e-4):
+    ohlc = np.stack([series.open, series.high, series.low, series.close])
+    ohlc = ohlc * np.exp(rng.normal(0, scale, ohlc.shape))
+    # keep every bar consistent after the perturbation
+    ohlc[1] = ohlc.max(axis=0)
+    ohlc[2] = ohlc.min(axis=0)
+    if out is None:
+        return ohlc
+    out[:] = ohlc
+    return out
+
+
+VARIANT_GENERATORS = {
+    "bootstrap": block_bootstrap,
+    "shuffle": regime_shuffle,
+    "noise": perturb_noise,
+}
+
+
+def generate_variants(
+    series: KLineSeries, num_variants: int, method="bootstrap", seed=1102, out=None
+):
+    # variant i only depends on (seed, i), whatever the number of variants
+    if out is None:
+        out = np.empty((num_variants, 4, len(series)))
+    generator = VARIANT_GENERATORS[method]
+    for i, child_seed in enumerate(np.random.SeedSequence(seed).spawn(num_variants)):
+        generator(series, np.random.default_rng(child_seed), out=out[i])
+    return out
+
+
+# (annualized drift, annualized volatility) of the bull, calm and bear regimes
+DEFAULT_REGIMES = [(0.8, 0.6), (0.0, 0.3), (-0.8, 0.9)]
+MINUTES_PER_YEAR = 525600
+
+
+def generate_gbm_series(
+    num_bars: int,
+    seed=1102,
+    start_price=0.8,
+    start_time=1704067200000,
+    regimes=DEFAULT_REGIMES,
+    mean_regime_length=10080,
+):
+    # geometric brownian motion on 1m bars whose drift and volatility switch
+    # between regimes after geometrically distributed durations
+    rng = np.random.default_rng(seed)
+    durations = rng.geometric(
+        1 / mean_regime_length, num_bars // mean_regime_length * 2 + 2
+    )
+    while durations.sum() < num_bars:
+        durations = np.concatenate([durations, durations])
+    regimes_per_duration = rng.integers(0, len(regimes), len(durations))
+    regime_idx = np.repeat(regimes_per_duration, durations)[:num_bars]
+    drift, volatility = np.asarray(regimes, dtype=np.float64)[regime_idx].T
+
+    dt = 1 / MINUTES_PER_YEAR
+    volatility *= np.sqrt(dt)
+    log_returns = (drift * dt - volatility**2 / 2) + volatility * rng.standard_normal(
+        num_bars
+    )
+    close = start_price * np.exp(np.cumsum(log_returns))
+    open_ = np.concatenate([[start_price], close[:-1]])
+    # intrabar extremes spread around the bar body by the regime's volatility
+    high = np.maximum(open_, close) * np.exp(
+        np.abs(rng.standard_normal(num_bars)) * volatility / 2
+    )
+    low = np.minimum(open_, close) * np.exp(
+        -np.abs(rng.standard_normal(num_bars)) * volatility / 2
+    )
+    times = start_time + np.arange(num_bars, dtype=np.int64) * 60000
+    return KLineSeries(times, open_, high, low, close)
@@ -0,0 +1,71 @@
+// compares the json and binary responses of the server: payload size, transfer
+// time and the time to turn them into chart records, e.g.,
+// node vis/benchmark.mjs http://localhost:9898 grid_trading ondousdt
+import { decodeColumns } from './columnar.js'
+
+const [url = 'http://localhost:9898', strategy = 'grid_trading', symbol = 'ondousdt'] = process.argv.slice(2)
+const repeats = 20
+
+function decodeJsonPrices(text) {
+  return Object.entries(JSON.parse(text)).map(([timestamp, entry]) => ({
+    close: entry.close, high: entry.high, low: entry.low, open: entry.open,
+    timestamp: new Date(timestamp).getTime()
+  }))
+}
+
+function decodeBinaryPrices(buffer) {
+  const columns = decodeColumns(buffer)
+  return Array.from(columns.time, (timestamp, i) => ({
+    close: columns.close[i], high: columns.high[i], low: columns.low[i], open: columns.open[i],
+    timestamp: timestamp
+  }))
+}
+
+function decodeJsonProfits(text) {
+  return JSON.parse(text).map(entry => ({
+    close: entry.profit, high: entry.price, open: entry.average_price,
+    timestamp: new Date(entry.time).getTime()
+  }))
+}
+
+function decodeBinaryProfits(buffer) {
+  const columns = decodeColumns(buffer)
+  return Array.from(columns.time, (timestamp, i) => ({
+    close: columns.profit[i], high: columns.price[i], open: columns.average_price[i],
+    timestamp: timestamp
+  }))
+}
+
+async function measure(path, format, decode) {
+  const separator = path.includes('?') ? '&' : '?'
+  const target = `${url}${path}${separator}format=${format}`
+  let size = 0, transfer = 0, decoding = 0, numRecords = 0
+  for (let i = 0; i < repeats; i++) {
+    let start = performance.now()
+    const response = await fetch(target)
+    const payload = format === 'binary' ? await response.arrayBuffer() : await response.text()
+    transfer += performance.now() - start
+    size = format === 'binary' ? payload.byteLength : Buffer.byteLength(payload)
+
+    start = performance.now()
+    numRecords = decode(payload).length
+    decoding += performance.now() - start
+  }
+  console.log(
+    `${path.padEnd(60)}${format.padEnd(8)}${String(numRecords).padStart(10)}`
+    + `${(size / 1024).toFixed(1).padStart(12)} KB`
+    + `${(transfer / repeats).toFixed(2).padStart(10)} ms`
+    + `${(decoding / repeats).toFixed(2).padStart(10)} ms`
+  )
+}
+
+console.log(`${'Path'.padEnd(60)}${'Format'.padEnd(8)}${'Records'.padStart(10)}${'Size'.padStart(15)}${'Transfer'.padStart(13)}${'Decode'.padStart(13)}`)
+for (const points of [null, 4000, 1000]) {
+  const query = points === null ? '' : `?points=${points}`
+  const profitPath = `/results/${strategy}/${symbol}/profit_flow.json${query}`
+  await measure(profitPath, 'json', decodeJsonProfits)
+  await measure(profitPath, 'binary', decodeBinaryProfits)
+  const pricePath = `/price/${symbol}/prices.json${query}`
+  await measure(pricePath, 'json', decodeJsonPrices)
+  await measure(pricePath, 'binary', decodeBinaryPrices)
+}
@@ -1,4 +1,5 @@
 import { init, registerIndicator, registerOverlay } from 'https://cdn.skypack.dev/klinecharts'
+import { fetchColumns } from './columnar.js'
 
 function getQueryParam(param) {
   const urlParams = new URLSearchParams(window.location.search);
@@ -33,21 +34,15 @@ function getTimeDifferenceAsString(timestamp1, timestamp2) {
   return result;
 }
 
-async function fetchPrice(symbol) {
-  return fetch(`/price/${symbol}/prices.json`)
-    .then(response => {
-      if (!response.ok) {
-        throw new Error('Network response was not ok');
-      }
-      return response.json(); // Parse the JSON response
-    })
-    .then(data => {
-      const prices = Object.entries(data).map(([timestamp, entry]) => ({
-        close: entry.close,
-        high: entry.high,
-        low: entry.low,
-        open: entry.open,
-        timestamp: new Date(timestamp).getTime()
+async function fetchPrice(symbol, start, end, points) {
+  return fetchColumns(`/price/${symbol}/prices.json?start=${start}&end=${end}&points=${points}`)
+    .then(columns => {
+      const prices = Array.from(columns.time, (timestamp, i) => ({
+        close: columns.close[i],
+        high: columns.high[i],
+        low: columns.low[i],
+        open: columns.open[i],
+        timestamp: timestamp
       }));
       return prices;
     });
@@ -72,26 +67,36 @@ async function fetchTransaction(strategy, symbol) {
     })
 }
 
-async function fetchData(strategy, symbol) {
-  return fetch(`/results/${strategy}/${symbol}/profit_flow.json`)
-      .then(response => {
-          if (!response.ok) {
-              throw new Error('Network response was not ok');
-          }
-          return response.json(); // Parse the JSON response
-      })
-      .then(data => {
-        const profits = data.map(entry => ({
-            close: entry.profit,
-            high: entry.price,
-            low: 100 * entry.profit / 182,
-            open: entry.average_price,
-            timestamp: new Date(entry.time).getTime()
+async function fetchData(strategy, symbol, points) {
+  return fetchColumns(`/results/${strategy}/${symbol}/profit_flow.json?points=${points}`)
+      .then(columns => {
+        const profits = Array.from(columns.time, (timestamp, i) => ({
+            close: columns.profit[i],
+            high: columns.price[i],
+            low: 100 * columns.profit[i] / 182,
+            open: columns.average_price[i],
+            timestamp: timestamp
         }));
         return profits;
       });
 }
 
+// the first transaction within every bucket, each bucket starting at its timestamp
+function bucketTransactions(transactionList, timestamps) {
+  const results = timestamps.map(() => undefined)
+  let i = 0
+  transactionList.forEach(tr => {
+    const timestamp = tr.timestamp * 1000
+    while (i + 1 < timestamps.length && timestamps[i + 1] <= timestamp) {
+      i++
+    }
+    if (timestamp >= timestamps[0] && results[i] === undefined) {
+      results[i] = tr
+    }
+  })
+  return results
+}
+
 const chart = init('k-line-chart')
 
 registerIndicator({
@@ -113,11 +118,15 @@ registerIndicator({
 
 const symbol = getQueryParam('symbol');
 const strategy = getQueryParam('strategy');
+// the server downsamples long ranges, prices and profits into the same buckets
+const points = Math.min(4000, 2 * window.innerWidth)
 
-Promise.all([fetchData(strategy, symbol), fetchTransaction(strategy, symbol), fetchPrice(symbol)])
+Promise.all([fetchData(strategy, symbol, points), fetchTransaction(strategy, symbol)])
+  .then(([profitList, transactionList]) => fetchPrice(
+    symbol, profitList[0].timestamp, profitList[profitList.length - 1].timestamp, points
+  ).then(priceList => [profitList, transactionList, priceList]))
   .then(([profitList, transactionList, priceList]) => {
-    const firstIdx = priceList.findIndex(item => item.timestamp === profitList[0].timestamp)
-    priceList = priceList.slice(firstIdx, firstIdx + profitList.length)
+    priceList = priceList.slice(0, profitList.length)
     registerOverlay({
       name: 'sampleRect',
       totalStep: 3,
@@ -171,9 +180,10 @@ Promise.all([fetchData(strategy, symbol), fetchTransaction(strategy, symbol), fe
       ],
       calc: (kLineDataList) => {
         const results = []
+        const transactions = bucketTransactions(transactionList, kLineDataList.map(kLineData => kLineData.timestamp))
 
-        kLineDataList.forEach(kLineData => {
-          let transaction = transactionList.find(tr => tr.timestamp * 1000 === kLineData.timestamp)
+        kLineDataList.forEach((kLineData, i) => {
+          let transaction = transactions[i]
           if (transaction) {
             results.push({transaction: {
               mode: transaction.mode,
@@ -221,9 +231,10 @@ Promise.all([fetchData(strategy, symbol), fetchTransaction(strategy, symbol), fe
       ],
       calc: () => {
         const results = []
+        const transactions = bucketTransactions(transactionList, priceList.map(kLineData => kLineData.timestamp))
 
-        profitList.forEach(kLineData => {
-          let transaction = transactionList.find(tr => tr.timestamp * 1000 === kLineData.timestamp)
+        profitList.forEach((kLineData, i) => {
+          let transaction = transactions[i]
           if (transaction) {
             results.push({transaction: {
               mode: transaction.mode,
@@ -321,6 +332,33 @@ Promise.all([fetchData(strategy, symbol), fetchTransaction(strategy, symbol), fe
     chart.createIndicator('priceTransaction', true, {id: 'candle_pane'})
     chart.createIndicator('profitTransaction', true, {id: 'profitPane'})
 
+    // a running backtest or trader pushes its new equity points and fills
+    const source = new EventSource(`/stream/${strategy}/${symbol}`)
+    source.onmessage = (message) => {
+      JSON.parse(message.data).forEach(event => {
+        if (event.type === 'fill') {
+          transactionList.push({
+            timestamp: event.timestamp,
+            mode: event.transaction.mode,
+            price: event.transaction.price,
+            amount: event.transaction.amount
+          })
+        }
+        else if (event.type === 'equity' && event.time > priceList[priceList.length - 1].timestamp) {
+          const kLineData = {open: event.price, high: event.price, low: event.price, close: event.price, timestamp: event.time}
+          priceList.push(kLineData)
+          profitList.push({
+            close: event.profit,
+            high: event.price,
+            low: 100 * event.profit / 182,
+            open: event.average_price,
+            timestamp: event.time
+          })
+          chart.updateData(kLineData)
+        }
+      })
+    }
+
     const buttonContainer = document.createElement('div')
     buttonContainer.classList.add('button-container')
 
@@ -0,0 +1,29 @@
+// columns sent by the server with format=binary: a little-endian uint32 number
+// of rows and of columns, then per column a uint32 name length, the utf-8 name,
+// zero padding to a multiple of 8 bytes and the float64 values.
+// the values are viewed in place, which assumes a little-endian platform.
+export function decodeColumns(buffer) {
+  const view = new DataView(buffer)
+  const numRows = view.getUint32(0, true)
+  const numColumns = view.getUint32(4, true)
+  const decoder = new TextDecoder()
+  const columns = {}
+  let offset = 8
+  for (let i = 0; i < numColumns; i++) {
+    const nameLength = view.getUint32(offset, true)
+    const name = decoder.decode(new Uint8Array(buffer, offset + 4, nameLength))
+    offset += 4 + nameLength
+    offset += (8 - offset % 8) % 8
+    columns[name] = new Float64Array(buffer, offset, numRows)
+    offset += 8 * numRows
+  }
+  return columns
+}
+
+export async function fetchColumns(url) {
+  const response = await fetch(url + (url.includes('?') ? '&' : '?') + 'format=binary')
+  if (!response.ok) {
+    throw new Error('Network response was not ok');
+  }
+  return decodeColumns(await response.arrayBuffer())
+}
@@ -1,17 +1,287 @@
+import asyncio
 import json
 import logging
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any, List, Optional
 
+import numpy as np
 import uvicorn
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
+from protocol.datetime import FormattedDateTime
+from utils.catalog import ORDER_BY, RunCatalog
+from utils.columnar import encode_columns, time_keys, to_columns
+from utils.downsample import aggregate_ohlc, lttb
+from utils.price_store import PriceStore
+
 # Environment configuration
 BASE_DIR = Path(__file__).resolve().parent.parent
+CACHE_SIZE = 16
+MAX_POINTS = 4000
+# batches of events a subscriber may lag behind before losing the oldest ones
+STREAM_QUEUE_SIZE = 1000
+STREAM_KEEPALIVE = 15
 
 app = FastAPI()
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+
+class PriceRecords:
+    # the records of a prices file, built from the bars of its store on access
+    def __init__(self, bars):
+        self.bars = bars
+
+    def __len__(self):
+        return len(self.bars)
+
+    def __getitem__(self, idx):
+        return self.bars[idx].to_dict()
+
+
+@dataclass
+class Series:
+    data: Any
+    # sorted keys for range queries: ms timestamps of list records, or the
+    # datetime strings of price dicts. None if the file is not a time series.
+    keys: Optional[List[Any]] = None
+    is_dict: bool = False
+
+    def __post_init__(self):
+        self.columns = {}
+
+    @classmethod
+    def from_file(cls, path: Path):
+        with path.open("r") as f:
+            data = json.load(f)
+
+        if isinstance(data, dict):
+            keys, values = list(data.keys()), list(data.values())
+        elif isinstance(data, list) and all(isinstance(v, dict) for v in data):
+            # result.json keeps its timestamps in seconds
+            keys = [
+                v["time"] if "time" in v else v.get("timestamp", 0) * 1000 for v in data
+            ]
+            values = data
+        else:
+            return cls(data)
+
+        if keys != sorted(keys):
+            return cls(data)
+        return cls(values, keys, isinstance(data, dict))
+
+    @classmethod
+    def from_store(cls, store: PriceStore):
+        # served like the prices file the store replaced
+        bars = store.read()
+        series = cls(PriceRecords(bars), time_keys(bars.times), True)
+        series.columns.update(
+            (name, getattr(bars, name)) for name in ["open", "high", "low", "close"]
+        )
+        return series
+
+    def column(self, name: str) -> np.ndarray:
+        # numeric columns for downsampling, extracted once per parsed file
+        if name not in self.columns:
+            if name == "time":
+                self.columns[name] = np.asarray(self.keys, dtype=np.float64)
+            else:
+                self.columns[name] = np.fromiter(
+                    (v[name] for v in self.data), dtype=np.float64, count=len(self.data)
+                )
+        return self.columns[name]
+
+    def select(self, indices):
+        if self.is_dict:
+            return {self.keys[i]: self.data[i] for i in indices}
+        return [self.data[i] for i in indices]
+
+    def query(
+        self,
+        start: Optional[int],
+        end: Optional[int],
+        limit: Optional[int] = None,
+        points: Optional[int] = None,
+    ):
+        if self.keys is None:
+            return self.data
+
+        # price dicts are keyed by datetime strings, as the backtest reads them
+        if self.is_dict:
+            start = None if start is None else FormattedDateTime(start).string
+            end = None if end is None else FormattedDateTime(end).string
+
+        begin = 0 if start is None else bisect_left(self.keys, start)
+        stop = len(self.keys) if end is None else bisect_right(self.keys, end)
+        if limit is not None:
+            stop = max(begin, min(stop, begin + limit))
+        if points is None or stop - begin <= points:
+            return self.select(range(begin, stop))
+        return self.downsample(begin, stop, points)
+
+    def downsample(self, begin: int, stop: int, points: int):
+        # candles are merged per bucket, lines keep their most salient records
+        if self.is_dict and "open" in self.data[begin]:
+            starts, *ohlc = aggregate_ohlc(
+                *(
+                    self.column(name)[begin:stop]
+                    for name in ["open", "high", "low", "close"]
+                ),
+                points,
+            )
+            return {
+                self.keys[begin + idx]: {
+                    "open": open_,
+                    "high": high,
+                    "low": low,
+                    "close": close,
+                }
+                for idx, open_, high, low, close in zip(
+                    starts.tolist(), *(values.tolist() for values in ohlc)
+                )
+            }
+        if not self.is_dict and "profit" in self.data[begin]:
+            indices = lttb(
+                self.column("time")[begin:stop],
+                self.column("profit")[begin:stop],
+                points,
+            )
+            return self.select((begin + indices).tolist())
+        return self.select(range(begin, stop))
+
+
+class LRUCache:
+    def __init__(self, max_size: int = CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, version=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value, version=None):
+        with self.lock:
+            self.entries[key] = (version, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+# parsed files, dropped when the file changes
+series_cache = LRUCache()
+# encoded responses per file version, range and resolution
+response_cache = LRUCache(CACHE_SIZE * 8)
+
+
+def load_series(path: Path):
+    # directories are price stores
+    store = PriceStore(path) if path.is_dir() else None
+    stat = path.stat() if store is None else store.stat()
+    version = (stat.st_mtime_ns, stat.st_size)
+    series = series_cache.get(path, version)
+    if series is None:
+        series = Series.from_file(path) if store is None else Series.from_store(store)
+        series_cache.put(path, series, version)
+    return version, series
+
+
+def load_response(path: Path, start, end, limit, points, format, if_none_match):
+    try:
+        (mtime_ns, size), series = load_series(path)
+    except json.JSONDecodeError:
+        # the backtest is still writing this file
+        raise HTTPException(status_code=503, detail="File is being written")
+
+    etag = f'W/"{mtime_ns:x}-{size:x}-{start}-{end}-{limit}-{points}-{format}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+
+    key = (path, start, end, limit, points, format)
+    content = response_cache.get(key, etag)
+    if content is None:
+        try:
+            data = series.query(start, end, limit, points)
+        except ValueError as e:
+            # price files are queried by datetimes, which take 10 or 13 digits
+            raise HTTPException(status_code=400, detail=f"Invalid start or end: {e}")
+        if format == "binary":
+            if series.keys is None:
+                raise HTTPException(status_code=400, detail="Not a time series")
+            content = encode_columns(to_columns(data))
+        else:
+            content = json.dumps(data).encode()
+        response_cache.put(key, content, etag)
+    media_type = (
+        "application/octet-stream" if format == "binary" else "application/json"
+    )
+    return Response(content, media_type=media_type, headers=headers)
+
+
+async def serve_series(
+    path: Path,
+    request: Request,
+    start: Optional[int],
+    end: Optional[int],
+    limit: Optional[int],
+    points: Optional[int],
+    format: str,
+):
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+    # parsing and encoding large files must not block the other requests
+    return await asyncio.to_thread(
+        load_response,
+        path,
+        start,
+        end,
+        limit,
+        None if points is None else min(points, MAX_POINTS),
+        format,
+        request.headers.get("if-none-match"),
+    )
+
+
+class Broadcaster:
+    # fans the events published by backtests and traders out to the dashboards
+    # subscribed to the same strategy and symbol
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+
+    def subscribe(self, topic: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self.subscribers[topic].add(queue)
+        return queue
+
+    def unsubscribe(self, topic: str, queue: asyncio.Queue):
+        self.subscribers[topic].discard(queue)
+        if not self.subscribers[topic]:
+            del self.subscribers[topic]
+
+    def publish(self, topic: str, content: bytes):
+        queues = self.subscribers.get(topic, set())
+        for queue in queues:
+            # a slow client loses the oldest events rather than stalling others
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(content)
+        return len(queues)
+
+
+broadcaster = Broadcaster()
+
 
 # Serve HTML files
 @app.get("/", response_class=FileResponse)
@@ -25,24 +295,150 @@ class PriceData(BaseModel):
 
 
 @app.get("/results/{strategy}/{symbol}/{filename}")
-async def read_results(strategy: str, symbol: str, filename: str):
+async def read_results(
+    strategy: str,
+    symbol: str,
+    filename: str,
+    request: Request,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    limit: Optional[int] = None,
+    points: Optional[int] = Query(None, ge=3),
+    format: str = Query("json", pattern="^(json|binary)$"),
+):
     results_path = BASE_DIR / "results" / strategy / symbol / filename
     logging.info(results_path)
-    if not results_path.exists():
-        raise HTTPException(status_code=404, detail="File not found")
-    with results_path.open("r") as f:
-        data = json.load(f)
-    return data
+    return await serve_series(results_path, request, start, end, limit, points, format)
 
 
 @app.get("/price/{symbol}/{filename}")
-async def fetch_price(symbol: str, filename: str):
+async def fetch_price(
+    symbol: str,
+    filename: str,
+    request: Request,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    limit: Optional[int] = None,
+    points: Optional[int] = Query(None, ge=3),
+    format: str = Query("json", pattern="^(json|binary)$"),
+):
     data_path = BASE_DIR / "data" / symbol / filename
-    if not data_path.exists():
+    # prices files are served from the store that replaced them
+    store = PriceStore(data_path.with_suffix(""))
+    if data_path.suffix == ".json" and store.exists():
+        data_path = store.path
+    return await serve_series(data_path, request, start, end, limit, points, format)
+
+
+def query_catalog(method: str, *args, **kwargs):
+    catalog_path = BASE_DIR / "results" / "catalog.sqlite"
+    if not catalog_path.exists():
+        return None
+    # sqlite connections stay in the thread that opened them
+    catalog = RunCatalog(catalog_path)
+    try:
+        return getattr(catalog, method)(*args, **kwargs)
+    finally:
+        catalog.close()
+
+
+@app.get("/runs")
+async def list_runs(
+    strategy: Optional[str] = None,
+    symbol: Optional[str] = None,
+    config_hash: Optional[str] = None,
+    order_by: str = Query("created_at", pattern=f"^({'|'.join(ORDER_BY)})$"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    runs = await asyncio.to_thread(
+        query_catalog,
+        "runs",
+        strategy=strategy,
+        symbol=symbol,
+        config_hash=config_hash,
+        order_by=order_by,
+        limit=limit,
+    )
+    return runs or []
+
+
+async def get_run(run_id: int):
+    run = await asyncio.to_thread(query_catalog, "get_run", run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return run
+
+
+@app.get("/runs/{run_id}")
+async def read_run(run_id: int):
+    return await get_run(run_id)
+
+
+@app.get("/runs/{run_id}/{filename}")
+async def read_run_results(
+    run_id: int,
+    filename: str,
+    request: Request,
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    limit: Optional[int] = None,
+    points: Optional[int] = Query(None, ge=3),
+    format: str = Query("json", pattern="^(json|binary)$"),
+):
+    run = await get_run(run_id)
+    artifact = run["artifacts"].get(filename)
+    if artifact is not None:
+        results_path = Path(artifact["path"])
+        # the next run of the strategy on the symbol rewrites its result files
+        stat = results_path.stat() if results_path.exists() else None
+        if stat is None or (stat.st_size, stat.st_mtime_ns) != (
+            artifact["size"],
+            artifact["mtime_ns"],
+        ):
+            raise HTTPException(status_code=410, detail="Overwritten by a later run")
+    elif run["artifacts_dir"] is not None:
+        # archived by earlier versions of the catalog
+        results_path = Path(run["artifacts_dir"]) / filename
+    else:
         raise HTTPException(status_code=404, detail="File not found")
-    with data_path.open("r") as f:
-        data = json.load(f)
-    return data
+    return await serve_series(results_path, request, start, end, limit, points, format)
+
+
+@app.post("/publish/{strategy}/{symbol}")
+async def publish(strategy: str, symbol: str, request: Request):
+    content = await request.body()
+    try:
+        json.loads(content)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Events must be JSON")
+    return {"subscribers": broadcaster.publish(f"{strategy}/{symbol}", content)}
+
+
+@app.get("/stream/{strategy}/{symbol}")
+async def stream(strategy: str, symbol: str, request: Request):
+    topic = f"{strategy}/{symbol}"
+    queue = broadcaster.subscribe(topic)
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    content = await asyncio.wait_for(
+                        queue.get(), timeout=STREAM_KEEPALIVE
+                    )
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                # every published batch is one server-sent event
+                yield b"".join(
+                    b"data: " + line + b"\n" for line in content.splitlines()
+                ) + b"\n"
+        finally:
+            broadcaster.unsubscribe(topic, queue)
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
 
 
 # Mount static files